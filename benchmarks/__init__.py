@@ -0,0 +1 @@
+"""Performance benchmarks for langchain_util, run them as modules from the repository root."""
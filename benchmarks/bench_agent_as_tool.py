@@ -0,0 +1,118 @@
+"""
+Benchmark for the cache and single-flight deduplication of AgentAsTool.
+
+Runs a scripted zero shot agent behind an AgentAsTool on a workload of
+repeated queries, differing in case and whitespace, issued concurrently with
+arun up to a concurrency limit, without caching, with a ToolResultCache and
+with a cache and single flight. Reports the agent runs, the LLM calls and the
+wall time of each.
+
+Usage:
+    python -m benchmarks.bench_agent_as_tool [--queries 200] [--distinct 20] [--concurrency 20]
+                                             [--latency 0.02]
+"""
+import argparse
+import asyncio
+import random
+import time
+from typing import List, Optional
+
+from langchain.agents import AgentType, Tool, initialize_agent
+from langchain.callbacks.manager import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain.llms.base import LLM
+
+from langchain_util.tools import AgentAsTool
+from langchain_util.tools.cache import ToolResultCache
+
+
+class ScriptedLLM(LLM):
+    """Drives a zero shot agent: looks the question up steps times, then answers."""
+
+    steps: int = 3
+    latency: float = 0.02
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def _call(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+    ) -> str:
+        self.calls += 1
+        time.sleep(self.latency)
+        return self._respond(prompt)
+
+    async def _acall(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+    ) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return self._respond(prompt)
+
+    def _respond(self, prompt: str) -> str:
+        scratchpad = prompt.split("Question: ")[-1]
+        question = scratchpad.split("\n")[0]
+        observations = scratchpad.split("Observation: ")
+        if len(observations) - 1 < self.steps:
+            return f"Thought: look it up\nAction: lookup\nAction Input: {question}"
+        return f"Thought: done\nFinal Answer: {observations[-1].splitlines()[0]}"
+
+
+async def alookup(query: str) -> str:
+    return f"answer to {query.lower()}"
+
+
+def make_queries(queries: int, distinct: int) -> List[str]:
+    rng = random.Random(0)
+    topics = [f"question number {i}" for i in range(distinct)]
+    # Skewed towards a few popular questions
+    weights = [1 / (i + 1) for i in range(distinct)]
+    variants = (str.lower, str.upper, str.title, lambda q: f"  {q} ")
+    return [rng.choice(variants)(rng.choices(topics, weights)[0]) for _ in range(queries)]
+
+
+async def measure(tool: AgentAsTool, queries: List[str], concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def ask(query: str) -> str:
+        async with semaphore:
+            return await tool.arun(query)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(ask(query) for query in queries))
+    return time.perf_counter() - start
+
+
+def run(queries: int, distinct: int, concurrency: int, latency: float) -> None:
+    workload = make_queries(queries, distinct)
+    print(f"{queries} queries, {distinct} distinct, {concurrency} at a time, "
+          f"{latency * 1000:g} ms per LLM call")
+    print(f"{'mode':>14} {'agent runs':>11} {'llm calls':>10} {'seconds':>8}")
+    for name, kwargs in (("no cache", {}),
+                         ("cache", {"cache": ToolResultCache()}),
+                         ("single flight", {"cache": ToolResultCache(), "single_flight": True})):
+        llm = ScriptedLLM(latency=latency)
+        agent = initialize_agent(
+            [Tool(name="lookup", func=lambda q: q, coroutine=alookup, description="Looks up anything")],
+            llm, agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION)
+        tool = AgentAsTool(name="research", description="Researches a question", agent=agent, **kwargs)
+        elapsed = asyncio.run(measure(tool, workload, concurrency))
+        print(f"{name:>14} {tool.stats.runs:>11} {llm.calls:>10} {elapsed:>8.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--distinct", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.02)
+    args = parser.parse_args()
+    run(args.queries, args.distinct, args.concurrency, args.latency)
@@ -0,0 +1,141 @@
+"""
+Benchmark for the deadlines and budgets of nested agents in AgentAsTool.
+
+A manager agent delegates each question to a research agent behind an
+AgentAsTool. Most questions take the research agent a few steps, some of
+them loop for many. Runs the questions concurrently without limits, with a
+timeout on the manager tool, which also bounds the research tool, with a
+maximum of research iterations and with a token budget, and reports the
+latency percentiles, the LLM calls and how often each limit was hit.
+
+Usage:
+    python -m benchmarks.bench_agent_limits [--questions 200] [--latency 0.01] [--timeout 0.15]
+"""
+import argparse
+import asyncio
+import random
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+from langchain.agents import AgentType, Tool, initialize_agent
+from langchain.callbacks.manager import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain.llms.base import LLM
+
+from langchain_util.concurrency import BatchStats
+from langchain_util.tools import AgentAsTool
+
+_STEPS = re.compile(r"needs (\d+) steps")
+
+
+class ScriptedLLM(LLM):
+    """Drives a zero shot agent: uses its tool as many steps as the question needs, then answers."""
+
+    tool: str
+    steps: Optional[int] = None
+    """Steps of every question, read from the question when None."""
+    latency: float = 0.01
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def _call(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+    ) -> str:
+        self.calls += 1
+        time.sleep(self.latency)
+        return self._respond(prompt)
+
+    async def _acall(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+    ) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return self._respond(prompt)
+
+    def _respond(self, prompt: str) -> str:
+        scratchpad = prompt.split("Question: ")[-1]
+        question = scratchpad.split("\n")[0]
+        observations = scratchpad.split("Observation: ")
+        steps = self.steps if self.steps is not None else int(_STEPS.search(question).group(1))
+        if len(observations) - 1 < steps:
+            return f"Thought: keep going\nAction: {self.tool}\nAction Input: {question}"
+        return f"Thought: done\nFinal Answer: {observations[-1].splitlines()[0][:200]}"
+
+
+async def alookup(query: str) -> str:
+    return f"found something about {query}"
+
+
+def make_questions(questions: int) -> List[str]:
+    rng = random.Random(0)
+    steps = rng.choices([2, 5, 40], weights=[0.8, 0.15, 0.05], k=questions)
+    return [f"question {i} needs {n} steps" for i, n in enumerate(steps)]
+
+
+def make_tools(latency: float, manager_kwargs: Dict[str, Any], research_kwargs: Dict[str, Any]):
+    research_llm = ScriptedLLM(tool="lookup", latency=latency)
+    research = AgentAsTool(
+        name="research", description="Researches a question",
+        agent=initialize_agent([Tool(name="lookup", func=str, coroutine=alookup, description="Looks up")],
+                               research_llm, agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION, max_iterations=None),
+        **research_kwargs)
+    manager_llm = ScriptedLLM(tool="research", steps=1, latency=latency)
+    manager = AgentAsTool(
+        name="manager", description="Answers a question",
+        agent=initialize_agent([research], manager_llm, agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION),
+        **manager_kwargs)
+    return manager, research, [manager_llm, research_llm]
+
+
+async def measure(manager: AgentAsTool, questions: List[str]) -> BatchStats:
+    stats = BatchStats()
+
+    async def ask(question: str) -> None:
+        start = time.perf_counter()
+        await manager.arun(question)
+        stats.latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(ask(question) for question in questions))
+    stats.elapsed = time.perf_counter() - start
+    return stats
+
+
+def run(questions: int, latency: float, timeout: float) -> None:
+    workload = make_questions(questions)
+    print(f"{questions} questions, {latency * 1000:g} ms per LLM call")
+    print(f"{'mode':>14} {'p50':>6} {'p95':>6} {'p99':>6} {'llm calls':>10} "
+          f"{'timeouts':>9} {'iterations':>11} {'tokens':>7}")
+    modes = (
+        ("no limits", {}, {}),
+        ("timeout", {"timeout": timeout}, {}),
+        ("iterations", {}, {"max_iterations": 6}),
+        ("token budget", {"max_tokens": 8000}, {}),
+    )
+    for name, manager_kwargs, research_kwargs in modes:
+        manager, research, llms = make_tools(latency, manager_kwargs, research_kwargs)
+        stats = asyncio.run(measure(manager, workload))
+        limits = [sum(getattr(tool.stats, counter) for tool in (manager, research))
+                  for counter in ("timeouts", "iteration_limits", "token_limits")]
+        print(f"{name:>14} {stats.latency_percentile(50):>6.2f} {stats.latency_percentile(95):>6.2f} "
+              f"{stats.latency_percentile(99):>6.2f} {sum(llm.calls for llm in llms):>10} "
+              f"{limits[0]:>9} {limits[1]:>11} {limits[2]:>7}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--timeout", type=float, default=0.15)
+    args = parser.parse_args()
+    run(args.questions, args.latency, args.timeout)
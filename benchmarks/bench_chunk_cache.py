@@ -0,0 +1,84 @@
+"""
+Benchmark for incremental re-splitting with a chunk cache.
+
+Splits a corpus once to fill a SQLite chunk cache, changes a fraction of the
+documents and splits the corpus again, comparing the time of the second run
+with splitting without a cache.
+
+Usage:
+    python -m benchmarks.bench_chunk_cache [--documents 2000] [--changed 0.05]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from typing import List
+
+from langchain.docstore.document import Document
+
+from langchain_util.chunk_cache import SQLiteChunkCache
+from langchain_util.text_splitter import RecursiveCharacterTextSplitterWithContext
+
+
+def make_corpus(documents: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    words = [f"word{i}" for i in range(1000)]
+    return [
+        "\n\n".join(" ".join(rng.choices(words, k=rng.randint(20, 120))) for _ in range(30))
+        for _ in range(documents)
+    ]
+
+
+def to_documents(texts: List[str]) -> List[Document]:
+    return [Document(page_content=text, metadata={"chunk-context": f"Document {i}"})
+            for i, text in enumerate(texts)]
+
+
+def run(documents: int, changed: float) -> None:
+    texts = make_corpus(documents)
+    updated = list(texts)
+    for i in random.Random(1).sample(range(documents), int(documents * changed)):
+        updated[i] = updated[i] + "\n\nAn appended paragraph."
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = SQLiteChunkCache(os.path.join(directory, "chunks.db"))
+        # Metadata is shared so the runs are not dominated by copying it per chunk
+        splitter = RecursiveCharacterTextSplitterWithContext(
+            chunk_size=500, chunk_overlap=50, share_metadata=True)
+        cached_splitter = RecursiveCharacterTextSplitterWithContext(
+            chunk_size=500, chunk_overlap=50, share_metadata=True, chunk_cache=cache)
+
+        corpus = to_documents(updated)
+        start = time.perf_counter()
+        expected = splitter.split_documents(corpus)
+        uncached = time.perf_counter() - start
+
+        corpus = to_documents(texts)
+        start = time.perf_counter()
+        cached_splitter.split_documents(corpus)
+        cold = time.perf_counter() - start
+
+        cache.stats.reset()
+        corpus = to_documents(updated)
+        start = time.perf_counter()
+        chunks = cached_splitter.split_documents(corpus)
+        warm = time.perf_counter() - start
+        assert chunks == expected
+        cache.close()
+
+    print(f"{documents} documents, {changed:.0%} changed, {len(chunks)} chunks")
+    print(f"{'run':>16} {'seconds':>8}")
+    print(f"{'no cache':>16} {uncached:>8.2f}")
+    print(f"{'cold cache':>16} {cold:>8.2f}")
+    print(f"{'warm cache':>16} {warm:>8.2f}")
+    print(f"hit rate {cache.stats.hit_rate:.0%}, speedup {uncached / warm:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=2000)
+    parser.add_argument("--changed", type=float, default=0.05)
+    args = parser.parse_args()
+    run(args.documents, args.changed)
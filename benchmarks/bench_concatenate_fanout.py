@@ -0,0 +1,78 @@
+"""
+Benchmark for the parallel fan-out of ConcatenateChain.
+
+Runs several input chains with random latencies one after the other, the
+way separate ConcatenateChains would, and with a single ConcatenateChain
+wrapping all of them, with _call (threads) and _acall (asyncio), and reports
+the wall time of each against the sum and the maximum of the latencies.
+
+Usage:
+    python -m benchmarks.bench_concatenate_fanout [--chains 5] [--max-latency 0.3]
+"""
+import argparse
+import asyncio
+import random
+import time
+from typing import Any, Dict, List
+
+from langchain.chains.base import Chain
+
+from langchain_util.chains import ConcatenateChain
+
+
+class LatencyChain(Chain):
+    """Returns a value for its key after a delay."""
+
+    name: str
+    latency: float
+
+    @property
+    def input_keys(self) -> List[str]:
+        return ["text"]
+
+    @property
+    def output_keys(self) -> List[str]:
+        return [self.name]
+
+    def _call(self, inputs: Dict[str, Any], run_manager: Any = None) -> Dict[str, str]:
+        time.sleep(self.latency)
+        return {self.name: inputs["text"].upper()}
+
+    async def _acall(self, inputs: Dict[str, Any], run_manager: Any = None) -> Dict[str, str]:
+        await asyncio.sleep(self.latency)
+        return {self.name: inputs["text"].upper()}
+
+
+def run(chains: int, max_latency: float) -> None:
+    rng = random.Random(0)
+    input_chains = [LatencyChain(name=f"key{i}", latency=rng.uniform(max_latency / 4, max_latency))
+                    for i in range(chains)]
+    latencies = [chain.latency for chain in input_chains]
+    print(f"{chains} chains, sum of latencies {sum(latencies):.2f}s, slowest {max(latencies):.2f}s")
+
+    start = time.perf_counter()
+    sequential = " ".join(
+        ConcatenateChain(input_chain=chain, keys=None, output_key="output").run(text="hi")
+        for chain in input_chains)
+    timings = {"sequential": time.perf_counter() - start}
+
+    chain = ConcatenateChain(input_chains=input_chains, keys=None, output_key="output")
+    start = time.perf_counter()
+    threaded = chain.run(text="hi")
+    timings["threads"] = time.perf_counter() - start
+    start = time.perf_counter()
+    gathered = asyncio.run(chain.arun(text="hi"))
+    timings["asyncio"] = time.perf_counter() - start
+    assert sequential == threaded == gathered
+
+    for name, elapsed in timings.items():
+        print(f"{name:>10} {elapsed:>7.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chains", type=int, default=5)
+    parser.add_argument("--max-latency", type=float, default=0.3)
+    args = parser.parse_args()
+    run(args.chains, args.max_latency)
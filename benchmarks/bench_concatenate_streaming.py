@@ -0,0 +1,93 @@
+"""
+Benchmark for the streaming output of ConcatenateChain.
+
+Wraps input chains with increasing latencies and reports the time until the
+first segment and the first token are available with astream, against the
+time until the complete output is returned by arun.
+
+Usage:
+    python -m benchmarks.bench_concatenate_streaming [--chains 4] [--step 0.1]
+"""
+import argparse
+import asyncio
+import time
+from typing import List, Optional
+
+from langchain.callbacks.manager import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain.chains.llm import LLMChain
+from langchain.llms.base import LLM
+from langchain.prompts import PromptTemplate
+
+from benchmarks.bench_concatenate_fanout import LatencyChain
+from langchain_util.chains import ConcatenateChain
+
+ANSWER = "a streamed answer of some tokens " * 4
+
+
+class StreamingLLM(LLM):
+    """Fake LLM streaming a fixed answer word by word."""
+
+    token_latency: float
+
+    @property
+    def _llm_type(self) -> str:
+        return "streaming"
+
+    def _call(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+    ) -> str:
+        return ANSWER
+
+    async def _acall(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+    ) -> str:
+        for token in ANSWER.split(" "):
+            await asyncio.sleep(self.token_latency)
+            if run_manager:
+                await run_manager.on_llm_new_token(token + " ")
+        return ANSWER
+
+
+async def measure(chain: ConcatenateChain) -> None:
+    start = time.perf_counter()
+    output = await chain.arun(text="hi")
+    complete = time.perf_counter() - start
+
+    start = time.perf_counter()
+    first_token = first_segment = None
+    segments = []
+    async for chunk in chain.astream({"text": "hi"}, tokens=True):
+        elapsed = time.perf_counter() - start
+        if chunk.is_token:
+            first_token = first_token or elapsed
+        else:
+            first_segment = first_segment or elapsed
+            segments.append(chunk.text)
+    assert " ".join(segments) == output
+
+    print(f"{'complete output':>16} {complete:>7.2f}s")
+    print(f"{'first segment':>16} {first_segment:>7.2f}s")
+    print(f"{'first token':>16} {first_token:>7.2f}s")
+
+
+def run(chains: int, step: float) -> None:
+    llm = StreamingLLM(token_latency=step / 10)
+    input_chains = [LLMChain(llm=llm, prompt=PromptTemplate.from_template("{text}"), output_key="answer")]
+    input_chains += [LatencyChain(name=f"key{i}", latency=step * (i + 3)) for i in range(chains - 1)]
+    print(f"{chains} chains, the LLM streams a token every {step / 10 * 1000:g} ms")
+    asyncio.run(measure(ConcatenateChain(input_chains=input_chains, keys=None, output_key="output")))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chains", type=int, default=4)
+    parser.add_argument("--step", type=float, default=0.1)
+    args = parser.parse_args()
+    run(args.chains, args.step)
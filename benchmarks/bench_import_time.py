@@ -0,0 +1,75 @@
+"""
+Benchmark of the import time of the public entry points of langchain_util.
+
+Imports each entry point in a fresh interpreter with python -X importtime,
+repeat times, and reports the median of the total import time, of the time
+spent in the langchain_util modules themselves and the number of modules
+loaded. As a regression guard exits with status 1 when the time spent in the
+langchain_util modules of an entry point exceeds --max-ms.
+
+Usage:
+    python -m benchmarks.bench_import_time [--repeat 5] [--max-ms 50]
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Optional, Tuple
+
+ENTRY_POINTS = (
+    "import langchain_util.chains",
+    "import langchain_util.tools",
+    "from langchain_util.text_splitter import RecursiveCharacterTextSplitterWithContext",
+    "from langchain_util.chains import ConcatenateChain",
+    "from langchain_util.chains import SentimentChain",
+    "from langchain_util.tools import AgentAsTool",
+)
+
+
+def import_times(code: str) -> Dict[str, int]:
+    """Self time in microseconds of each module imported by code, in a fresh interpreter."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        check=True, capture_output=True, text=True,
+    ).stderr
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_time, _, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(self_time)
+    return times
+
+
+def measure(code: str, repeat: int) -> Tuple[float, float, int]:
+    """Median total ms, median langchain_util ms and number of modules imported by code."""
+    totals, own = [], []
+    for _ in range(repeat):
+        times = import_times(code)
+        totals.append(sum(times.values()) / 1000)
+        own.append(sum(t for name, t in times.items() if name.startswith("langchain_util")) / 1000)
+    return statistics.median(totals), statistics.median(own), len(times)
+
+
+def run(repeat: int, max_ms: Optional[float]) -> List[str]:
+    """Prints the import times, returns the entry points over max_ms."""
+    print(f"median of {repeat} fresh interpreters")
+    print(f"{'entry point':<82} {'total ms':>9} {'own ms':>7} {'modules':>8}")
+    slow = []
+    for code in ENTRY_POINTS:
+        total, own, modules = measure(code, repeat)
+        print(f"{code:<82} {total:>9.1f} {own:>7.1f} {modules:>8}")
+        if max_ms is not None and own > max_ms:
+            slow.append(code)
+    for code in slow:
+        print(f"{code} spends more than {max_ms:g} ms in langchain_util modules")
+    return slow
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=None)
+    args = parser.parse_args()
+    sys.exit(1 if run(args.repeat, args.max_ms) else 0)
@@ -0,0 +1,99 @@
+"""
+Micro-benchmark for TextSplitterWithContext._merge_splits.
+
+Compares the [first, i) index window over the splits against the previous
+list slicing implementation on inputs of growing size, up to 1M words, and
+checks that both produce the same chunks.
+
+Usage:
+    python -m benchmarks.bench_merge_splits [--words 10000 100000 1000000]
+"""
+import argparse
+import random
+import time
+from typing import Callable, Iterable, List
+
+from langchain_util.text_splitter import RecursiveCharacterTextSplitterWithContext
+
+WORDS = ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur",
+         "adipiscing", "elit", "sed", "do", "eiusmod", "tempor"]
+
+
+class CountingLength:
+    """Length function that counts how many times it is called."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, text: str) -> int:
+        self.calls += 1
+        return len(text)
+
+
+def legacy_merge_splits(splitter: RecursiveCharacterTextSplitterWithContext,
+                        splits: Iterable[str], separator: str, chunk_size: int) -> List[str]:
+    """The list slicing implementation that _merge_splits replaced."""
+    length_function = splitter._length_function
+    separator_len = length_function(separator)
+    docs = []
+    current_doc: List[str] = []
+    total = 0
+    for d in splits:
+        _len = length_function(d)
+        if total + _len + (separator_len if len(current_doc) > 0 else 0) > chunk_size:
+            if len(current_doc) > 0:
+                doc = splitter._join_docs(current_doc, separator)
+                if doc is not None:
+                    docs.append(doc)
+                while total > splitter._chunk_overlap or (
+                    total + _len + (separator_len if len(current_doc) > 0 else 0) > chunk_size
+                    and total > 0
+                ):
+                    total -= length_function(current_doc[0]) + (
+                        separator_len if len(current_doc) > 1 else 0
+                    )
+                    current_doc = current_doc[1:]
+        current_doc.append(d)
+        total += _len + (separator_len if len(current_doc) > 1 else 0)
+    doc = splitter._join_docs(current_doc, separator)
+    if doc is not None:
+        docs.append(doc)
+    return docs
+
+
+def _time(fn: Callable[[], List[str]]):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def run(word_counts: List[int], chunk_size: int, chunk_overlap: int) -> None:
+    rnd = random.Random(0)
+    print(f"chunk_size={chunk_size} chunk_overlap={chunk_overlap}")
+    print(f"{'words':>10} {'legacy s':>10} {'calls':>10} {'window s':>10} {'calls':>10} {'speedup':>8}")
+    for n in word_counts:
+        splits = [rnd.choice(WORDS) for _ in range(n)]
+        legacy_len = CountingLength()
+        legacy = RecursiveCharacterTextSplitterWithContext(
+            chunk_size=chunk_size, chunk_overlap=chunk_overlap, length_function=legacy_len)
+        current_len = CountingLength()
+        current = RecursiveCharacterTextSplitterWithContext(
+            chunk_size=chunk_size, chunk_overlap=chunk_overlap, length_function=current_len)
+        legacy_time, expected = _time(
+            lambda: legacy_merge_splits(legacy, splits, " ", chunk_size))
+        current_time, result = _time(
+            lambda: current._merge_splits(splits, " ", chunk_size))
+        assert result == expected, "outputs differ"
+        print(f"{n:>10} {legacy_time:>10.3f} {legacy_len.calls:>10} "
+              f"{current_time:>10.3f} {current_len.calls:>10} {legacy_time / current_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--words", type=int, nargs="+",
+                        default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--chunk-size", type=int, default=4000)
+    parser.add_argument("--chunk-overlap", type=int, default=20)
+    args = parser.parse_args()
+    run(args.words, args.chunk_size, args.chunk_overlap)
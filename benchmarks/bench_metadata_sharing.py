@@ -0,0 +1,74 @@
+"""
+Benchmark for the share_metadata mode of the splitters.
+
+Splits documents carrying large nested metadata with the default per chunk
+deepcopy and with share_metadata, and reports the time and the memory held
+by the resulting chunks.
+
+Usage:
+    python -m benchmarks.bench_metadata_sharing [--documents 50] [--entities 500]
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+from typing import List
+
+from langchain.docstore.document import Document
+
+from langchain_util.text_splitter import RecursiveCharacterTextSplitterWithContext
+
+
+def make_corpus(documents: int, entities: int) -> List[Document]:
+    text = "\n\n".join(" ".join(f"word{j}" for j in range(80)) for _ in range(40))
+    corpus = []
+    for i in range(documents):
+        metadata = {
+            "chunk-context": f"Document {i}",
+            "source": {"path": f"/corpus/doc-{i}.md", "revision": i, "authors": ["a", "b"]},
+            "acl": [{"principal": f"group-{k}", "permissions": ["read"]} for k in range(50)],
+            "entities": [{"name": f"entity-{k}", "type": "ORG", "offsets": [k, k + 5]}
+                         for k in range(entities)],
+        }
+        corpus.append(Document(page_content=text, metadata=metadata))
+    return corpus
+
+
+def measure(share_metadata: bool, documents: int, entities: int):
+    splitter = RecursiveCharacterTextSplitterWithContext(
+        chunk_size=500, chunk_overlap=50, share_metadata=share_metadata)
+    # Time and memory are measured in separate runs as tracing allocations
+    # slows down the deepcopy considerably
+    corpus = make_corpus(documents, entities)
+    start = time.perf_counter()
+    chunks = splitter.split_documents(corpus)
+    elapsed = time.perf_counter() - start
+    del chunks
+    corpus = make_corpus(documents, entities)
+    gc.collect()
+    tracemalloc.start()
+    chunks = splitter.split_documents(corpus)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(chunks), elapsed, current, peak
+
+
+def run(documents: int, entities: int) -> None:
+    print(f"{documents} documents, {entities} entities per document")
+    print(f"{'mode':>10} {'chunks':>8} {'seconds':>8} {'held MB':>8} {'peak MB':>8}")
+    results = {}
+    for mode, share in (("deepcopy", False), ("shared", True)):
+        chunks, elapsed, current, peak = measure(share, documents, entities)
+        results[mode] = (elapsed, current)
+        print(f"{mode:>10} {chunks:>8} {elapsed:>8.2f} {current / 2**20:>8.1f} {peak / 2**20:>8.1f}")
+    print(f"time saved {1 - results['shared'][0] / results['deepcopy'][0]:.0%}, "
+          f"memory saved {1 - results['shared'][1] / results['deepcopy'][1]:.0%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=50)
+    parser.add_argument("--entities", type=int, default=500)
+    args = parser.parse_args()
+    run(args.documents, args.entities)
@@ -0,0 +1,76 @@
+"""
+Benchmark of the overhead of the metrics of the text splitters.
+
+Splits the same corpus with create_documents without a metrics sink, with an
+InMemoryMetricsSink and with a PrometheusMetricsSink, with characters and
+with a word count as length function, and reports the best of repeat runs and
+the overhead relative to the run without metrics. Also prints the metrics
+collected by the Prometheus sink.
+
+Usage:
+    python -m benchmarks.bench_metrics_overhead [--documents 2000] [--words 400] [--repeat 5]
+"""
+import argparse
+import random
+import time
+from typing import Callable, List, Optional
+
+from langchain_util.metrics import BaseMetricsSink, InMemoryMetricsSink, PrometheusMetricsSink
+from langchain_util.text_splitter import RecursiveCharacterTextSplitterWithContext
+
+WORDS = ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur",
+         "adipiscing", "elit", "sed", "do", "eiusmod", "tempor"]
+
+
+def word_count(text: str) -> int:
+    return len(text.split())
+
+
+def make_corpus(documents: int, words: int) -> List[str]:
+    rnd = random.Random(0)
+    texts = []
+    for _ in range(documents):
+        paragraphs = []
+        for _ in range(max(words // 40, 1)):
+            sentences = (" ".join(rnd.choice(WORDS) for _ in range(10)) + "." for _ in range(4))
+            paragraphs.append(" ".join(sentences))
+        texts.append("\n\n".join(paragraphs))
+    return texts
+
+
+def measure(texts: List[str], length_function: Callable[[str], int], chunk_size: int,
+            metrics: Optional[BaseMetricsSink], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        splitter = RecursiveCharacterTextSplitterWithContext(
+            chunk_size=chunk_size, chunk_overlap=0, length_function=length_function, metrics=metrics)
+        start = time.perf_counter()
+        splitter.create_documents(texts)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(documents: int, words: int, repeat: int) -> None:
+    texts = make_corpus(documents, words)
+    print(f"{documents} documents of about {words} words, best of {repeat}")
+    print(f"{'length function':>16} {'sink':>11} {'seconds':>8} {'overhead':>9}")
+    prometheus = PrometheusMetricsSink()
+    for name, length_function, chunk_size in (("len", len, 1000), ("word count", word_count, 150)):
+        baseline = None
+        for sink_name, sink in (("none", None), ("in memory", InMemoryMetricsSink()),
+                                ("prometheus", prometheus)):
+            seconds = measure(texts, length_function, chunk_size, sink, repeat)
+            baseline = baseline or seconds
+            print(f"{name:>16} {sink_name:>11} {seconds:>8.3f} {seconds / baseline - 1:>8.1%}")
+    print()
+    print(prometheus.render())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=2000)
+    parser.add_argument("--words", type=int, default=400)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.documents, args.words, args.repeat)
@@ -0,0 +1,76 @@
+"""
+Benchmark for TextSplitterWithContext.split_documents_parallel.
+
+Splits a synthetic corpus of documents with a growing number of worker
+processes and reports the throughput against the serial split_documents.
+
+Usage:
+    python -m benchmarks.bench_parallel_split [--documents 10000] [--words 1000]
+"""
+import argparse
+import os
+import random
+import time
+from typing import List
+
+from langchain.docstore.document import Document
+
+from langchain_util.text_splitter import RecursiveCharacterTextSplitterWithContext
+
+WORDS = ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur",
+         "adipiscing", "elit", "sed", "do", "eiusmod", "tempor"]
+
+
+def make_corpus(documents: int, words: int) -> List[Document]:
+    rnd = random.Random(0)
+    corpus = []
+    for i in range(documents):
+        paragraphs = []
+        for _ in range(max(1, words // 100)):
+            paragraphs.append(" ".join(rnd.choice(WORDS) for _ in range(100)))
+        corpus.append(Document(page_content="\n\n".join(paragraphs),
+                               metadata={"chunk-context": f"Document {i}", "source": f"doc-{i}"}))
+    return corpus
+
+
+def _worker_counts() -> List[int]:
+    cpus = os.cpu_count() or 1
+    counts = []
+    workers = 1
+    while workers < cpus:
+        counts.append(workers)
+        workers *= 2
+    counts.append(cpus)
+    return counts
+
+
+def run(documents: int, words: int, chunksize: int) -> None:
+    splitter = RecursiveCharacterTextSplitterWithContext(
+        chunk_size=1000, chunk_overlap=100)
+    print(f"{documents} documents of ~{words} words, chunksize={chunksize}")
+
+    corpus = make_corpus(documents, words)
+    start = time.perf_counter()
+    expected = splitter.split_documents(corpus)
+    serial = time.perf_counter() - start
+    print(f"{'workers':>8} {'seconds':>8} {'docs/s':>10} {'speedup':>8}")
+    print(f"{'serial':>8} {serial:>8.2f} {documents / serial:>10.0f} {1:>7.1f}x")
+
+    for workers in _worker_counts():
+        corpus = make_corpus(documents, words)
+        start = time.perf_counter()
+        result = splitter.split_documents_parallel(
+            corpus, max_workers=workers, chunksize=chunksize, min_documents=0)
+        elapsed = time.perf_counter() - start
+        assert result == expected, "outputs differ"
+        print(f"{workers:>8} {elapsed:>8.2f} {documents / elapsed:>10.0f} {serial / elapsed:>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=10_000)
+    parser.add_argument("--words", type=int, default=1000)
+    parser.add_argument("--chunksize", type=int, default=64)
+    args = parser.parse_args()
+    run(args.documents, args.words, args.chunksize)
@@ -0,0 +1,68 @@
+"""
+Benchmark for concurrent sentiment scoring with SentimentChain.abatch.
+
+Scores synthetic comments with a fake async LLM that answers after a fixed
+latency, at increasing concurrency limits, and reports the throughput and
+latency percentiles collected by BatchStats.
+
+Usage:
+    python -m benchmarks.bench_sentiment_abatch [--comments 400] [--latency 0.05]
+"""
+import argparse
+import asyncio
+from typing import List, Optional
+
+from langchain.callbacks.manager import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain.docstore.document import Document
+from langchain.llms.base import LLM
+
+from langchain_util.chains import SentimentChain
+from langchain_util.concurrency import BatchStats
+
+
+class SleepingLLM(LLM):
+    """Fake LLM answering every prompt after a fixed latency."""
+
+    latency: float = 0.05
+
+    @property
+    def _llm_type(self) -> str:
+        return "sleeping"
+
+    def _call(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+    ) -> str:
+        raise NotImplementedError("Only async calls are benchmarked")
+
+    async def _acall(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+    ) -> str:
+        await asyncio.sleep(self.latency)
+        return '```json\n{"sentiment": "1", "confidence": "8"}\n```'
+
+
+def run(comments: int, latency: float) -> None:
+    chain = SentimentChain.from_llm(SleepingLLM(latency=latency))
+    groups = [[Document(page_content=f"Comment number {i}, great product")] for i in range(comments)]
+    print(f"{comments} comments, {latency * 1000:.0f} ms LLM latency")
+    print(f"{'concurrency':>12} {'seconds':>8} {'per second':>11} {'p50 ms':>8} {'p95 ms':>8}")
+    for max_concurrency in (1, 8, 32, 128):
+        stats = BatchStats()
+        asyncio.run(chain.amap(groups, max_concurrency=max_concurrency, stats=stats))
+        print(f"{max_concurrency:>12} {stats.elapsed:>8.2f} {stats.throughput:>11.1f} "
+              f"{stats.latency_percentile(50) * 1000:>8.1f} {stats.latency_percentile(95) * 1000:>8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--comments", type=int, default=400)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+    run(args.comments, args.latency)
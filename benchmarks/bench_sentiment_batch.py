@@ -0,0 +1,91 @@
+"""
+Benchmark for batched sentiment scoring.
+
+Scores synthetic comments one chain call at a time and with score_batch,
+using a fake LLM that answers every statement in its prompt, and reports the
+number of LLM calls and prompt tokens of each approach. Tokens are
+approximated by whitespace separated words.
+
+Usage:
+    python -m benchmarks.bench_sentiment_batch [--comments 1000] [--max-tokens 2000]
+"""
+import argparse
+import random
+import re
+import time
+from typing import List, Optional
+
+from langchain.callbacks.manager import CallbackManagerForLLMRun
+from langchain.docstore.document import Document
+from langchain.llms.base import LLM
+
+from langchain_util.chains import SentimentChain
+
+_STATEMENT = re.compile(r"^STATEMENT (\d+):$", re.MULTILINE)
+
+
+class CountingLLM(LLM):
+    """Fake LLM answering each statement of the prompt, counts calls and prompt tokens."""
+
+    calls: int = 0
+    prompt_tokens: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "counting"
+
+    def get_num_tokens(self, text: str) -> int:
+        return len(text.split())
+
+    def _call(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+    ) -> str:
+        self.calls += 1
+        self.prompt_tokens += self.get_num_tokens(prompt)
+        indexes = _STATEMENT.findall(prompt)
+        if not indexes:
+            return '```json\n{"sentiment": "1", "confidence": "8"}\n```'
+        objects = ", ".join(
+            f'{{"index": "{i}", "sentiment": "1", "confidence": "8"}}' for i in indexes)
+        return f"```json\n[{objects}]\n```"
+
+
+def make_comments(comments: int) -> List[List[Document]]:
+    rng = random.Random(0)
+    words = ["great", "terrible", "product", "service", "delivery", "price", "would",
+             "recommend", "never", "again", "love", "it", "the", "was", "and"]
+    return [[Document(page_content=" ".join(rng.choices(words, k=rng.randint(8, 40))))]
+            for _ in range(comments)]
+
+
+def run(comments: int, max_tokens: int) -> None:
+    groups = make_comments(comments)
+    print(f"{comments} comments, batch budget {max_tokens} tokens")
+    print(f"{'mode':>10} {'calls':>8} {'prompt tokens':>14} {'seconds':>8}")
+    results = {}
+    for mode in ("single", "batch"):
+        llm = CountingLLM()
+        chain = SentimentChain.from_llm(llm, batch_max_tokens=max_tokens)
+        start = time.perf_counter()
+        if mode == "single":
+            for docs in groups:
+                chain({"input_documents": docs})
+        else:
+            chain.score_batch(groups)
+        elapsed = time.perf_counter() - start
+        results[mode] = (llm.calls, llm.prompt_tokens)
+        print(f"{mode:>10} {llm.calls:>8} {llm.prompt_tokens:>14} {elapsed:>8.2f}")
+    print(f"calls saved {1 - results['batch'][0] / results['single'][0]:.1%}, "
+          f"prompt tokens saved {1 - results['batch'][1] / results['single'][1]:.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--comments", type=int, default=1000)
+    parser.add_argument("--max-tokens", type=int, default=2000)
+    args = parser.parse_args()
+    run(args.comments, args.max_tokens)
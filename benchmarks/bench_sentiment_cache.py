@@ -0,0 +1,69 @@
+"""
+Benchmark for the SentimentChain result cache.
+
+Scores a synthetic stream of statements in which many are exact duplicates,
+retweets or templated reviews of earlier statements, without a cache, with
+exact lookups and with near duplicate lookups, and reports the LLM calls,
+the cache hit rate and the cache overhead per statement.
+
+Usage:
+    python -m benchmarks.bench_sentiment_cache [--statements 2000] [--distance 8]
+"""
+import argparse
+import random
+import time
+from typing import List
+
+from langchain.docstore.document import Document
+
+from benchmarks.bench_sentiment_batch import CountingLLM
+from langchain_util.chains import SentimentChain
+from langchain_util.chains.sentiment.cache import InMemorySentimentCache
+
+
+def make_statements(statements: int) -> List[str]:
+    rng = random.Random(0)
+    words = ["great", "terrible", "product", "service", "delivery", "price", "would",
+             "recommend", "never", "again", "love", "battery", "screen", "support", "fast"]
+    originals = [" ".join(rng.choices(words, k=rng.randint(10, 30))) for _ in range(statements // 4)]
+    stream = []
+    for _ in range(statements):
+        original = rng.choice(originals)
+        kind = rng.random()
+        if kind < 0.3:
+            stream.append(original)
+        elif kind < 0.5:
+            stream.append(original.upper() + "  ")
+        elif kind < 0.75:
+            stream.append(f"RT @user{rng.randint(0, 999)}: {original}")
+        else:
+            stream.append(" ".join(rng.choices(words, k=rng.randint(10, 30))))
+    return stream
+
+
+def run(statements: int, distance: int) -> None:
+    stream = make_statements(statements)
+    print(f"{statements} statements")
+    print(f"{'cache':>8} {'LLM calls':>10} {'hit rate':>9} {'us/statement':>13}")
+    for name, cache in (
+        ("none", None),
+        ("exact", InMemorySentimentCache()),
+        ("near", InMemorySentimentCache(near_duplicate_distance=distance)),
+    ):
+        llm = CountingLLM()
+        chain = SentimentChain.from_llm(llm, cache=cache)
+        start = time.perf_counter()
+        for statement in stream:
+            chain({"input_documents": [Document(page_content=statement)]})
+        elapsed = time.perf_counter() - start
+        hit_rate = f"{cache.stats.hit_rate:.0%}" if cache is not None else "-"
+        print(f"{name:>8} {llm.calls:>10} {hit_rate:>9} {elapsed / statements * 1e6:>13.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--statements", type=int, default=2000)
+    parser.add_argument("--distance", type=int, default=8)
+    args = parser.parse_args()
+    run(args.statements, args.distance)
@@ -0,0 +1,61 @@
+"""
+Benchmark for the map reduce and early exit modes of SentimentChain.
+
+Scores a large set of documents in a single stuffed prompt, with map reduce
+and with map reduce exiting early, using a fake LLM, and reports the number
+of LLM calls, the prompt tokens and the largest prompt of each mode. Tokens
+are approximated by whitespace separated words.
+
+Usage:
+    python -m benchmarks.bench_sentiment_map_reduce [--documents 500] [--threshold 7]
+"""
+import argparse
+import asyncio
+from typing import List, Optional
+
+from langchain.callbacks.manager import AsyncCallbackManagerForLLMRun
+
+from benchmarks.bench_sentiment_batch import CountingLLM, make_comments
+from langchain_util.chains import SentimentChain
+
+
+class AsyncCountingLLM(CountingLLM):
+    """Counting fake LLM that also tracks the largest prompt."""
+
+    max_prompt_tokens: int = 0
+
+    async def _acall(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+    ) -> str:
+        self.max_prompt_tokens = max(self.max_prompt_tokens, self.get_num_tokens(prompt))
+        await asyncio.sleep(0)
+        return self._call(prompt, stop)
+
+
+def run(documents: int, threshold: float) -> None:
+    docs = [group[0] for group in make_comments(documents)]
+    print(f"{documents} documents")
+    print(f"{'mode':>12} {'calls':>6} {'prompt tokens':>14} {'largest prompt':>15}")
+    modes = (
+        ("stuff", {}),
+        ("map_reduce", {"mode": "map_reduce"}),
+        ("early_exit", {"mode": "map_reduce", "early_exit_confidence": threshold,
+                        "early_exit_min_documents": 10}),
+    )
+    for name, kwargs in modes:
+        llm = AsyncCountingLLM()
+        chain = SentimentChain.from_llm(llm, **kwargs)
+        asyncio.run(chain.acall({"input_documents": docs}))
+        print(f"{name:>12} {llm.calls:>6} {llm.prompt_tokens:>14} {llm.max_prompt_tokens:>15}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=500)
+    parser.add_argument("--threshold", type=float, default=7)
+    args = parser.parse_args()
+    run(args.documents, args.threshold)
@@ -0,0 +1,95 @@
+"""
+Benchmark for the streaming sentiment parser.
+
+Parses a recorded corpus of LLM responses, with the formatting deviations
+seen in practice (missing fences, single quotes, trailing commas, plain
+text, explanations after the JSON), with the strict StructuredOutputParser
+and with the streaming parser, and reports the retry rate, i.e. responses
+that can't be parsed, and the tokens and simulated latency until the
+result is available. The strict parser needs the complete response.
+
+Usage:
+    python -m benchmarks.bench_sentiment_streaming [--responses 1000] [--token-latency 0.02]
+"""
+import argparse
+import random
+import re
+from statistics import mean
+from typing import List
+
+from langchain.schema import OutputParserException
+
+from langchain_util.chains.sentiment.parser import PARSER
+from langchain_util.chains.sentiment.streaming_parser import StreamingSentimentParser
+
+EXPLANATION = ("\nThe statement expresses a clear opinion about the product, the author mentions "
+               "several details that support this assessment.")
+
+TEMPLATES = [
+    '```json\n{{"sentiment": "{s}", "confidence": "{c}"}}\n```',
+    '```json\n{{"sentiment": "{s}", "confidence": "{c}"}}\n```' + EXPLANATION,
+    '{{"sentiment": "{s}", "confidence": "{c}"}}',
+    "```json\n{{'sentiment': '{s}', 'confidence': '{c}',}}\n```",
+    '```\n{{sentiment: {s}, confidence: {c}}}\n```',
+    "Sentiment: {word}\nConfidence: {c}/10" + EXPLANATION,
+    "The sentiment of the statement is {word} with a confidence of {c}.",
+    'Here is my analysis:\n{{"sentiment": "{s}", "confidence": "{c}"}}' + EXPLANATION,
+]
+
+WORDS = {-1: "negative", 0: "neutral", 1: "positive"}
+
+
+def tokenize(text: str) -> List[str]:
+    return re.findall(r"\w+|\s+|[^\w\s]", text)
+
+
+def make_responses(n: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    responses = []
+    for _ in range(n):
+        sentiment = rng.choice((-1, 0, 1))
+        responses.append(rng.choice(TEMPLATES).format(
+            s=sentiment, c=rng.randint(1, 10), word=WORDS[sentiment]))
+    return responses
+
+
+def run(n: int, token_latency: float) -> None:
+    responses = make_responses(n)
+    strict_failures = 0
+    strict_tokens = []
+    streaming_failures = 0
+    streaming_tokens = []
+    for response in responses:
+        tokens = tokenize(response)
+        strict_tokens.append(len(tokens))
+        try:
+            PARSER.parse(response)
+        except OutputParserException:
+            strict_failures += 1
+
+        parser = StreamingSentimentParser()
+        for token in tokens:
+            if parser.feed(token) is not None:
+                break
+        try:
+            parser.finish()
+            streaming_tokens.append(parser.tokens_to_result)
+        except OutputParserException:
+            streaming_failures += 1
+
+    print(f"{n} responses, {mean(len(tokenize(r)) for r in responses):.1f} tokens on average, "
+          f"{token_latency * 1000:g} ms per token")
+    print(f"{'parser':>10} {'retry rate':>11} {'tokens to result':>17} {'latency ms':>11}")
+    for name, failures, tokens in (("strict", strict_failures, strict_tokens),
+                                   ("streaming", streaming_failures, streaming_tokens)):
+        print(f"{name:>10} {failures / n:>11.1%} {mean(tokens):>17.1f} "
+              f"{mean(tokens) * token_latency * 1000:>11.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--responses", type=int, default=1000)
+    parser.add_argument("--token-latency", type=float, default=0.02)
+    args = parser.parse_args()
+    run(args.responses, args.token_latency)
@@ -0,0 +1,96 @@
+"""
+Benchmark for the local pre-classifier tier of SentimentChain.
+
+Scores synthetic comments, mostly clearly positive or negative with some
+mixed and neutral ones, with the LLM only, with a LexiconSentimentScorer tier
+and with a HashedLogisticSentimentScorer tier trained on LLM results of a
+separate sample. The fake LLM knows the true sentiment of each comment.
+Reports the LLM calls, the share resolved locally, the agreement of the
+results with the LLM, the time spent per comment without the LLM round trip
+and the estimated total time for a given round trip. The training sample
+shares the comment templates, so the logistic tier is a best case.
+
+Usage:
+    python -m benchmarks.bench_sentiment_tiered [--comments 2000] [--threshold 8] [--llm-latency 0.5]
+"""
+import argparse
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+
+from langchain.callbacks.manager import CallbackManagerForLLMRun
+from langchain.docstore.document import Document
+
+from benchmarks.bench_sentiment_batch import CountingLLM
+from langchain_util.chains import SentimentChain
+from langchain_util.chains.sentiment.local import HashedLogisticSentimentScorer, LexiconSentimentScorer
+
+SUBJECTS = ["the phone", "the delivery", "customer service", "the app", "this laptop", "the price"]
+POSITIVE = ["I absolutely love {s}, amazing", "{s} is excellent, highly recommended",
+            "really great experience with {s}, fantastic", "{s} is perfect, the best I have had"]
+NEGATIVE = ["I hate {s}, terrible", "{s} is awful, what a waste", "worst experience with {s}, horrible",
+            "{s} is broken and useless, very disappointed"]
+MIXED = ["{s} is good but the support was terrible", "not bad, {s} could be better",
+         "I liked {s} at first but it is slow now"]
+NEUTRAL = ["I bought {s} last week", "{s} arrived on Tuesday", "does {s} come in blue?"]
+KINDS = ((POSITIVE, 1, 0.45), (NEGATIVE, -1, 0.35), (MIXED, -1, 0.1), (NEUTRAL, 0, 0.1))
+
+
+class OracleLLM(CountingLLM):
+    """Counting fake LLM answering with the true sentiment of the statement."""
+
+    truth: Dict[str, int] = {}
+
+    def _call(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+    ) -> str:
+        self.calls += 1
+        self.prompt_tokens += self.get_num_tokens(prompt)
+        statement = prompt.split("STATEMENT:")[1].split("YOUR RESPONSE:")[0].strip()
+        return f'```json\n{{"sentiment": "{self.truth[statement]}", "confidence": "9"}}\n```'
+
+
+def make_comments(comments: int, seed: int = 0) -> List[Tuple[str, int]]:
+    rng = random.Random(seed)
+    templates = [t for kind, _, _ in KINDS for t in kind]
+    weights = [w / len(kind) for kind, _, w in KINDS for _ in kind]
+    labels = {t: label for kind, label, _ in KINDS for t in kind}
+    result = []
+    for template in rng.choices(templates, weights=weights, k=comments):
+        text = template.format(s=rng.choice(SUBJECTS))
+        result.append((text[0].upper() + text[1:] + rng.choice(["", "!", ".", " :)"]), labels[template]))
+    return result
+
+
+def run(comments: int, threshold: float, llm_latency: float) -> None:
+    test = make_comments(comments)
+    train = make_comments(comments, seed=1)
+    truth = dict(test + train)
+    logistic = HashedLogisticSentimentScorer().fit([t for t, _ in train], [s for _, s in train])
+
+    print(f"{comments} comments, threshold {threshold:g}, {llm_latency * 1000:g} ms per LLM call")
+    print(f"{'tier':>9} {'llm calls':>10} {'local':>7} {'agreement':>10} {'ms each':>9} {'est. s':>8}")
+    for name, scorer in (("llm", None), ("lexicon", LexiconSentimentScorer()), ("logistic", logistic)):
+        llm = OracleLLM(truth=truth)
+        chain = SentimentChain.from_llm(llm, local_scorer=scorer, local_confidence_threshold=threshold)
+        start = time.perf_counter()
+        results = [chain({"input_documents": [Document(page_content=text)]}, return_only_outputs=True)
+                   for text, _ in test]
+        elapsed = time.perf_counter() - start
+        agreement = sum(int(r["sentiment"]) == label for r, (_, label) in zip(results, test)) / comments
+        stats = chain.routing_stats
+        print(f"{name:>9} {stats.llm:>10} {stats.local_rate:>7.1%} {agreement:>10.1%} "
+              f"{elapsed / comments * 1000:>9.3f} {elapsed + stats.llm * llm_latency:>8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--comments", type=int, default=2000)
+    parser.add_argument("--threshold", type=float, default=8)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    args = parser.parse_args()
+    run(args.comments, args.threshold, args.llm_latency)
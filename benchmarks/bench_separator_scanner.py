@@ -0,0 +1,131 @@
+"""
+Benchmark for the separator scanner of the recursive splitters.
+
+Splits large synthetic documents with MarkdownTextSplitterWithContext and
+compares against the previous implementation, which rescanned and copied the
+text at every recursion level, checking that both produce the same chunks.
+Besides regular markdown, a single line document and a document without
+whitespace exercise the deeper levels of the recursion.
+
+Usage:
+    python -m benchmarks.bench_separator_scanner [--sizes 100000 1000000]
+"""
+import argparse
+import random
+import time
+from typing import Callable, List, Tuple
+
+from langchain_util.text_splitter import (
+    MarkdownTextSplitterWithContext,
+    RecursiveCharacterTextSplitterWithContext,
+)
+
+WORDS = ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur",
+         "adipiscing", "elit", "sed", "do", "eiusmod", "tempor"]
+
+
+def make_markdown(size: int, seed: int = 0) -> str:
+    """Markdown with headings, paragraphs, lists, code blocks and horizontal lines."""
+    rnd = random.Random(seed)
+    parts: List[str] = []
+    length = 0
+    while length < size:
+        block = rnd.random()
+        if block < 0.1:
+            part = "\n" + "#" * rnd.randint(2, 6) + " " + " ".join(rnd.choices(WORDS, k=4))
+        elif block < 0.15:
+            part = "```\n" + "\n".join(" ".join(rnd.choices(WORDS, k=6)) for _ in range(8)) + "\n```\n"
+        elif block < 0.18:
+            part = rnd.choice(["\n***\n", "\n---\n", "\n___\n"])
+        elif block < 0.3:
+            part = "\n".join("- " + " ".join(rnd.choices(WORDS, k=8)) for _ in range(5))
+        else:
+            part = " ".join(rnd.choices(WORDS, k=rnd.randint(20, 400)))
+        parts.append(part)
+        length += len(part) + 2
+    return "\n\n".join(parts)
+
+
+def make_single_line(size: int, seed: int = 0) -> str:
+    """A markdown document on a single line, the splitter has to go down to the spaces."""
+    return make_markdown(size, seed).replace("\n", " ")
+
+
+def make_no_whitespace(size: int, seed: int = 0) -> str:
+    """Text without any separator, e.g. an embedded base64 blob, split per character."""
+    rnd = random.Random(seed)
+    return "".join(rnd.choices("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/", k=size))
+
+
+DOCUMENTS = {
+    "markdown": make_markdown,
+    "single-line": make_single_line,
+    "no-whitespace": make_no_whitespace,
+}
+
+
+def legacy_split_text(splitter: RecursiveCharacterTextSplitterWithContext,
+                      text: str, chunk_size: int) -> List[str]:
+    """The string based recursion the separator scanner replaced."""
+    final_chunks = []
+    separator = splitter._separators[-1]
+    for _s in splitter._separators:
+        if _s == "":
+            separator = _s
+            break
+        if _s in text:
+            separator = _s
+            break
+    if separator:
+        splits = text.split(separator)
+    else:
+        splits = list(text)
+    _good_splits = []
+    for s in splits:
+        if splitter._length_function(s) < chunk_size:
+            _good_splits.append(s)
+        else:
+            if _good_splits:
+                final_chunks.extend(splitter._merge_splits(_good_splits, separator, chunk_size))
+                _good_splits = []
+            final_chunks.extend(legacy_split_text(splitter, s, chunk_size))
+    if _good_splits:
+        final_chunks.extend(splitter._merge_splits(_good_splits, separator, chunk_size))
+    return final_chunks
+
+
+def _best_time(fn: Callable[[], List[str]], repeat: int) -> Tuple[float, List[str]]:
+    """The best time of a few runs, splitting times are noisy."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run(sizes: List[int], chunk_size: int, chunk_overlap: int, repeat: int) -> None:
+    splitter = MarkdownTextSplitterWithContext(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    print(f"chunk_size={chunk_size} chunk_overlap={chunk_overlap}")
+    print(f"{'document':>14} {'chars':>10} {'chunks':>8} {'legacy s':>9} {'scanner s':>10} {'speedup':>8}")
+    for name, make_document in DOCUMENTS.items():
+        for size in sizes:
+            text = make_document(size)
+            legacy, expected = _best_time(
+                lambda: legacy_split_text(splitter, text, chunk_size), repeat)
+            current, result = _best_time(
+                lambda: splitter.split_text(text, chunk_size), repeat)
+            assert result == expected, "outputs differ"
+            print(f"{name:>14} {len(text):>10} {len(result):>8} {legacy:>9.3f} "
+                  f"{current:>10.3f} {legacy / current:>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.sizes, args.chunk_size, args.chunk_overlap, args.repeat)
@@ -0,0 +1,360 @@
+"""
+Benchmark suite of the splitters and chains with regression tracking.
+
+Runs a fixed set of deterministic cases and writes the results as JSON:
+
+- splitter/*: RecursiveCharacterTextSplitterWithContext and
+  MarkdownTextSplitterWithContext over synthetic markdown documents. Each
+  case changes one of the document size, chunk size, overlap and context
+  length of a base configuration.
+- length/*: characters versus tokens, measured by a token counting length
+  function and by TokenTextSplitterWithContext, a regex word tokenizer
+  stands in for a real tokenizer.
+- chains/*: SentimentChain, ConcatenateChain and AgentAsTool against fake
+  LLMs and chains answering after a simulated latency.
+
+Each case is run once to warm up, which also picks how many times it is run
+in a row to take at least --min-time seconds, then measured repeat times.
+The minimum and median seconds of a single run are reported. With
+--baseline the results are compared to a previous results file, a case
+regresses when its time grows by more than its threshold, in which case the
+exit status is 1. benchmarks/baseline.json
+holds the results of the reference machine, save new results over it when
+a change is expected to move the numbers or when using another machine.
+
+Usage:
+    python -m benchmarks.bench_suite [--repeat 5] [--min-time 0.2] [--scale 1.0] [--latency 0.005]
+                                     [--filter 'splitter/*']
+                                     [--output results.json] [--baseline benchmarks/baseline.json]
+                                     [--threshold 0.25] [--case-threshold 'chains/*=0.3']
+                                     [--metric min]
+"""
+import argparse
+import asyncio
+import fnmatch
+import gc
+import json
+import math
+import platform
+import random
+import statistics
+import sys
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain.agents import AgentType, Tool, initialize_agent
+from langchain.docstore.document import Document
+
+from benchmarks.bench_agent_as_tool import ScriptedLLM, alookup
+from benchmarks.bench_concatenate_fanout import LatencyChain
+from benchmarks.bench_sentiment_abatch import SleepingLLM
+from benchmarks.bench_token_splitter import CountingTokenizer
+from langchain_util.chains import ConcatenateChain, SentimentChain
+from langchain_util.text_splitter import (
+    MarkdownTextSplitterWithContext, RecursiveCharacterTextSplitterWithContext,
+    TokenTextSplitterWithContext
+)
+from langchain_util.tools import AgentAsTool
+from langchain_util.tools.cache import ToolResultCache
+
+WORDS = ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur",
+         "adipiscing", "elit", "sed", "do", "eiusmod", "tempor"]
+
+CORPUS_CHARS = 400_000
+"""Characters split by each splitter case at scale 1, whatever the document size."""
+
+
+@dataclass
+class Case:
+    """A benchmark, prepare is called untimed before each run and returns the timed function."""
+
+    name: str
+    prepare: Callable[[], Callable[[], Any]]
+
+
+def make_document(chars: int, rng: random.Random) -> str:
+    """A markdown document of about chars characters with headings, paragraphs, lists and code."""
+    parts: List[str] = []
+    size = 0
+    while size < chars:
+        block = rng.random()
+        if block < 0.1:
+            text = f"## {' '.join(rng.choices(WORDS, k=4)).title()}"
+        elif block < 0.2:
+            text = "\n".join(f"- {' '.join(rng.choices(WORDS, k=6))}" for _ in range(rng.randint(2, 5)))
+        elif block < 0.25:
+            text = "```\n" + "\n".join(f"{rng.choice(WORDS)} = {rng.randint(0, 99)}" for _ in range(4)) + "\n```"
+        else:
+            text = " ".join(
+                " ".join(rng.choices(WORDS, k=rng.randint(6, 20))).capitalize() + "."
+                for _ in range(rng.randint(2, 6)))
+        parts.append(text)
+        size += len(text) + 2
+    return "\n\n".join(parts)[:chars]
+
+
+def make_corpus(document_chars: int, scale: float) -> List[str]:
+    rng = random.Random(document_chars)
+    documents = max(int(CORPUS_CHARS * scale) // document_chars, 1)
+    return [make_document(document_chars, rng) for _ in range(documents)]
+
+
+BASE_SPLIT = {"doc": 20_000, "chunk": 1024, "overlap": 100, "context": 0}
+SPLIT_VARIATIONS = {"doc": (1_000, 200_000), "chunk": (256, 4096), "overlap": (0,), "context": (128,)}
+
+
+def splitter_cases(scale: float) -> Iterator[Case]:
+    """The base configuration and the variations of each of its settings, for both splitters."""
+    configs = [BASE_SPLIT] + [
+        {**BASE_SPLIT, setting: value}
+        for setting, values in SPLIT_VARIATIONS.items() for value in values
+    ]
+    corpora = {config["doc"]: make_corpus(config["doc"], scale) for config in configs}
+    splitters = (("recursive", RecursiveCharacterTextSplitterWithContext),
+                 ("markdown", MarkdownTextSplitterWithContext))
+    for splitter_name, splitter_cls in splitters:
+        for config in configs:
+            context = make_document(config["context"], random.Random(0)) if config["context"] else ""
+            name = f"splitter/{splitter_name}/" + "/".join(f"{key}={value}" for key, value in config.items())
+            yield Case(name, _split(
+                splitter_cls, corpora[config["doc"]], config["chunk"], config["overlap"], context))
+
+
+def _split(splitter_cls: type, corpus: List[str], chunk_size: int, overlap: int,
+           context: str) -> Callable[[], Callable[[], Any]]:
+    def prepare() -> Callable[[], Any]:
+        splitter = splitter_cls(chunk_size=chunk_size, chunk_overlap=overlap)
+        # The splitter pops the context from the metadata
+        metadatas = [{"chunk-context": context} if context else {} for _ in corpus]
+        return lambda: splitter.create_documents(corpus, metadatas)
+    return prepare
+
+
+def length_function_cases(scale: float) -> Iterator[Case]:
+    corpus = make_corpus(20_000, scale / 4)
+
+    def characters() -> Callable[[], Any]:
+        splitter = RecursiveCharacterTextSplitterWithContext(chunk_size=1024, chunk_overlap=100)
+        return lambda: splitter.create_documents(corpus)
+
+    def token_length_function() -> Callable[[], Any]:
+        splitter = RecursiveCharacterTextSplitterWithContext(
+            chunk_size=256, chunk_overlap=25, length_function=CountingTokenizer().count)
+        return lambda: splitter.create_documents(corpus)
+
+    def token_splitter() -> Callable[[], Any]:
+        splitter = TokenTextSplitterWithContext(CountingTokenizer(), chunk_size=256, chunk_overlap=25)
+        return lambda: splitter.create_documents(corpus)
+
+    yield Case("length/characters", characters)
+    yield Case("length/tokens", token_length_function)
+    yield Case("length/token-splitter", token_splitter)
+
+
+def chain_cases(latency: float) -> Iterator[Case]:
+    def sentiment() -> Callable[[], Any]:
+        chain = SentimentChain.from_llm(SleepingLLM(latency=latency))
+        groups = [[Document(page_content=f"Comment number {i}, great product")] for i in range(64)]
+        return lambda: asyncio.run(chain.amap(groups, max_concurrency=8))
+
+    def concatenate(run_async: bool) -> Callable[[], Callable[[], Any]]:
+        def prepare() -> Callable[[], Any]:
+            rng = random.Random(0)
+            chain = ConcatenateChain(
+                input_chains=[LatencyChain(name=f"key{i}", latency=rng.uniform(latency, 4 * latency))
+                              for i in range(6)],
+                keys=None, output_key="output")
+            if run_async:
+                return lambda: asyncio.run(chain.arun(text="hi"))
+            return lambda: chain.run(text="hi")
+        return prepare
+
+    def agent_tool(cached: bool) -> Callable[[], Callable[[], Any]]:
+        def prepare() -> Callable[[], Any]:
+            agent = initialize_agent(
+                [Tool(name="lookup", func=str, coroutine=alookup, description="Looks up anything")],
+                ScriptedLLM(steps=3, latency=latency), agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION)
+            kwargs = {"cache": ToolResultCache(), "single_flight": True} if cached else {}
+            tool = AgentAsTool(name="research", description="Researches a question", agent=agent, **kwargs)
+            queries = [f"question number {i % 8}" for i in range(32)]
+
+            async def ask_all() -> List[str]:
+                return await asyncio.gather(*(tool.arun(query) for query in queries))
+            return lambda: asyncio.run(ask_all())
+        return prepare
+
+    yield Case("chains/sentiment/amap", sentiment)
+    yield Case("chains/concatenate/threads", concatenate(run_async=False))
+    yield Case("chains/concatenate/async", concatenate(run_async=True))
+    yield Case("chains/agent_as_tool/arun", agent_tool(cached=False))
+    yield Case("chains/agent_as_tool/arun-single-flight", agent_tool(cached=True))
+
+
+def all_cases(scale: float, latency: float) -> Iterator[Case]:
+    yield from splitter_cases(scale)
+    yield from length_function_cases(scale)
+    yield from chain_cases(latency)
+
+
+def _time(case: Case, loops: int) -> float:
+    """Seconds of loops runs of the case, with the garbage collector paused."""
+    elapsed = 0.0
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(loops):
+            run = case.prepare()
+            start = time.perf_counter()
+            run()
+            elapsed += time.perf_counter() - start
+    finally:
+        gc.enable()
+    return elapsed
+
+
+def measure(case: Case, repeat: int, min_time: float) -> Dict[str, Any]:
+    """
+    Runs the case once to warm up and pick the number of loops that take at
+    least min_time, then measures repeat times the seconds of a single run.
+    """
+    warmup = _time(case, 1)
+    loops = max(1, math.ceil(min_time / warmup)) if warmup > 0 else 1
+    times = [_time(case, loops) / loops for _ in range(repeat)]
+    return {"min": min(times), "median": statistics.median(times), "repeat": repeat, "loops": loops}
+
+
+def environment() -> Dict[str, str]:
+    import langchain
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "langchain": getattr(langchain, "__version__", "unknown"),
+    }
+
+
+def parse_case_thresholds(values: Sequence[str]) -> List[Tuple[str, float]]:
+    """Parses PATTERN=FRACTION values, the patterns are matched with fnmatch."""
+    thresholds = []
+    for value in values:
+        pattern, sep, fraction = value.rpartition("=")
+        if not sep or not pattern:
+            raise ValueError(f"Case thresholds are given as PATTERN=FRACTION, got {value!r}")
+        thresholds.append((pattern, float(fraction)))
+    return thresholds
+
+
+def threshold_for(name: str, default: float, case_thresholds: Sequence[Tuple[str, float]]) -> float:
+    """The threshold of the last pattern matching the case, default if none does."""
+    threshold = default
+    for pattern, fraction in case_thresholds:
+        if fnmatch.fnmatchcase(name, pattern):
+            threshold = fraction
+    return threshold
+
+
+def compare(
+    results: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Dict[str, Any]],
+    metric: str,
+    threshold: float,
+    case_thresholds: Sequence[Tuple[str, float]] = (),
+) -> List[Dict[str, Any]]:
+    """
+    Compares each result to the baseline, the status of a case is "regression"
+    when it is slower than the baseline by more than its threshold, "improvement"
+    when faster by more than its threshold, "new" when not in the baseline and
+    "ok" otherwise.
+    """
+    comparisons = []
+    for name, result in results.items():
+        allowed = threshold_for(name, threshold, case_thresholds)
+        if name not in baseline:
+            comparisons.append({"name": name, "status": "new", "current": result[metric]})
+            continue
+        before, current = baseline[name][metric], result[metric]
+        change = current / before - 1 if before else 0.0
+        status = "regression" if change > allowed else "improvement" if change < -allowed else "ok"
+        comparisons.append({"name": name, "status": status, "baseline": before, "current": current,
+                            "change": change, "threshold": allowed})
+    return comparisons
+
+
+def run(
+    repeat: int,
+    min_time: float,
+    scale: float,
+    latency: float,
+    patterns: Sequence[str],
+    output: Optional[str],
+    baseline_path: Optional[str],
+    metric: str,
+    threshold: float,
+    case_thresholds: Sequence[Tuple[str, float]],
+) -> int:
+    """Runs the cases, returns the number of regressions."""
+    baseline = None
+    if baseline_path is not None:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        if baseline.get("config") != {"scale": scale, "latency": latency}:
+            print(f"warning: the baseline was run with {baseline.get('config')}, "
+                  f"not scale={scale} latency={latency}", file=sys.stderr)
+    results: Dict[str, Dict[str, Any]] = {}
+    print(f"{'case':<72} {'min s':>9} {'median s':>9}")
+    for case in all_cases(scale, latency):
+        if patterns and not any(fnmatch.fnmatchcase(case.name, pattern) for pattern in patterns):
+            continue
+        results[case.name] = measure(case, repeat, min_time)
+        print(f"{case.name:<72} {results[case.name]['min']:>9.4f} {results[case.name]['median']:>9.4f}")
+
+    report = {"environment": environment(), "config": {"scale": scale, "latency": latency},
+              "results": results}
+    if output is not None:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write("\n")
+    if baseline is None:
+        return 0
+
+    comparisons = compare(results, baseline["results"], metric, threshold, case_thresholds)
+    print()
+    print(f"compared to {baseline_path} on the {metric} time")
+    for comparison in comparisons:
+        if comparison["status"] in ("regression", "improvement"):
+            print(f"{comparison['status']:>12} {comparison['name']:<72} {comparison['baseline']:.4f}s -> "
+                  f"{comparison['current']:.4f}s ({comparison['change']:+.1%}, "
+                  f"threshold {comparison['threshold']:.0%})")
+        elif comparison["status"] == "new":
+            print(f"{'new':>12} {comparison['name']}")
+    counts = {status: sum(c["status"] == status for c in comparisons)
+              for status in ("ok", "improvement", "regression", "new")}
+    print(", ".join(f"{count} {status}" for status, count in counts.items()))
+    return counts["regression"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2,
+                        help="Seconds each measurement runs a case for, at least")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="Multiplies the size of the splitter corpora")
+    parser.add_argument("--latency", type=float, default=0.005,
+                        help="Seconds per call of the fake LLMs and chains")
+    parser.add_argument("--filter", action="append", default=[], metavar="PATTERN",
+                        help="Only run the cases matching the fnmatch pattern, can be repeated")
+    parser.add_argument("--output", help="File to write the results to, as JSON")
+    parser.add_argument("--baseline", help="Results file to compare to")
+    parser.add_argument("--metric", choices=("min", "median"), default="min")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Fraction a case can slow down by before it is a regression")
+    parser.add_argument("--case-threshold", action="append", default=[], metavar="PATTERN=FRACTION",
+                        help="Threshold of the cases matching the fnmatch pattern, can be repeated")
+    args = parser.parse_args()
+    regressions = run(args.repeat, args.min_time, args.scale, args.latency, args.filter, args.output, args.baseline,
+                      args.metric, args.threshold, parse_case_thresholds(args.case_threshold))
+    sys.exit(1 if regressions else 0)
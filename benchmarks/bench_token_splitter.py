@@ -0,0 +1,82 @@
+"""
+Benchmark for the token aware splitter.
+
+Splits documents with the recursive splitter using a token counting length
+function, which tokenizes every split at every recursion level, and with
+TokenTextSplitterWithContext, which tokenizes each document once. A regex
+word tokenizer stands in for a real tokenizer and the number of characters
+it tokenizes is reported.
+
+Usage:
+    python -m benchmarks.bench_token_splitter [--documents 200] [--chunk-size 256]
+"""
+import argparse
+import random
+import re
+import time
+from typing import List, Tuple
+
+from langchain.docstore.document import Document
+
+from langchain_util.text_splitter import (
+    RecursiveCharacterTextSplitterWithContext, TokenTextSplitterWithContext
+)
+
+_TOKEN = re.compile(r"\s*\S+")
+
+
+class CountingTokenizer:
+    """Regex word tokenizer that counts the characters it tokenizes."""
+
+    def __init__(self):
+        self.characters = 0
+
+    def __call__(self, text: str) -> List[Tuple[int, int]]:
+        self.characters += len(text)
+        return [match.span() for match in _TOKEN.finditer(text)]
+
+    def count(self, text: str) -> int:
+        return len(self(text))
+
+
+def make_corpus(documents: int) -> List[str]:
+    rng = random.Random(0)
+    words = [f"word{i}" for i in range(1000)]
+    return [
+        "\n\n".join(
+            "\n".join(" ".join(rng.choices(words, k=rng.randint(5, 40))) for _ in range(5))
+            for _ in range(20)
+        )
+        for _ in range(documents)
+    ]
+
+
+def run(documents: int, chunk_size: int) -> None:
+    texts = make_corpus(documents)
+    total = sum(map(len, texts))
+    print(f"{documents} documents, {total} characters, chunk_size {chunk_size} tokens")
+    print(f"{'splitter':>10} {'chunks':>8} {'seconds':>8} {'tokenized':>12}")
+    for name in ("recursive", "token"):
+        tokenizer = CountingTokenizer()
+        if name == "recursive":
+            splitter = RecursiveCharacterTextSplitterWithContext(
+                chunk_size=chunk_size, chunk_overlap=chunk_size // 10,
+                length_function=tokenizer.count)
+        else:
+            splitter = TokenTextSplitterWithContext(
+                tokenizer=tokenizer, chunk_size=chunk_size, chunk_overlap=chunk_size // 10)
+        corpus = [Document(page_content=text) for text in texts]
+        start = time.perf_counter()
+        chunks = splitter.split_documents(corpus)
+        elapsed = time.perf_counter() - start
+        print(f"{name:>10} {len(chunks):>8} {elapsed:>8.2f} "
+              f"{tokenizer.characters / total:>11.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--chunk-size", type=int, default=256)
+    args = parser.parse_args()
+    run(args.documents, args.chunk_size)
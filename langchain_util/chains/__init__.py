@@ -1,7 +1,29 @@
-from langchain_util.chains.concatenate_chain import ConcatenateChain
-from langchain_util.chains.sentiment.sentiment_chain import SentimentChain
+"""Chains, imported on first access so importing the package stays cheap."""
+from typing import TYPE_CHECKING, Any, List
 
-__all_= [
+if TYPE_CHECKING:
+    from langchain_util.chains.concatenate_chain import ConcatenateChain
+    from langchain_util.chains.sentiment.sentiment_chain import SentimentChain
+
+_EXPORTS = {
+    "ConcatenateChain": "langchain_util.chains.concatenate_chain",
+    "SentimentChain": "langchain_util.chains.sentiment.sentiment_chain",
+}
+
+__all__ = [
     "ConcatenateChain",
     "SentimentChain"
-]
\ No newline at end of file
+]
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    # __import__ rather than importlib.import_module, so the import is reported by python -X importtime
+    value = getattr(__import__(_EXPORTS[name], fromlist=[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted([*globals(), *_EXPORTS])
@@ -1,41 +1,258 @@
-from typing import Dict, List, Optional
+import asyncio
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+from langchain.callbacks.base import AsyncCallbackHandler, BaseCallbackHandler, BaseCallbackManager
+from langchain.callbacks.manager import (
+    AsyncCallbackManager,
+    AsyncCallbackManagerForChainRun,
+    CallbackManagerForChainRun,
+    Callbacks,
+)
 from langchain.chains.base import Chain
-from pydantic import Extra
+from pydantic import Extra, root_validator
+
+
+@dataclass
+class ConcatenateChunk:
+    """A piece of the output of ConcatenateChain.astream."""
+
+    text: str
+    """A `key: value` segment, or a token of the segment when is_token."""
+    key: str
+    is_token: bool = False
+
 
 class ConcatenateChain(Chain):
     """
     A custom chain that takes the output of another chain and concatenates
     the different values of the output into a single string and returns it.
+
+    With input_chains, several chains are run concurrently on the same inputs,
+    in threads for _call and with asyncio for _acall, and their outputs are
+    concatenated in the order of the chains.
+
+    astream yields the `key: value` segments of the output, and optionally
+    the tokens streamed by the chains, as soon as they are available. With
+    streaming, _call and _acall emit the segments through on_text.
     """
-    input_chain: Chain
+    input_chain: Optional[Chain] = None
     """The input chain whose output will be concatenated."""
-    
+
+    input_chains: Optional[List[Chain]] = None
+    """Input chains run concurrently, used instead of input_chain."""
+
     keys: Optional[List[str]]
     """An optional list of keys to include in the concatenation."""
-    
+
     output_key: str
     """The name of the key in the final output."""
 
+    max_workers: Optional[int] = None
+    """Maximum number of input chains run at a time by _call, all of them if None."""
+
+    streaming: bool = False
+    """Emit each `key: value` segment through the on_text callback as soon as it and
+    the previous segments are available."""
+
     class Config:
         """Configuration for this pydantic object."""
 
         extra = Extra.forbid
         arbitrary_types_allowed = True
 
+    @root_validator()
+    def validate_input_chains(cls, values: Dict) -> Dict:
+        if (values.get("input_chain") is None) == (not values.get("input_chains")):
+            raise ValueError("Exactly one of input_chain or input_chains must be provided")
+        return values
+
+    @property
+    def chains(self) -> List[Chain]:
+        """The input chains, in the order their outputs are concatenated."""
+        return [self.input_chain] if self.input_chain is not None else self.input_chains
+
     @property
     def input_keys(self) -> List[str]:
-        return self.input_chain.input_keys
+        keys = []
+        for chain in self.chains:
+            keys.extend(key for key in chain.input_keys if key not in keys)
+        return keys
 
     @property
     def output_keys(self) -> List[str]:
         return [self.output_key]
-    
+
     @property
     def _chain_type(self) -> str:
         return "concatenate_chain"
 
-    def _call(self, inputs: Dict[str, str]) -> Dict[str, str]:
-        input_chain_output = self.input_chain(inputs)
-        keys = self.input_chain.output_keys if self.keys == None else self.keys
-        result = " ".join([f"{key}: {input_chain_output[key]}" for key in keys])
-        return {self.output_key: result}
\ No newline at end of file
+    def _call(
+        self,
+        inputs: Dict[str, Any],
+        run_manager: Optional[CallbackManagerForChainRun] = None,
+    ) -> Dict[str, str]:
+        callbacks = run_manager.get_child() if run_manager else None
+        chains = self.chains
+        pool = ThreadPoolExecutor(max_workers=self.max_workers or len(chains)) if len(chains) > 1 else None
+        futures = [pool.submit(self._run_chain, chain, inputs, callbacks) for chain in chains] if pool else []
+        outputs: Dict[int, Dict[str, Any]] = {}
+        segments = []
+        try:
+            for key, owner in self._segment_owners():
+                for index in (range(len(chains)) if owner is None else [owner]):
+                    if index not in outputs:
+                        outputs[index] = (futures[index].result() if pool
+                                          else self._run_chain(chains[index], inputs, callbacks))
+                segments.append(self._segment(key, owner, inputs, outputs))
+                if self.streaming and run_manager:
+                    run_manager.on_text(segments[-1])
+        finally:
+            if pool:
+                pool.shutdown()
+        return {self.output_key: " ".join(segments)}
+
+    async def _acall(
+        self,
+        inputs: Dict[str, Any],
+        run_manager: Optional[AsyncCallbackManagerForChainRun] = None,
+    ) -> Dict[str, str]:
+        callbacks = run_manager.get_child() if run_manager else None
+        segments = []
+        async for chunk in self._astream(inputs, callbacks, tokens=False):
+            segments.append(chunk.text)
+            if self.streaming and run_manager:
+                await run_manager.on_text(chunk.text)
+        return {self.output_key: " ".join(segments)}
+
+    async def astream(
+        self, inputs: Union[Dict[str, Any], Any], callbacks: Callbacks = None, tokens: bool = False
+    ) -> AsyncIterator[ConcatenateChunk]:
+        """Yields each `key: value` segment of the output as soon as it and the previous
+        segments are available, joining the texts of the segments with " " gives the
+        output of the chain.
+
+        With tokens, the LLM tokens streamed by each chain are yielded as chunks
+        with is_token set before the first segment that needs the chain's output.
+
+        Example:
+        .. code-block:: python
+
+        async for chunk in chain.astream({'topic': 'cats'}):
+            print(chunk.text)
+        """
+        async for chunk in self._astream(self.prep_inputs(inputs), callbacks, tokens):
+            yield chunk
+
+    async def _astream(
+        self, inputs: Dict[str, Any], callbacks: Callbacks, tokens: bool
+    ) -> AsyncIterator[ConcatenateChunk]:
+        chains = self.chains
+        events: asyncio.Queue = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+
+        async def run(index: int, chain: Chain) -> None:
+            chain_callbacks = callbacks
+            if tokens:
+                chain_callbacks = _with_handler(callbacks, _TokenQueueHandler(loop, events, index))
+            try:
+                events.put_nowait((index, "output", await self._arun_chain(chain, inputs, chain_callbacks)))
+            except Exception as e:
+                events.put_nowait((index, "error", e))
+
+        tasks = [asyncio.ensure_future(run(index, chain)) for index, chain in enumerate(chains)]
+        outputs: Dict[int, Dict[str, Any]] = {}
+        streamed: Dict[int, List[str]] = defaultdict(list)
+        # Tokens of each chain already yielded, before the first segment needing its output
+        sent: Dict[int, int] = defaultdict(int)
+        try:
+            for key, owner in self._segment_owners():
+                needed = range(len(chains)) if owner is None else [owner]
+                while True:
+                    for index in needed:
+                        for token in streamed[index][sent[index]:]:
+                            yield ConcatenateChunk(text=token, key=key, is_token=True)
+                        sent[index] = len(streamed[index])
+                    if all(index in outputs for index in needed):
+                        break
+                    index, kind, value = await events.get()
+                    if kind == "token":
+                        streamed[index].append(value)
+                    elif kind == "error":
+                        raise value
+                    else:
+                        outputs[index] = value
+                yield ConcatenateChunk(text=self._segment(key, owner, inputs, outputs), key=key)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _run_chain(self, chain: Chain, inputs: Dict[str, Any], callbacks: Callbacks) -> Dict[str, Any]:
+        return chain(_chain_inputs(chain, inputs), callbacks=callbacks)
+
+    async def _arun_chain(self, chain: Chain, inputs: Dict[str, Any], callbacks: Callbacks) -> Dict[str, Any]:
+        if type(chain)._acall is Chain._acall:
+            # Chains without async support run in a thread, not to block the event loop
+            return await asyncio.get_running_loop().run_in_executor(
+                None, partial(self._run_chain, chain, inputs, callbacks))
+        return await chain.acall(_chain_inputs(chain, inputs), callbacks=callbacks)
+
+    def _segment_owners(self) -> List[Tuple[str, Optional[int]]]:
+        """The keys of the output in order, with the index of the chain producing each,
+        None if the key is not an output key of any chain and all of them are needed."""
+        chains = self.chains
+        if self.keys is None:
+            return [(key, index) for index, chain in enumerate(chains) for key in chain.output_keys]
+        owners = []
+        for key in self.keys:
+            owner = None
+            for index, chain in enumerate(chains):
+                if key in chain.output_keys:
+                    owner = index
+            owners.append((key, owner))
+        return owners
+
+    def _segment(
+        self, key: str, owner: Optional[int], inputs: Dict[str, Any], outputs: Dict[int, Dict[str, Any]]
+    ) -> str:
+        if owner is not None:
+            return f"{key}: {outputs[owner][key]}"
+        merged = dict(inputs)
+        for index in sorted(outputs):
+            merged.update(outputs[index])
+        return f"{key}: {merged[key]}"
+
+
+class _TokenQueueHandler(AsyncCallbackHandler):
+    """Puts the tokens streamed by an input chain in the event queue of astream."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, events: asyncio.Queue, index: int):
+        self.loop = loop
+        self.events = events
+        self.index = index
+
+    async def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        event = (self.index, "token", token)
+        if asyncio.get_running_loop() is self.loop:
+            # Queued right away, so the tokens of a chain come before its output
+            self.events.put_nowait(event)
+        else:
+            # Chains without async support stream from a thread with an event loop of its own
+            self.loop.call_soon_threadsafe(self.events.put_nowait, event)
+
+
+def _with_handler(callbacks: Callbacks, handler: BaseCallbackHandler) -> AsyncCallbackManager:
+    """A new callback manager with the callbacks and an inheritable handler."""
+    if isinstance(callbacks, BaseCallbackManager):
+        return AsyncCallbackManager(
+            handlers=[*callbacks.handlers, handler],
+            inheritable_handlers=[*callbacks.inheritable_handlers, handler],
+            parent_run_id=callbacks.parent_run_id,
+        )
+    return AsyncCallbackManager.configure([*(callbacks or []), handler])
+
+
+def _chain_inputs(chain: Chain, inputs: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: inputs[key] for key in chain.input_keys}
@@ -0,0 +1,78 @@
+# flake8: noqa
+import functools
+from typing import Any
+
+from langchain.chains.prompt_selector import ConditionalPromptSelector, is_chat_model
+from langchain.prompts import PromptTemplate
+from langchain.prompts.chat import (
+    ChatPromptTemplate,
+    HumanMessagePromptTemplate,
+    SystemMessagePromptTemplate,
+)
+from langchain_util.chains.sentiment.parser import get_batch_parser
+
+prompt_template = """Determine the sentiment of each of the following independent STATEMENTS and provide a score on how confident you are of each.
+
+{format_instructions}
+
+STATEMENTS:
+{statements}
+
+YOUR RESPONSE:"""
+
+system_template = """You are a sentiment analyst expert, you determine the sentiment of each of the independent user statements and provide a score from [0,1] on how confident you are of each.
+
+{format_instructions}"""
+
+
+@functools.lru_cache(maxsize=None)
+def get_format_instructions() -> str:
+    return get_batch_parser().get_format_instructions()
+
+
+@functools.lru_cache(maxsize=None)
+def get_batch_prompt() -> PromptTemplate:
+    prompt = PromptTemplate(
+        template=prompt_template, input_variables=[
+            "format_instructions", "statements"]
+    )
+    return prompt.partial(format_instructions=get_format_instructions())
+
+
+@functools.lru_cache(maxsize=None)
+def get_batch_chat_prompt() -> ChatPromptTemplate:
+    system_prompt = PromptTemplate(
+        template=system_template, input_variables=["format_instructions"])
+    system_prompt = system_prompt.partial(format_instructions=get_format_instructions())
+    messages = [
+        SystemMessagePromptTemplate(prompt=system_prompt),
+        HumanMessagePromptTemplate.from_template("{statements}"),
+    ]
+    return ChatPromptTemplate.from_messages(messages)
+
+
+@functools.lru_cache(maxsize=None)
+def get_batch_prompt_selector() -> ConditionalPromptSelector:
+    return ConditionalPromptSelector(
+        default_prompt=get_batch_prompt(), conditionals=[(is_chat_model, get_batch_chat_prompt())]
+    )
+
+
+_LAZY = {
+    "format_instructions": get_format_instructions,
+    "BATCH_PROMPT": get_batch_prompt,
+    "BATCH_CHAT_PROMPT": get_batch_chat_prompt,
+    "BATCH_PROMPT_SELECTOR": get_batch_prompt_selector,
+}
+
+
+def __getattr__(name: str) -> Any:
+    """Builds the prompts when first accessed instead of at import time."""
+    if name in _LAZY:
+        return _LAZY[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def format_statement(index: int, statement: str) -> str:
+    """Formats a statement of a batch, the index is used to match the output objects."""
+    return f"STATEMENT {index}:\n{statement}"
@@ -0,0 +1,397 @@
+"""Caches for the parsed results of SentimentChain.
+
+Results are looked up by a hash of the normalized statement within a
+namespace identifying the prompt and model. Optionally near duplicates, e.g.
+retweets or templated reviews, are found by the SimHash of the statement's
+word shingles: the hash is split into bands so that any hash within the
+maximum Hamming distance shares at least one band with the stored hash, only
+the entries sharing a band are compared.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from langchain_util.text import normalize_text
+
+_WORD = re.compile(r"\w+")
+
+
+# The statements are normalized like any text, kept under its former name
+normalize_statement = normalize_text
+
+
+def simhash(text: str, shingle_size: int = 3) -> int:
+    """64 bit SimHash of the word shingles of a normalized statement."""
+    words = _WORD.findall(text)
+    shingles = (
+        [" ".join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)]
+        if len(words) >= shingle_size else [" ".join(words)]
+    )
+    hashes = [
+        format(int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big"), "064b")
+        for s in shingles
+    ]
+    # Each bit is set if it is set in the hashes of most shingles
+    majority = len(hashes) / 2
+    return int("".join("1" if bits.count("1") > majority else "0" for bits in zip(*hashes)), 2)
+
+
+def _bands(value: int, count: int) -> List[int]:
+    """Splits a 64 bit hash into count bands, the last band takes the remaining bits."""
+    width = 64 // count
+    return [
+        value >> (i * width) & ((1 << (width if i < count - 1 else 64 - i * width)) - 1)
+        for i in range(count)
+    ]
+
+
+def _signed(value: int) -> int:
+    """SQLite integers are signed 64 bit."""
+    return value - 2 ** 64 if value >= 2 ** 63 else value
+
+
+@dataclass
+class SentimentCacheStats:
+    """Counters collected by a sentiment cache."""
+
+    exact_hits: int = 0
+    near_hits: int = 0
+    """Results returned for a near duplicate statement."""
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    """Entries found older than the ttl."""
+
+    @property
+    def hits(self) -> int:
+        return self.exact_hits + self.near_hits
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def reset(self) -> None:
+        self.exact_hits = self.near_hits = self.misses = self.evictions = self.expirations = 0
+
+
+class BaseSentimentCache(ABC):
+    """Interface for caches of parsed sentiment results."""
+
+    def __init__(
+        self,
+        max_entries: int = 100_000,
+        ttl: Optional[float] = None,
+        near_duplicate_distance: Optional[int] = None,
+        shingle_size: int = 3,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        Args:
+            max_entries: Maximum number of results, least recently used results are evicted.
+            ttl: Seconds a result is valid for, results never expire if None.
+            near_duplicate_distance: Maximum Hamming distance between the SimHash
+                of two statements for them to be near duplicates, near duplicate
+                lookups are disabled if None.
+            shingle_size: Number of words of the shingles hashed by SimHash.
+        """
+        if max_entries < 1:
+            raise ValueError(f"max_entries must be 1 or greater, got {max_entries}")
+        if near_duplicate_distance is not None and not 0 <= near_duplicate_distance < 16:
+            raise ValueError(
+                f"near_duplicate_distance must be between 0 and 15, got {near_duplicate_distance}")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.near_duplicate_distance = near_duplicate_distance
+        self.shingle_size = shingle_size
+        self.stats = SentimentCacheStats()
+        self._clock = clock
+
+    def lookup(self, namespace: str, text: str) -> Optional[Dict[str, Any]]:
+        """Returns the result cached for the statement or a near duplicate of it, or None."""
+        normalized = normalize_text(text)
+        result = self._get(self._key(namespace, normalized))
+        if result is not None:
+            self.stats.exact_hits += 1
+            return result
+        if self.near_duplicate_distance is not None:
+            result = self._get_near(
+                namespace, simhash(normalized, self.shingle_size), self.near_duplicate_distance)
+            if result is not None:
+                self.stats.near_hits += 1
+                return result
+        self.stats.misses += 1
+        return None
+
+    def store(self, namespace: str, text: str, result: Dict[str, Any]) -> None:
+        """Caches the parsed result of the statement."""
+        normalized = normalize_text(text)
+        hash_ = (
+            simhash(normalized, self.shingle_size) if self.near_duplicate_distance is not None else None)
+        self._put(self._key(namespace, normalized), namespace, hash_, dict(result))
+
+    def _key(self, namespace: str, normalized: str) -> str:
+        return hashlib.sha256(f"{len(namespace)}:{namespace}{normalized}".encode("utf-8")).hexdigest()
+
+    def _band_count(self) -> int:
+        # Hashes within distance d differ in at most d bands, so they share one of d + 1 bands
+        return (self.near_duplicate_distance or 0) + 1
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl is not None and self._clock() - created > self.ttl
+
+    @abstractmethod
+    def _get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Returns the unexpired result stored under the key."""
+
+    @abstractmethod
+    def _get_near(self, namespace: str, hash_: int, distance: int) -> Optional[Dict[str, Any]]:
+        """Returns the unexpired result of the closest hash within the distance."""
+
+    @abstractmethod
+    def _put(self, key: str, namespace: str, hash_: Optional[int], result: Dict[str, Any]) -> None:
+        """Stores the result, evicting the least recently used results if full."""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Removes all the results."""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Number of results in the cache."""
+
+
+class InMemorySentimentCache(BaseSentimentCache):
+    """A sentiment cache kept in memory."""
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        # key -> (namespace, hash, result, created)
+        self._entries: "OrderedDict[str, Tuple[str, Optional[int], Dict[str, Any], float]]" = OrderedDict()
+        self._bands: Dict[Tuple[str, int, int], Set[str]] = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry[3]):
+                self._remove(key)
+                self.stats.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            return dict(entry[2])
+
+    def _get_near(self, namespace: str, hash_: int, distance: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            candidates = set()
+            for band, value in enumerate(_bands(hash_, self._band_count())):
+                candidates |= self._bands.get((namespace, band, value), set())
+            best: Optional[Tuple[int, str]] = None
+            for key in candidates:
+                candidate_distance = bin(self._entries[key][1] ^ hash_).count("1")
+                if candidate_distance <= distance and (best is None or candidate_distance < best[0]):
+                    best = (candidate_distance, key)
+            if best is None:
+                return None
+            entry = self._entries[best[1]]
+            if self._expired(entry[3]):
+                self._remove(best[1])
+                self.stats.expirations += 1
+                return None
+            self._entries.move_to_end(best[1])
+            return dict(entry[2])
+
+    def _put(self, key: str, namespace: str, hash_: Optional[int], result: Dict[str, Any]) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (namespace, hash_, result, self._clock())
+            if hash_ is not None:
+                for band, value in enumerate(_bands(hash_, self._band_count())):
+                    self._bands[(namespace, band, value)].add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.stats.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        namespace, hash_, _, _ = self._entries.pop(key)
+        if hash_ is not None:
+            for band, value in enumerate(_bands(hash_, self._band_count())):
+                keys = self._bands[(namespace, band, value)]
+                keys.discard(key)
+                if not keys:
+                    del self._bands[(namespace, band, value)]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bands.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+class SQLiteSentimentCache(BaseSentimentCache):
+    """
+    A sentiment cache persisted in a local SQLite database, so that it survives
+    between runs. Least recently used entries are evicted in batches of
+    evict_fraction of max_entries once the cache is full.
+    """
+
+    def __init__(self, path: str, *args: Any, evict_fraction: float = 0.1, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        if not 0 < evict_fraction <= 1:
+            raise ValueError(f"evict_fraction must be in (0, 1], got {evict_fraction}")
+        self.path = path
+        self.evict_fraction = evict_fraction
+        self._connection: Optional[sqlite3.Connection] = None
+        self._size: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self.path, isolation_level=None, check_same_thread=False, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, namespace TEXT NOT NULL, hash INTEGER, "
+                "result TEXT NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS bands ("
+                "namespace TEXT NOT NULL, band INTEGER NOT NULL, value INTEGER NOT NULL, "
+                "key TEXT NOT NULL REFERENCES results (key) ON DELETE CASCADE)"
+            )
+            connection.execute("PRAGMA foreign_keys=ON")
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS bands_lookup ON bands (namespace, band, value)")
+            connection.execute("CREATE INDEX IF NOT EXISTS bands_key ON bands (key)")
+            self._size = connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+            self._connection = connection
+        return self._connection
+
+    def _get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT result, created FROM results WHERE key = ?", (key,)).fetchone()
+            return self._use(key, row)
+
+    def _get_near(self, namespace: str, hash_: int, distance: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            bands = _bands(hash_, self._band_count())
+            rows = self.connection.execute(
+                "SELECT DISTINCT results.key, results.hash FROM bands "
+                "JOIN results ON results.key = bands.key WHERE bands.namespace = ? AND ("
+                + " OR ".join(["(bands.band = ? AND bands.value = ?)"] * len(bands)) + ")",
+                (namespace, *(x for band, value in enumerate(bands) for x in (band, _signed(value))))
+            ).fetchall()
+            best: Optional[Tuple[int, str]] = None
+            for key, candidate in rows:
+                candidate_distance = bin((candidate & (2 ** 64 - 1)) ^ hash_).count("1")
+                if candidate_distance <= distance and (best is None or candidate_distance < best[0]):
+                    best = (candidate_distance, key)
+            if best is None:
+                return None
+            row = self.connection.execute(
+                "SELECT result, created FROM results WHERE key = ?", (best[1],)).fetchone()
+            return self._use(best[1], row)
+
+    def _use(self, key: str, row: Optional[Tuple[str, float]]) -> Optional[Dict[str, Any]]:
+        """Returns the result of the row, removing it if expired and marking it as used otherwise."""
+        if row is None:
+            return None
+        if self._expired(row[1]):
+            self.connection.execute("DELETE FROM results WHERE key = ?", (key,))
+            self._size -= 1
+            self.stats.expirations += 1
+            return None
+        self.connection.execute(
+            "UPDATE results SET last_used = ? WHERE key = ?", (self._clock(), key))
+        return json.loads(row[0])
+
+    def _put(self, key: str, namespace: str, hash_: Optional[int], result: Dict[str, Any]) -> None:
+        now = self._clock()
+        with self._lock:
+            connection = self.connection
+            connection.execute("BEGIN")
+            try:
+                cursor = connection.execute("DELETE FROM results WHERE key = ?", (key,))
+                self._size -= cursor.rowcount
+                connection.execute(
+                    "INSERT INTO results (key, namespace, hash, result, created, last_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, namespace, _signed(hash_) if hash_ is not None else None,
+                     json.dumps(result), now, now))
+                self._size += 1
+                if hash_ is not None:
+                    connection.executemany(
+                        "INSERT INTO bands (namespace, band, value, key) VALUES (?, ?, ?, ?)",
+                        [(namespace, band, _signed(value), key)
+                         for band, value in enumerate(_bands(hash_, self._band_count()))])
+                if self._size > self.max_entries:
+                    excess = self._size - self.max_entries + int(self.max_entries * self.evict_fraction)
+                    cursor = connection.execute(
+                        "DELETE FROM results WHERE key IN "
+                        "(SELECT key FROM results ORDER BY last_used LIMIT ?)", (excess,))
+                    self._size -= cursor.rowcount
+                    self.stats.evictions += cursor.rowcount
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                self._size = connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+                raise
+
+    def clear(self) -> None:
+        with self._lock:
+            self.connection.execute("DELETE FROM results")
+            self._size = 0
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def __len__(self) -> int:
+        with self._lock:
+            # Opening the connection counts the entries
+            self.connection
+            return self._size
+
+    def __getstate__(self) -> dict:
+        # Each process opens its own connection
+        state = self.__dict__.copy()
+        del state["_lock"]
+        state["_connection"] = None
+        state["_size"] = None
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
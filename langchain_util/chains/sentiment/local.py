@@ -0,0 +1,261 @@
+"""Local scorers for the tiered mode of SentimentChain.
+
+A local scorer rates a statement without calling the LLM, in the format of
+the chain outputs: a sentiment of -1, 0 or 1 and a confidence between 0 and
+10. SentimentChain only escalates the statements scored below its
+local_confidence_threshold to the LLM.
+"""
+import re
+import zlib
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from langchain_util.text import normalize_text
+
+_TOKEN = re.compile(r"[\w']+")
+
+SENTIMENTS = (-1, 0, 1)
+
+POSITIVE_WORDS = (
+    "amazing", "awesome", "beautiful", "best", "brilliant", "excellent", "fantastic", "flawless",
+    "incredible", "love", "loved", "loves", "outstanding", "perfect", "superb", "wonderful",
+)
+WEAK_POSITIVE_WORDS = (
+    "recommend", "recommended", "good", "great", "happy", "glad", "nice", "liked",
+    "enjoy", "enjoyed", "pleased", "satisfied", "fast", "helpful", "reliable", "easy", "fun",
+    "impressed", "solid", "thanks", "worth", "better", "favorite", "friendly", "smooth",
+)
+NEGATIVE_WORDS = (
+    "awful", "disgusting", "garbage", "hate", "hated", "hates", "horrible", "scam", "terrible",
+    "useless", "worst", "pathetic", "disaster", "furious", "unacceptable", "rubbish",
+)
+WEAK_NEGATIVE_WORDS = (
+    "bad", "broken", "buggy", "disappointed", "disappointing", "poor", "slow", "annoying",
+    "angry", "upset", "damaged", "late", "expensive", "refund", "problem", "problems", "fail",
+    "failed", "fails", "crash", "crashes", "worse", "waste", "wrong", "unhappy", "sad",
+)
+
+DEFAULT_LEXICON: Dict[str, float] = {
+    **{word: 2.0 for word in POSITIVE_WORDS},
+    **{word: 1.0 for word in WEAK_POSITIVE_WORDS},
+    **{word: -2.0 for word in NEGATIVE_WORDS},
+    **{word: -1.0 for word in WEAK_NEGATIVE_WORDS},
+}
+DEFAULT_NEGATIONS = frozenset((
+    "not", "no", "never", "nothing", "neither", "nor", "without", "hardly", "barely",
+))
+DEFAULT_INTENSIFIERS: Dict[str, float] = {
+    "very": 1.5, "really": 1.5, "so": 1.3, "extremely": 2.0, "absolutely": 2.0, "totally": 1.5,
+    "super": 1.5, "incredibly": 2.0, "slightly": 0.5, "somewhat": 0.5, "kinda": 0.5,
+}
+
+
+def _result(sentiment: int, confidence: float) -> Dict[str, str]:
+    return {"sentiment": str(sentiment), "confidence": f"{round(confidence, 1):g}"}
+
+
+class BaseLocalSentimentScorer(ABC):
+    """Interface for scorers rating statements without calling the LLM."""
+
+    @abstractmethod
+    def score(self, statement: str) -> Dict[str, str]:
+        """The sentiment and confidence of the statement, in the format of the chain outputs."""
+
+    def score_many(self, statements: Sequence[str]) -> List[Dict[str, str]]:
+        return [self.score(statement) for statement in statements]
+
+
+class LexiconSentimentScorer(BaseLocalSentimentScorer):
+    """
+    Sums the polarity of the words of the statement found in a lexicon. A
+    negation flips the polarity of the next negation_window words, an
+    intensifier scales the next word, and the words before a "but" count half.
+    The confidence is 10 * |polarity| / (sum of |word polarities| + smoothing),
+    so it grows with the evidence and drops when the statement is mixed, a
+    statement without lexicon words is neutral with confidence 0.
+    """
+
+    def __init__(
+        self,
+        lexicon: Optional[Mapping[str, float]] = None,
+        negations: Iterable[str] = DEFAULT_NEGATIONS,
+        intensifiers: Optional[Mapping[str, float]] = None,
+        negation_window: int = 3,
+        smoothing: float = 1.0,
+    ):
+        """
+        Args:
+            lexicon: Polarity of each word, defaults to DEFAULT_LEXICON.
+            negations: Words flipping the polarity of the words that follow.
+            intensifiers: Factor applied to the polarity of the next word,
+                defaults to DEFAULT_INTENSIFIERS.
+            negation_window: Number of words following a negation that are flipped.
+            smoothing: Added to the evidence when computing the confidence, the
+                greater the more evidence is needed for a high confidence.
+        """
+        if smoothing <= 0:
+            raise ValueError(f"smoothing must be greater than 0, got {smoothing}")
+        self.lexicon = dict(DEFAULT_LEXICON if lexicon is None else lexicon)
+        self.negations = frozenset(negations)
+        self.intensifiers = dict(DEFAULT_INTENSIFIERS if intensifiers is None else intensifiers)
+        self.negation_window = negation_window
+        self.smoothing = smoothing
+
+    def polarities(self, statement: str) -> List[float]:
+        """Polarity of each lexicon word of the statement, after negations and intensifiers."""
+        polarities: List[float] = []
+        negated = 0
+        factor = 1.0
+        for token in _TOKEN.findall(normalize_text(statement)):
+            if token == "but":
+                polarities = [p / 2 for p in polarities]
+                negated = 0
+            elif token in self.negations or token.endswith("n't"):
+                negated = self.negation_window
+                continue
+            elif token in self.intensifiers:
+                factor = self.intensifiers[token]
+                continue
+            elif token in self.lexicon:
+                polarity = self.lexicon[token] * factor
+                polarities.append(-polarity if negated else polarity)
+            factor = 1.0
+            negated = max(negated - 1, 0)
+        return polarities
+
+    def score(self, statement: str) -> Dict[str, str]:
+        polarities = self.polarities(statement)
+        polarity = sum(polarities)
+        if not polarity:
+            return _result(0, 0)
+        evidence = sum(abs(p) for p in polarities)
+        return _result(1 if polarity > 0 else -1, 10 * abs(polarity) / (evidence + self.smoothing))
+
+
+class HashedLogisticSentimentScorer(BaseLocalSentimentScorer):
+    """
+    Multinomial logistic regression over the hashed word n-grams of the
+    statement, trained with fit on labeled statements, e.g. past LLM results.
+    Features are hashed with crc32 into n_features buckets, so no vocabulary is
+    kept and the model pickles as two arrays. The confidence is 10 times the
+    probability of the predicted sentiment.
+    """
+
+    def __init__(self, n_features: int = 2 ** 18, ngram_range: Tuple[int, int] = (1, 2)):
+        try:
+            import numpy as np
+        except ImportError:
+            raise ValueError(
+                "Could not import numpy python package. "
+                "This is needed for HashedLogisticSentimentScorer. "
+                "Please install it with `pip install numpy`."
+            )
+        self.n_features = n_features
+        self.ngram_range = ngram_range
+        self.weights = np.zeros((n_features, len(SENTIMENTS)))
+        self.bias = np.zeros(len(SENTIMENTS))
+
+    def features(self, statement: str) -> List[int]:
+        """Hashed n-gram buckets of the statement."""
+        words = _TOKEN.findall(normalize_text(statement))
+        low, high = self.ngram_range
+        return [
+            zlib.crc32(" ".join(words[i:i + n]).encode("utf-8")) % self.n_features
+            for n in range(low, high + 1)
+            for i in range(len(words) - n + 1)
+        ]
+
+    def _vectorize(self, statements: Sequence[str]) -> Tuple[Any, Any]:
+        """The features of the statements as the flat bucket and row arrays of a sparse matrix."""
+        import numpy as np
+
+        features = [self.features(statement) for statement in statements]
+        buckets = np.fromiter((b for f in features for b in f), dtype=np.int64)
+        rows = np.repeat(np.arange(len(features)), [len(f) for f in features])
+        return buckets, rows
+
+    def _probabilities(self, buckets: Any, rows: Any, n: int) -> Any:
+        import numpy as np
+
+        logits = np.tile(self.bias, (n, 1))
+        np.add.at(logits, rows, self.weights[buckets])
+        logits -= logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def fit(
+        self,
+        statements: Sequence[str],
+        sentiments: Sequence[Any],
+        epochs: int = 20,
+        learning_rate: float = 0.5,
+        l2: float = 1e-4,
+        batch_size: int = 256,
+        seed: int = 0,
+    ) -> "HashedLogisticSentimentScorer":
+        """Trains with mini batch gradient descent on statements labeled with a sentiment of -1, 0 or 1."""
+        import numpy as np
+
+        labels = np.array([SENTIMENTS.index(int(float(s))) for s in sentiments])
+        features = [np.array(self.features(statement), dtype=np.int64) for statement in statements]
+        rng = np.random.default_rng(seed)
+        for _ in range(epochs):
+            order = rng.permutation(len(statements))
+            for start in range(0, len(order), batch_size):
+                batch = order[start:start + batch_size]
+                buckets = np.concatenate([features[i] for i in batch])
+                rows = np.repeat(np.arange(len(batch)), [len(features[i]) for i in batch])
+                gradient = self._probabilities(buckets, rows, len(batch))
+                gradient[np.arange(len(batch)), labels[batch]] -= 1
+                gradient /= len(batch)
+                self.weights *= 1 - learning_rate * l2
+                np.add.at(self.weights, buckets, -learning_rate * gradient[rows])
+                self.bias -= learning_rate * gradient.sum(axis=0)
+        return self
+
+    def predict_proba(self, statements: Sequence[str]) -> Any:
+        """Probability of each sentiment, in the order of SENTIMENTS, for each statement."""
+        buckets, rows = self._vectorize(statements)
+        return self._probabilities(buckets, rows, len(statements))
+
+    def score(self, statement: str) -> Dict[str, str]:
+        return self.score_many([statement])[0]
+
+    def score_many(self, statements: Sequence[str]) -> List[Dict[str, str]]:
+        if not statements:
+            return []
+        probabilities = self.predict_proba(statements)
+        best = probabilities.argmax(axis=1)
+        return [
+            _result(SENTIMENTS[index], 10 * probabilities[row, index])
+            for row, index in enumerate(best)
+        ]
+
+
+@dataclass
+class SentimentRoutingStats:
+    """Number of statements resolved by each tier of SentimentChain."""
+
+    cache: int = 0
+    local: int = 0
+    """Statements scored by the local scorer with enough confidence."""
+    llm: int = 0
+    """Statements sent to the LLM, escalated from the local scorer when there is one."""
+
+    @property
+    def total(self) -> int:
+        return self.cache + self.local + self.llm
+
+    @property
+    def local_rate(self) -> float:
+        return self.local / self.total if self.total else 0.0
+
+    @property
+    def escalation_rate(self) -> float:
+        """Share of the statements not found in the cache that were sent to the LLM."""
+        scored = self.local + self.llm
+        return self.llm / scored if scored else 0.0
+
+    def reset(self) -> None:
+        self.cache = self.local = self.llm = 0
@@ -1,4 +1,9 @@
+import functools
+import json
+from typing import Any, Dict, List
+
 from langchain.output_parsers import  StructuredOutputParser, ResponseSchema
+from langchain.schema import OutputParserException
 
 response_schemas = [
     ResponseSchema(name="sentiment",
@@ -6,4 +11,82 @@ response_schemas = [
     ResponseSchema(name="confidence", description="The confidence level, a value between 0 and 10"),
 ]
 
-PARSER=StructuredOutputParser.from_response_schemas(response_schemas)
\ No newline at end of file
+batch_response_schemas = [
+    ResponseSchema(name="index", description="The index of the statement, as given in STATEMENT <index>"),
+    *response_schemas,
+]
+
+BATCH_FORMAT_INSTRUCTIONS = """The output should be a markdown code snippet formatted in the following schema, including the leading and trailing "\\`\\`\\`json" and "\\`\\`\\`", with one object per statement:
+
+```json
+[
+\t{{
+{format}
+\t}}
+]
+```"""
+
+
+class BatchStructuredOutputParser(StructuredOutputParser):
+    """Parses a JSON list with one object per statement, each object has the keys of the response schemas."""
+
+    def get_format_instructions(self) -> str:
+        schema_str = "\n".join(
+            f'\t\t"{schema.name}": string  // {schema.description}' for schema in self.response_schemas
+        )
+        return BATCH_FORMAT_INSTRUCTIONS.format(format=schema_str)
+
+    def parse(self, text: str) -> List[Dict[str, Any]]:
+        """Returns the parsed objects, with the index of each object converted to an int."""
+        if "```json" not in text:
+            raise OutputParserException(
+                f"Got invalid return object. Expected markdown code snippet with JSON "
+                f"list, but got:\n{text}"
+            )
+        json_string = text.split("```json")[1].strip().strip("```").strip()
+        try:
+            json_obj = json.loads(json_string)
+        except json.JSONDecodeError as e:
+            raise OutputParserException(f"Got invalid JSON object. Error: {e}")
+        if not isinstance(json_obj, list):
+            raise OutputParserException(f"Got invalid return object. Expected a list, but got {json_obj}")
+        expected_keys = [rs.name for rs in self.response_schemas]
+        items = []
+        for item in json_obj:
+            if not isinstance(item, dict) or any(key not in item for key in expected_keys):
+                raise OutputParserException(
+                    f"Got invalid return object. Expected keys {expected_keys} "
+                    f"to be present, but got {item}"
+                )
+            try:
+                index = int(str(item["index"]).strip("[] "))
+            except ValueError:
+                raise OutputParserException(f"Got invalid index {item['index']!r}")
+            items.append({**item, "index": index})
+        return items
+
+    @property
+    def _type(self) -> str:
+        return "structured_batch"
+
+
+@functools.lru_cache(maxsize=None)
+def get_parser() -> StructuredOutputParser:
+    """The parser of the sentiment responses, built on first use."""
+    return StructuredOutputParser.from_response_schemas(response_schemas)
+
+
+@functools.lru_cache(maxsize=None)
+def get_batch_parser() -> BatchStructuredOutputParser:
+    """The parser of the batch sentiment responses, built on first use."""
+    return BatchStructuredOutputParser.from_response_schemas(batch_response_schemas)
+
+
+_LAZY = {"PARSER": get_parser, "BATCH_PARSER": get_batch_parser}
+
+
+def __getattr__(name: str) -> Any:
+    """Builds PARSER and BATCH_PARSER when first accessed instead of at import time."""
+    if name in _LAZY:
+        return _LAZY[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,20 +1,41 @@
-from typing import Any, Dict, List, Optional
+import asyncio
+import hashlib
+import json
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Literal, Optional, Sequence, Union
 
-from pydantic import Extra
+from pydantic import Extra, Field, PrivateAttr
 
 from langchain.base_language import BaseLanguageModel
 from langchain.callbacks.manager import (
+    AsyncCallbackManager,
     AsyncCallbackManagerForChainRun,
     CallbackManagerForChainRun,
+    Callbacks,
 )
 from langchain.chains.base import Chain
 from langchain.chains.combine_documents.base import BaseCombineDocumentsChain
 from langchain.chains.combine_documents.stuff import StuffDocumentsChain
 from langchain.chains.llm import LLMChain
-from langchain_util.chains.sentiment.stuff_prompt import PROMPT_SELECTOR
+from langchain.docstore.document import Document
+from langchain_util.chains.sentiment.cache import BaseSentimentCache
+from langchain_util.chains.sentiment.local import BaseLocalSentimentScorer, SentimentRoutingStats
+from langchain_util.chains.sentiment.batch_prompt import format_statement, get_batch_prompt_selector
+from langchain_util.chains.sentiment.stuff_prompt import get_prompt_selector
 from langchain.prompts import PromptTemplate
-from langchain.schema import BaseOutputParser
-from langchain_util.chains.sentiment.parser import PARSER
+from langchain.schema import BaseOutputParser, OutputParserException
+from langchain_util.chains.sentiment.parser import get_batch_parser, get_parser
+from langchain_util.chains.sentiment.streaming_parser import (
+    TOLERANT_PARSER, StreamingSentimentHandler, StreamingSentimentParser
+)
+from langchain_util.chains.sentiment.vote import SentimentVote
+from langchain_util.concurrency import BatchStats, RateLimiter, RetryPolicy, run_concurrently
+from langchain_util.metrics import BaseMetricsSink, timed
+
+_CALL = {"component": "sentiment", "stage": "call"}
+_LLM = {"component": "sentiment"}
+_BATCH_LLM = {"component": "sentiment", "mode": "batch"}
 
 
 
@@ -24,6 +45,42 @@ class SentimentChain(Chain):
     combine_documents_chain: BaseCombineDocumentsChain
     """Chain to use to combine the documents."""
     input_key: str = "input_documents"  #: :meta private:
+    mode: Literal["stuff", "map_reduce"] = "stuff"
+    """How the input documents are scored, "stuff" scores all the documents in a single
+    prompt, "map_reduce" scores each document on its own and aggregates the results
+    locally with a confidence weighted vote. Documents whose output can't be parsed are
+    left out of the vote, OutputParserException is raised if none of them could be parsed."""
+    map_max_concurrency: int = 8
+    """Maximum number of documents being scored at a time in map_reduce mode."""
+    early_exit_confidence: Optional[float] = None
+    """In map_reduce mode stop scoring documents once the aggregate confidence reaches this value."""
+    early_exit_min_documents: int = 3
+    """Minimum number of documents scored before exiting early."""
+    cache: Optional[BaseSentimentCache] = None
+    """Cache of parsed results, looked up by the normalized statement before calling the LLM."""
+    _cache_namespace: Optional[str] = PrivateAttr(default=None)
+    local_scorer: Optional[BaseLocalSentimentScorer] = None
+    """Scores the statements locally before the LLM, only the statements scored with a
+    confidence below local_confidence_threshold are sent to the LLM."""
+    local_confidence_threshold: float = 8.0
+    """Minimum confidence, between 0 and 10, of a local score to skip the LLM."""
+    _routing_stats: SentimentRoutingStats = PrivateAttr(default_factory=SentimentRoutingStats)
+    streaming: bool = False
+    """Parse the output with the tolerant parser and, in async calls, parse the tokens
+    as they are streamed, ending the LLM call as soon as the sentiment and confidence
+    are known. Early termination requires an LLM that streams, e.g. OpenAI(streaming=True)."""
+    batch_llm_chain: Optional[LLMChain] = None
+    """Chain used by score_batch to score many statements in a single request."""
+    batch_output_parser: BaseOutputParser = Field(default_factory=get_batch_parser)
+    """Object to parse the output returned by the batch chain"""
+    batch_max_tokens: int = 2000
+    """Maximum number of tokens of the statements packed into a single batch request."""
+    batch_max_items: int = 50
+    """Maximum number of statements packed into a single batch request."""
+    batch_length_function: Optional[Callable[[str], int]] = None
+    """Function used to measure the statements, defaults to the get_num_tokens of the batch LLM."""
+    metrics: Optional[BaseMetricsSink] = None
+    """Sink of the call durations, LLM latencies, parse outcomes and routes of the statements."""
 
     class Config:
         """Configuration for this pydantic object."""
@@ -53,10 +110,11 @@ class SentimentChain(Chain):
         cls,
         llm: BaseLanguageModel,
         prompt: Optional[PromptTemplate] = None,
+        batch_prompt: Optional[PromptTemplate] = None,
         **kwargs: Any,
     ) -> "SentimentChain":
         """Initialize from LLM."""
-        _prompt = prompt or PROMPT_SELECTOR.get_prompt(llm)
+        _prompt = prompt or get_prompt_selector().get_prompt(llm)
         llm_chain = LLMChain(llm=llm, prompt=_prompt)
         document_prompt = PromptTemplate(
             input_variables=["page_content"], template="{page_content}"
@@ -67,7 +125,15 @@ class SentimentChain(Chain):
             document_prompt=document_prompt,
         )
 
-        return cls(output_parser=PARSER, combine_documents_chain=combine_documents_chain, **kwargs)
+        batch_llm_chain = LLMChain(
+            llm=llm, prompt=batch_prompt or get_batch_prompt_selector().get_prompt(llm))
+
+        return cls(
+            output_parser=get_parser(),
+            combine_documents_chain=combine_documents_chain,
+            batch_llm_chain=batch_llm_chain,
+            **kwargs
+        )
 
     def _call(
         self,
@@ -84,12 +150,13 @@ class SentimentChain(Chain):
         """
         _run_manager = run_manager or CallbackManagerForChainRun.get_noop_manager()
         docs = inputs[self.input_key]
-
-        result = self.combine_documents_chain.run(
-            input_documents=docs, callbacks=_run_manager.get_child()
-        )
-        return self.output_parser.parse(result)
-
+        with timed(self.metrics, "stage_seconds", _CALL):
+            if self.mode == "map_reduce":
+                return self._map_reduce(docs, _run_manager.get_child())
+            cached = self._lookup(docs)
+            if cached is not None:
+                return cached
+            return self._score_with_llm(docs, _run_manager.get_child())
 
     async def _acall(
         self,
@@ -106,7 +173,328 @@ class SentimentChain(Chain):
         """
         _run_manager = run_manager or AsyncCallbackManagerForChainRun.get_noop_manager()
         docs = inputs[self.input_key]
-        result = await self.combine_documents_chain.arun(
-            input_documents=docs, callbacks=_run_manager.get_child()
+        with timed(self.metrics, "stage_seconds", _CALL):
+            if self.mode == "map_reduce":
+                return await self._amap_reduce(docs, _run_manager.get_child())
+            cached = self._lookup(docs)
+            if cached is not None:
+                return cached
+            return await self._ascore_with_llm(docs, _run_manager.get_child())
+
+    def _score_with_llm(self, docs: Sequence[Document], callbacks: Callbacks) -> Dict[str, Any]:
+        """Scores the documents in a single prompt, once the cache and the local scorer missed."""
+        with timed(self.metrics, "llm_seconds", _LLM):
+            result = self.combine_documents_chain.run(input_documents=docs, callbacks=callbacks)
+        return self._store(docs, self._parse(result))
+
+    async def _ascore_with_llm(self, docs: Sequence[Document], callbacks: Callbacks) -> Dict[str, Any]:
+        """Async _score_with_llm, streaming the output when enabled."""
+        if self.streaming:
+            return self._store(docs, await self._astream(docs, callbacks))
+        with timed(self.metrics, "llm_seconds", _LLM):
+            result = await self.combine_documents_chain.arun(input_documents=docs, callbacks=callbacks)
+        return self._store(docs, self._parse(result))
+
+    def _parse(self, text: str) -> Dict[str, Any]:
+        try:
+            result = TOLERANT_PARSER.parse(text) if self.streaming else self.output_parser.parse(text)
+        except OutputParserException:
+            self._count_parse("failure")
+            raise
+        self._count_parse("success")
+        return result
+
+    def _count_parse(self, outcome: str) -> None:
+        if self.metrics is not None:
+            self.metrics.increment("sentiment_parses_total", labels={"outcome": outcome})
+
+    async def _astream(self, docs: Sequence[Document], callbacks: Callbacks) -> Dict[str, Any]:
+        """Runs the combine documents chain, cancelling it once the streamed tokens have been parsed."""
+        parser = StreamingSentimentParser()
+        parsed = asyncio.Event()
+        # A manager of its own, the callbacks can be shared by concurrent calls
+        handler = StreamingSentimentHandler(parser, parsed)
+        if isinstance(callbacks, AsyncCallbackManager):
+            manager = AsyncCallbackManager(
+                handlers=[*callbacks.handlers, handler],
+                inheritable_handlers=[*callbacks.inheritable_handlers, handler],
+                parent_run_id=callbacks.parent_run_id,
+            )
+        else:
+            manager = AsyncCallbackManager.configure([*(callbacks or []), handler])
+        task = asyncio.ensure_future(
+            self.combine_documents_chain.arun(input_documents=docs, callbacks=manager))
+        waiter = asyncio.ensure_future(parsed.wait())
+        try:
+            with timed(self.metrics, "llm_seconds", _LLM):
+                await asyncio.wait({task, waiter}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            waiter.cancel()
+            if not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        if parser.result is not None:
+            self._count_parse("success")
+            return parser.result
+        try:
+            result = parser.finish(task.result())
+        except OutputParserException:
+            self._count_parse("failure")
+            raise
+        self._count_parse("success")
+        return result
+
+    @property
+    def cache_namespace(self) -> str:
+        """
+        Identifies the prompt and model of the chain, results are only shared
+        between chains with the same namespace. Results of score_batch are
+        cached in the namespace of the regular prompt.
+        """
+        if self._cache_namespace is None:
+            identity = {"chain": type(self.combine_documents_chain).__qualname__}
+            llm_chain = getattr(self.combine_documents_chain, "llm_chain", None)
+            if llm_chain is not None:
+                identity["prompt"] = repr(llm_chain.prompt)
+                identity["llm_type"] = getattr(llm_chain.llm, "_llm_type", type(llm_chain.llm).__qualname__)
+                identity["llm"] = getattr(llm_chain.llm, "_identifying_params", {})
+            self._cache_namespace = hashlib.sha256(
+                json.dumps(identity, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        return self._cache_namespace
+
+    @property
+    def routing_stats(self) -> SentimentRoutingStats:
+        """Number of statements resolved by the cache, the local scorer and the LLM."""
+        return self._routing_stats
+
+    def _lookup(self, docs: Sequence[Document]) -> Optional[Dict[str, Any]]:
+        """The result of the cache or the local scorer, None if the statement has to be sent to the LLM."""
+        statement = _statement(docs)
+        if self.cache is not None:
+            result = self.cache.lookup(self.cache_namespace, statement)
+            if result is not None:
+                self._routing_stats.cache += 1
+                self._count_route("cache")
+                return result
+        if self.local_scorer is not None:
+            result = self.local_scorer.score(statement)
+            if float(result["confidence"]) >= self.local_confidence_threshold:
+                self._routing_stats.local += 1
+                self._count_route("local")
+                return result
+        self._routing_stats.llm += 1
+        self._count_route("llm")
+        return None
+
+    def _count_route(self, route: str) -> None:
+        if self.metrics is not None:
+            self.metrics.increment("sentiment_routes_total", labels={"route": route})
+
+    def _store(self, docs: Sequence[Document], result: Dict[str, Any]) -> Dict[str, Any]:
+        if self.cache is not None:
+            self.cache.store(self.cache_namespace, _statement(docs), result)
+        return result
+
+    def score_batch(
+        self,
+        doc_groups: Sequence[Sequence[Document]],
+        callbacks: Callbacks = None,
+    ) -> List[Dict[str, Any]]:
+        """Score many independent groups of documents, packing them into few LLM requests.
+
+        Each group is one statement, the statements are packed into requests
+        of at most batch_max_items statements and batch_max_tokens tokens. The
+        groups missing from a batch response, or all the groups of a batch
+        whose response can't be parsed, are scored on their own with the
+        regular prompt.
+
+        Example:
+        .. code-block:: python
+
+        results = chain.score_batch([[doc1], [doc2, doc3]])
+        sentiment, confidence = results[0]['sentiment'], results[0]['confidence']
+        """
+        if self.batch_llm_chain is None:
+            raise ValueError("score_batch requires a batch_llm_chain, create the chain with from_llm")
+        statements = [_statement(docs) for docs in doc_groups]
+        results: List[Optional[Dict[str, Any]]] = [self._lookup(docs) for docs in doc_groups]
+        pending = [index for index, result in enumerate(results) if result is None]
+        for batch in self._iter_batches(statements, pending):
+            with timed(self.metrics, "llm_seconds", _BATCH_LLM):
+                text = self.batch_llm_chain.predict(
+                    statements="\n\n".join(
+                        format_statement(i, statements[index]) for i, index in enumerate(batch)),
+                    callbacks=callbacks,
+                )
+            try:
+                items = self.batch_output_parser.parse(text)
+                self._count_parse("success")
+            except OutputParserException:
+                self._count_parse("failure")
+                items = []
+            for item in items:
+                if 0 <= item["index"] < len(batch):
+                    index = batch[item["index"]]
+                    results[index] = self._store(doc_groups[index], {
+                        key: value for key, value in item.items() if key != "index"})
+        for index, result in enumerate(results):
+            if result is None:
+                # Already looked up, straight to the LLM
+                results[index] = self._score_with_llm(doc_groups[index], callbacks)
+        return results  # type: ignore[return-value]
+
+    def _iter_batches(self, statements: List[str], indexes: List[int]) -> Iterator[List[int]]:
+        """Groups the indexes of the statements into batches that fit the token budget."""
+        length_function = self.batch_length_function or self.batch_llm_chain.llm.get_num_tokens
+        batch: List[int] = []
+        tokens = 0
+        for index in indexes:
+            length = length_function(format_statement(len(batch), statements[index]))
+            if batch and (tokens + length > self.batch_max_tokens or len(batch) >= self.batch_max_items):
+                yield batch
+                batch, tokens = [], 0
+            batch.append(index)
+            tokens += length
+        if batch:
+            yield batch
+
+    async def abatch(
+        self,
+        inputs: Sequence[Dict[str, Any]],
+        max_concurrency: int = 8,
+        rate_limiter: Optional[RateLimiter] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        return_exceptions: bool = False,
+        stats: Optional[BatchStats] = None,
+        callbacks: Callbacks = None,
+    ) -> List[Union[Dict[str, Any], Exception]]:
+        """Score many inputs concurrently, returning the outputs in input order.
+
+        Args:
+            inputs: Inputs of the chain, each with its input documents.
+            max_concurrency: Maximum number of calls in flight.
+            rate_limiter: Limits the requests and tokens per minute, the tokens
+                of an input are measured with batch_length_function or the
+                combine documents chain's prompt_length.
+            retry_policy: Retries calls failing with malformed output or
+                transport errors, defaults to RetryPolicy().
+            return_exceptions: Return the exception of an input that failed
+                all its attempts in place of its output instead of raising it.
+            stats: Collects the throughput and latency percentiles of the batch.
+
+        Example:
+        .. code-block:: python
+
+        stats = BatchStats()
+        results = await chain.abatch([{'input_documents': docs}], stats=stats)
+        print(stats.throughput, stats.percentiles())
+        """
+
+        async def score(_inputs: Dict[str, Any]) -> Dict[str, Any]:
+            return await self.acall(_inputs, callbacks=callbacks, return_only_outputs=True)
+
+        return await run_concurrently(
+            score,
+            inputs,
+            max_concurrency=max_concurrency,
+            rate_limiter=rate_limiter,
+            retry_policy=retry_policy if retry_policy is not None else RetryPolicy(),
+            tokens=self._estimate_tokens,
+            return_exceptions=return_exceptions,
+            stats=stats,
+        )
+
+    async def amap(
+        self, doc_groups: Sequence[Sequence[Document]], **kwargs: Any
+    ) -> List[Union[Dict[str, Any], Exception]]:
+        """Score each group of documents concurrently, accepts the same keyword arguments as abatch."""
+        return await self.abatch([{self.input_key: docs} for docs in doc_groups], **kwargs)
+
+    def _estimate_tokens(self, inputs: Dict[str, Any]) -> int:
+        """Tokens of an input for the rate limiter."""
+        docs = inputs[self.input_key]
+        if self.batch_length_function is not None:
+            return self.batch_length_function(_statement(docs))
+        return self.combine_documents_chain.prompt_length(docs) or 0
+
+    def _map_reduce(self, docs: Iterable[Document], callbacks: Callbacks) -> Dict[str, Any]:
+        """Scores the documents in parallel threads and aggregates the results with a vote."""
+        vote = SentimentVote()
+        docs = iter(docs)
+        pool = ThreadPoolExecutor(max_workers=self.map_max_concurrency)
+        pending = {
+            pool.submit(self._score_document, doc, callbacks)
+            for doc in islice(docs, self.map_max_concurrency)
+        }
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    vote.add(future.result())
+                if self._should_exit_early(vote):
+                    break
+                pending |= {
+                    pool.submit(self._score_document, doc, callbacks)
+                    for doc in islice(docs, len(done))
+                }
+        finally:
+            # Calls already running are left to finish in the background,
+            # shutdown(cancel_futures=True) requires Python 3.9
+            for future in pending:
+                future.cancel()
+            pool.shutdown(wait=False)
+        return vote.result()
+
+    async def _amap_reduce(self, docs: Iterable[Document], callbacks: Callbacks) -> Dict[str, Any]:
+        """Scores the documents concurrently and aggregates the results with a vote."""
+        vote = SentimentVote()
+        docs = iter(docs)
+        pending = {
+            asyncio.ensure_future(self._ascore_document(doc, callbacks))
+            for doc in islice(docs, self.map_max_concurrency)
+        }
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    vote.add(task.result())
+                if self._should_exit_early(vote):
+                    break
+                pending |= {
+                    asyncio.ensure_future(self._ascore_document(doc, callbacks))
+                    for doc in islice(docs, len(done))
+                }
+        finally:
+            for task in pending:
+                task.cancel()
+        return vote.result()
+
+    def _score_document(self, doc: Document, callbacks: Callbacks) -> Dict[str, Any]:
+        cached = self._lookup([doc])
+        if cached is not None:
+            return cached
+        try:
+            return self._score_with_llm([doc], callbacks)
+        except OutputParserException:
+            return {}
+
+    async def _ascore_document(self, doc: Document, callbacks: Callbacks) -> Dict[str, Any]:
+        cached = self._lookup([doc])
+        if cached is not None:
+            return cached
+        try:
+            return await self._ascore_with_llm([doc], callbacks)
+        except OutputParserException:
+            return {}
+
+    def _should_exit_early(self, vote: SentimentVote) -> bool:
+        return (
+            self.early_exit_confidence is not None
+            and vote.votes >= self.early_exit_min_documents
+            and vote.confidence >= self.early_exit_confidence
         )
-        return self.output_parser.parse(result)
+
+
+def _statement(docs: Sequence[Document]) -> str:
+    """The text scored for a group of documents, as stuffed in the prompt."""
+    return "\n\n".join(doc.page_content for doc in docs)
@@ -0,0 +1,117 @@
+"""Tolerant and streaming parsing of the sentiment and confidence returned by the LLM.
+
+StructuredOutputParser requires a fenced JSON block and fails on slightly
+malformed output, forcing a retry. The parsers here extract each key on its
+own from JSON, JSON-like or plain text output, e.g. missing fences, single
+quotes, unquoted keys, trailing commas, "Sentiment: Positive" or "8/10", and
+the streaming parser does so while the tokens arrive, so the LLM call can be
+ended as soon as both values are known.
+"""
+import re
+from typing import Any, Dict, List, Optional
+
+from langchain.callbacks.base import AsyncCallbackHandler
+from langchain.schema import BaseOutputParser, OutputParserException
+
+from langchain_util.chains.sentiment.parser import get_parser
+
+_SENTIMENT_WORDS = {"positive": "1", "negative": "-1", "neutral": "0"}
+
+# A key, a separator and a value followed by a terminator, e.g. `"confidence": 8,` or
+# `sentiment of the statement is positive`, the end of the text only terminates a
+# value once the whole output is known
+_VALUE = r"""["']?(?:\s+of\s+(?:the|this)\s+\w+)?\s*(?:[:=]|\bis\b|\bof\b)?\s*["']?\s*(?P<value>[+-]?\d+(?:\.\d+)?|positive|negative|neutral)"""
+_TERMINATOR = r"""(?=\s*(?:["',;}\]\n%/)]|\s|\.(?=\D)))"""
+_FINAL_TERMINATOR = r"""(?=\s*(?:["',;}\]\n%/)]|\s|\.(?!\d)|$))"""
+
+
+def _pattern(key: str, terminator: str) -> "re.Pattern[str]":
+    return re.compile(rf"""["']?\b{key}\b{_VALUE}{terminator}""", re.IGNORECASE)
+
+
+_PATTERNS = {
+    final: {key: _pattern(key, _FINAL_TERMINATOR if final else _TERMINATOR)
+            for key in ("sentiment", "confidence")}
+    for final in (False, True)
+}
+
+
+def extract_sentiment(text: str, final: bool = True) -> Optional[Dict[str, str]]:
+    """
+    Extracts the sentiment and confidence from the text, returns None if any
+    of them is missing. Unless final, a value at the end of the text is not
+    taken as it could continue in the next token.
+    """
+    result = {}
+    for key, pattern in _PATTERNS[final].items():
+        match = pattern.search(text)
+        if match is None:
+            return None
+        value = match.group("value").lower()
+        result[key] = _SENTIMENT_WORDS.get(value, value.lstrip("+"))
+    return result
+
+
+class TolerantSentimentOutputParser(BaseOutputParser):
+    """Parses the sentiment and confidence from JSON, JSON-like or plain text output."""
+
+    def get_format_instructions(self) -> str:
+        return get_parser().get_format_instructions()
+
+    def parse(self, text: str) -> Dict[str, Any]:
+        result = extract_sentiment(text)
+        if result is None:
+            raise OutputParserException(
+                f"Got invalid return object. Expected sentiment and confidence, but got:\n{text}")
+        return result
+
+    @property
+    def _type(self) -> str:
+        return "tolerant_sentiment"
+
+
+TOLERANT_PARSER = TolerantSentimentOutputParser()
+
+
+class StreamingSentimentParser:
+    """Incrementally parses the sentiment and confidence from the tokens of a streamed completion."""
+
+    def __init__(self) -> None:
+        self._tokens: List[str] = []
+        self.result: Optional[Dict[str, str]] = None
+        """The parsed result, available as soon as both values have been streamed."""
+        self.tokens_to_result: Optional[int] = None
+        """Number of tokens received when the result became available."""
+
+    @property
+    def text(self) -> str:
+        return "".join(self._tokens)
+
+    def feed(self, token: str) -> Optional[Dict[str, str]]:
+        """Adds a token, returns the result once both values have been parsed."""
+        self._tokens.append(token)
+        if self.result is None:
+            self.result = extract_sentiment(self.text, final=False)
+            if self.result is not None:
+                self.tokens_to_result = len(self._tokens)
+        return self.result
+
+    def finish(self, text: Optional[str] = None) -> Dict[str, str]:
+        """Parses the complete output, the streamed text if not given."""
+        if self.result is not None:
+            return self.result
+        self.result = TOLERANT_PARSER.parse(self.text if text is None else text)
+        self.tokens_to_result = len(self._tokens)
+        return self.result
+
+
+class StreamingSentimentHandler(AsyncCallbackHandler):
+    """Feeds the streamed tokens to a StreamingSentimentParser and sets an event once parsed."""
+
+    def __init__(self, parser: StreamingSentimentParser, parsed: Any):
+        self.parser = parser
+        self.parsed = parsed
+
+    async def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        if self.parser.feed(token) is not None:
+            self.parsed.set()
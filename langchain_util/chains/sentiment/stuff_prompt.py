@@ -1,4 +1,7 @@
 # flake8: noqa
+import functools
+from typing import Any
+
 from langchain.chains.prompt_selector import ConditionalPromptSelector, is_chat_model
 from langchain.prompts import PromptTemplate
 from langchain.prompts.chat import (
@@ -6,9 +9,8 @@ from langchain.prompts.chat import (
     HumanMessagePromptTemplate,
     SystemMessagePromptTemplate,
 )
-from langchain_util.chains.sentiment.parser import PARSER
+from langchain_util.chains.sentiment.parser import get_parser
 
-format_instructions = PARSER.get_format_instructions()
 prompt_template = """Determine the sentiment of the following STATEMENT and provide a score on how confident you are of this.
 
 {format_instructions}
@@ -17,26 +19,55 @@ STATEMENT:
 {context}
 
 YOUR RESPONSE:"""
-PROMPT = PromptTemplate(
-    template=prompt_template, input_variables=[
-        "format_instructions", "context"]
-)
-PROMPT = PROMPT.partial(format_instructions=format_instructions)
 
 system_template = """You are a sentiment analyst expert, you determine the sentiment of the user statements and provide a score from [0,1] on how confident you are of this.
 
 {format_instructions}"""
 
-system_prompt = PromptTemplate(
-    template=system_template, input_variables=["format_instructions"])
-system_prompt = system_prompt.partial(format_instructions=format_instructions)
-messages = [
-    SystemMessagePromptTemplate(prompt=system_prompt),
-    HumanMessagePromptTemplate.from_template("{context}"),
-]
-CHAT_PROMPT = ChatPromptTemplate.from_messages(messages)
 
+@functools.lru_cache(maxsize=None)
+def get_format_instructions() -> str:
+    return get_parser().get_format_instructions()
 
-PROMPT_SELECTOR = ConditionalPromptSelector(
-    default_prompt=PROMPT, conditionals=[(is_chat_model, CHAT_PROMPT)]
-)
+
+@functools.lru_cache(maxsize=None)
+def get_prompt() -> PromptTemplate:
+    prompt = PromptTemplate(
+        template=prompt_template, input_variables=[
+            "format_instructions", "context"]
+    )
+    return prompt.partial(format_instructions=get_format_instructions())
+
+
+@functools.lru_cache(maxsize=None)
+def get_chat_prompt() -> ChatPromptTemplate:
+    system_prompt = PromptTemplate(
+        template=system_template, input_variables=["format_instructions"])
+    system_prompt = system_prompt.partial(format_instructions=get_format_instructions())
+    messages = [
+        SystemMessagePromptTemplate(prompt=system_prompt),
+        HumanMessagePromptTemplate.from_template("{context}"),
+    ]
+    return ChatPromptTemplate.from_messages(messages)
+
+
+@functools.lru_cache(maxsize=None)
+def get_prompt_selector() -> ConditionalPromptSelector:
+    return ConditionalPromptSelector(
+        default_prompt=get_prompt(), conditionals=[(is_chat_model, get_chat_prompt())]
+    )
+
+
+_LAZY = {
+    "format_instructions": get_format_instructions,
+    "PROMPT": get_prompt,
+    "CHAT_PROMPT": get_chat_prompt,
+    "PROMPT_SELECTOR": get_prompt_selector,
+}
+
+
+def __getattr__(name: str) -> Any:
+    """Builds the prompts when first accessed instead of at import time."""
+    if name in _LAZY:
+        return _LAZY[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
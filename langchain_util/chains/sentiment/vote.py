@@ -0,0 +1,55 @@
+"""Local reduce step of the map reduce mode of SentimentChain."""
+from collections import defaultdict
+from typing import Any, Dict, Optional
+
+from langchain.schema import OutputParserException
+
+
+class SentimentVote:
+    """
+    Confidence weighted vote over the sentiment of several documents. Each
+    document votes for its sentiment with its confidence as the weight, the
+    aggregate confidence is the weight of the winning sentiment divided by the
+    number of votes, so it equals the mean confidence when the documents agree
+    and decreases with dissent.
+    """
+
+    def __init__(self) -> None:
+        self.votes = 0
+        self.invalid = 0
+        """Results that could not be read as a sentiment and confidence."""
+        self._weights: Dict[int, float] = defaultdict(float)
+
+    def add(self, result: Dict[str, Any]) -> None:
+        try:
+            sentiment = int(float(result["sentiment"]))
+            confidence = float(result["confidence"])
+        except (KeyError, TypeError, ValueError):
+            self.invalid += 1
+            return
+        self.votes += 1
+        self._weights[sentiment] += max(confidence, 0.0)
+
+    @property
+    def sentiment(self) -> Optional[int]:
+        if not self.votes:
+            return None
+        # Ties are broken towards neutral
+        return max(self._weights, key=lambda s: (self._weights[s], -abs(s)))
+
+    @property
+    def confidence(self) -> float:
+        if not self.votes:
+            return 0.0
+        return self._weights[self.sentiment] / self.votes
+
+    def result(self) -> Dict[str, str]:
+        """
+        The aggregate in the format of the chain outputs, neutral without
+        results. Raises OutputParserException if none of the results were valid.
+        """
+        if not self.votes:
+            if self.invalid:
+                raise OutputParserException(f"None of the {self.invalid} results could be parsed")
+            return {"sentiment": "0", "confidence": "0"}
+        return {"sentiment": str(self.sentiment), "confidence": f"{round(self.confidence, 2):g}"}
@@ -0,0 +1,261 @@
+"""Caches for the chunks computed by the text splitters.
+
+When a corpus is split again and most documents have not changed, the
+chunks of the unchanged documents can be taken from a cache instead of
+splitting them again. The chunks are stored as (start, end) offsets into the
+text, keyed by a hash of the text, its context and the splitter configuration.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+Spans = List[Tuple[int, int]]
+
+
+@dataclass
+class ChunkCacheStats:
+    """Counters collected by a chunk cache."""
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+    """Entries removed because they were computed with another splitter configuration."""
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def reset(self) -> None:
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+
+def chunk_cache_key(config: str, text: str, context: str) -> str:
+    """The cache key of a text split with a given context and splitter configuration."""
+    digest = hashlib.sha256()
+    for part in (config, context, text):
+        encoded = part.encode("utf-8", "surrogatepass")
+        digest.update(len(encoded).to_bytes(8, "little"))
+        digest.update(encoded)
+    return digest.hexdigest()
+
+
+def _encode_spans(spans: Spans) -> bytes:
+    return array("q", (offset for span in spans for offset in span)).tobytes()
+
+
+def _decode_spans(data: bytes) -> Spans:
+    offsets = array("q")
+    offsets.frombytes(data)
+    it = iter(offsets)
+    return list(zip(it, it))
+
+
+class BaseChunkCache(ABC):
+    """
+    Interface for chunk caches. A splitter binds the cache to its configuration,
+    by default entries computed with any other configuration are then removed.
+    """
+
+    def __init__(self, max_entries: int = 100_000, invalidate_on_config_change: bool = True):
+        if max_entries < 1:
+            raise ValueError(f"max_entries must be 1 or greater, got {max_entries}")
+        self.max_entries = max_entries
+        self.invalidate_on_config_change = invalidate_on_config_change
+        self.stats = ChunkCacheStats()
+        self.config: Optional[str] = None
+        """Configuration fingerprint of the splitter the cache is bound to."""
+
+    def bind(self, config: str) -> None:
+        """Called by the splitter using the cache with its configuration fingerprint."""
+        if config == self.config:
+            return
+        self.config = config
+        if self.invalidate_on_config_change:
+            self.stats.invalidations += self._invalidate_other_configs(config)
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Spans]:
+        """Returns the cached spans for the key, or None."""
+
+    @abstractmethod
+    def put(self, key: str, config: str, spans: Spans) -> None:
+        """Stores the spans for the key, evicting the least recently used entries if full."""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Removes all the entries."""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Number of entries in the cache."""
+
+    @abstractmethod
+    def _invalidate_other_configs(self, config: str) -> int:
+        """Removes the entries of other configurations, returns how many were removed."""
+
+
+class InMemoryChunkCache(BaseChunkCache):
+    """A chunk cache kept in memory, useful within a single long running process."""
+
+    def __init__(self, max_entries: int = 100_000, invalidate_on_config_change: bool = True):
+        super().__init__(max_entries, invalidate_on_config_change)
+        self._entries: "OrderedDict[str, Tuple[str, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Spans]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+        return _decode_spans(entry[1])
+
+    def put(self, key: str, config: str, spans: Spans) -> None:
+        data = _encode_spans(spans)
+        with self._lock:
+            self._entries[key] = (config, data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _invalidate_other_configs(self, config: str) -> int:
+        with self._lock:
+            stale = [key for key, (entry_config, _) in self._entries.items() if entry_config != config]
+            for key in stale:
+                del self._entries[key]
+        return len(stale)
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+class SQLiteChunkCache(BaseChunkCache):
+    """
+    A chunk cache persisted in a local SQLite database, so that it survives
+    between runs. Least recently used entries are evicted in batches of
+    evict_fraction of max_entries once the cache is full.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: int = 1_000_000,
+        invalidate_on_config_change: bool = True,
+        evict_fraction: float = 0.1
+    ):
+        super().__init__(max_entries, invalidate_on_config_change)
+        if not 0 < evict_fraction <= 1:
+            raise ValueError(f"evict_fraction must be in (0, 1], got {evict_fraction}")
+        self.path = path
+        self.evict_fraction = evict_fraction
+        self._connection: Optional[sqlite3.Connection] = None
+        self._size: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self.path, isolation_level=None, check_same_thread=False, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                "key TEXT PRIMARY KEY, config TEXT NOT NULL, spans BLOB NOT NULL, "
+                "last_used REAL NOT NULL)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS chunks_last_used ON chunks (last_used)")
+            self._size = connection.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+            self._connection = connection
+        return self._connection
+
+    def get(self, key: str) -> Optional[Spans]:
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT spans FROM chunks WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats.misses += 1
+                return None
+            self.connection.execute(
+                "UPDATE chunks SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.stats.hits += 1
+        return _decode_spans(row[0])
+
+    def put(self, key: str, config: str, spans: Spans) -> None:
+        data = _encode_spans(spans)
+        with self._lock:
+            connection = self.connection
+            cursor = connection.execute(
+                "INSERT OR IGNORE INTO chunks (key, config, spans, last_used) VALUES (?, ?, ?, ?)",
+                (key, config, data, time.time()))
+            self._size += cursor.rowcount
+            if self._size > self.max_entries:
+                excess = self._size - self.max_entries + int(self.max_entries * self.evict_fraction)
+                cursor = connection.execute(
+                    "DELETE FROM chunks WHERE key IN "
+                    "(SELECT key FROM chunks ORDER BY last_used LIMIT ?)", (excess,))
+                self._size -= cursor.rowcount
+                self.stats.evictions += cursor.rowcount
+
+    def clear(self) -> None:
+        with self._lock:
+            self.connection.execute("DELETE FROM chunks")
+            self._size = 0
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def __len__(self) -> int:
+        with self._lock:
+            # Opening the connection counts the entries
+            self.connection
+            return self._size
+
+    def _invalidate_other_configs(self, config: str) -> int:
+        with self._lock:
+            cursor = self.connection.execute("DELETE FROM chunks WHERE config != ?", (config,))
+            self._size -= cursor.rowcount
+        return cursor.rowcount
+
+    def __getstate__(self) -> dict:
+        # Each process opens its own connection
+        state = self.__dict__.copy()
+        del state["_lock"]
+        state["_connection"] = None
+        state["_size"] = None
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
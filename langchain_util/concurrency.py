@@ -0,0 +1,208 @@
+"""Building blocks to run many LLM calls concurrently without overwhelming the provider.
+
+RateLimiter enforces requests and tokens per minute limits shared by any
+number of concurrent tasks, RetryPolicy retries failed calls with exponential
+backoff and BatchStats collects the throughput and latencies of a batch.
+"""
+import asyncio
+import math
+import random
+import time
+from dataclasses import dataclass, field
+from typing import (
+    Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Type, TypeVar
+)
+
+from langchain.schema import OutputParserException
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class RateLimiter:
+    """
+    Token buckets limiting the requests and tokens per minute. Each bucket holds
+    up to a minute worth of requests or tokens and is refilled continuously, so
+    short bursts are allowed while the average rate is kept under the limits.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        for name, limit in (("requests_per_minute", requests_per_minute),
+                            ("tokens_per_minute", tokens_per_minute)):
+            if limit is not None and limit <= 0:
+                raise ValueError(f"{name} must be greater than 0, got {limit}")
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._clock = clock
+        self._requests = requests_per_minute or 0.0
+        self._tokens = tokens_per_minute or 0.0
+        self._updated = clock()
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def acquire(self, tokens: int = 0) -> None:
+        """
+        Waits until a request of the given number of tokens fits in the limits,
+        requests larger than the tokens per minute wait for a full bucket.
+        Waiting requests are served in order.
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                wait = self._reserve(tokens)
+                if wait <= 0:
+                    return
+                await asyncio.sleep(wait)
+
+    def _reserve(self, tokens: int) -> float:
+        """Takes the request from the buckets if it fits, otherwise returns the seconds to wait."""
+        now = self._clock()
+        elapsed = now - self._updated
+        self._updated = now
+        wait = 0.0
+        if self.requests_per_minute is not None:
+            self._requests = min(
+                self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+            if self._requests < 1:
+                wait = (1 - self._requests) * 60 / self.requests_per_minute
+        if self.tokens_per_minute is not None:
+            tokens = min(tokens, self.tokens_per_minute)
+            self._tokens = min(
+                self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+            if self._tokens < tokens:
+                wait = max(wait, (tokens - self._tokens) * 60 / self.tokens_per_minute)
+        if wait > 0:
+            return wait
+        if self.requests_per_minute is not None:
+            self._requests -= 1
+        if self.tokens_per_minute is not None:
+            self._tokens -= tokens
+        return 0.0
+
+
+@dataclass
+class RetryPolicy:
+    """Retries failed calls with exponential backoff and jitter."""
+
+    max_retries: int = 3
+    """Number of retries after the first attempt."""
+    initial_delay: float = 0.5
+    """Delay in seconds before the first retry, doubled on each retry."""
+    max_delay: float = 30.0
+    retry_on: Tuple[Type[BaseException], ...] = (
+        OutputParserException, ConnectionError, TimeoutError, asyncio.TimeoutError)
+    """Exceptions considered transient, e.g. malformed output or transport failures."""
+
+    def delay(self, retry: int) -> float:
+        """Seconds to wait before the given retry, starting at 0."""
+        delay = min(self.max_delay, self.initial_delay * 2 ** retry)
+        return delay * (0.5 + random.random() / 2)
+
+
+@dataclass
+class BatchStats:
+    """Counters and latencies collected while running a batch."""
+
+    completed: int = 0
+    failed: int = 0
+    retries: int = 0
+    elapsed: float = 0.0
+    """Wall clock seconds spent running the batch."""
+    latencies: List[float] = field(default_factory=list)
+    """Seconds from the first attempt to the result of each completed input."""
+
+    @property
+    def throughput(self) -> float:
+        """Completed inputs per second."""
+        return self.completed / self.elapsed if self.elapsed else 0.0
+
+    def latency_percentile(self, percentile: float) -> float:
+        """The latency below which the given percentage of the inputs completed."""
+        if not self.latencies:
+            return 0.0
+        # Nearest rank
+        latencies = sorted(self.latencies)
+        rank = math.ceil(percentile / 100 * len(latencies))
+        return latencies[min(max(rank, 1), len(latencies)) - 1]
+
+    def percentiles(self) -> Dict[str, float]:
+        return {f"p{p}": self.latency_percentile(p) for p in (50, 90, 95, 99)}
+
+
+async def run_concurrently(
+    func: Callable[[T], Awaitable[R]],
+    items: Sequence[T],
+    max_concurrency: int = 8,
+    rate_limiter: Optional[RateLimiter] = None,
+    retry_policy: Optional[RetryPolicy] = None,
+    tokens: Optional[Callable[[T], int]] = None,
+    return_exceptions: bool = False,
+    stats: Optional[BatchStats] = None,
+) -> List[R]:
+    """
+    Runs func over the items with at most max_concurrency calls in flight and
+    returns the results in input order.
+
+    Args:
+        rate_limiter: Limiter each attempt is acquired from, with the tokens
+            estimated for the item.
+        retry_policy: Policy to retry failed attempts with, no retries if None.
+        tokens: Estimates the tokens of an item for the rate limiter.
+        return_exceptions: Return the exception of an item that failed all its
+            attempts in place of its result instead of raising it, raising
+            cancels the calls still running.
+        stats: Collects the throughput and latencies of the batch.
+    """
+    if max_concurrency < 1:
+        raise ValueError(f"max_concurrency must be 1 or greater, got {max_concurrency}")
+    stats = stats if stats is not None else BatchStats()
+    results: List = [None] * len(items)
+    pending: Iterable[int] = iter(range(len(items)))
+    started = time.perf_counter()
+
+    async def attempt(index: int) -> R:
+        item = items[index]
+        item_tokens = 0
+        if rate_limiter is not None and rate_limiter.tokens_per_minute is not None and tokens is not None:
+            item_tokens = tokens(item)
+        retry = 0
+        while True:
+            if rate_limiter is not None:
+                await rate_limiter.acquire(item_tokens)
+            try:
+                return await func(item)
+            except Exception as e:
+                if retry_policy is None or retry >= retry_policy.max_retries or not isinstance(
+                        e, retry_policy.retry_on):
+                    raise
+                await asyncio.sleep(retry_policy.delay(retry))
+                retry += 1
+                stats.retries += 1
+
+    async def worker() -> None:
+        for index in pending:
+            start = time.perf_counter()
+            try:
+                results[index] = await attempt(index)
+            except Exception as e:
+                stats.failed += 1
+                if not return_exceptions:
+                    raise
+                results[index] = e
+            else:
+                stats.completed += 1
+                stats.latencies.append(time.perf_counter() - start)
+
+    workers = [asyncio.ensure_future(worker()) for _ in range(min(max_concurrency, len(items)))]
+    try:
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:
+            task.cancel()
+        stats.elapsed += time.perf_counter() - started
+    return results
@@ -0,0 +1,150 @@
+"""Length measurement layer used by the text splitters.
+
+Measuring text is often the most expensive part of splitting, for example
+when the length function runs a tokenizer. CachedLengthFunction memoizes
+lengths in a bounded LRU cache and can measure many strings with a single
+call to a batch length function.
+"""
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Sequence
+
+from langchain_util.metrics import BaseMetricsSink
+
+
+@dataclass
+class LengthFunctionStats:
+    """Counters collected by a CachedLengthFunction."""
+
+    hits: int = 0
+    """Lengths served from the cache."""
+    misses: int = 0
+    """Lengths that had to be computed."""
+    calls: int = 0
+    """Calls made to the wrapped length or batch length function."""
+    documents: int = 0
+    """Documents processed by the splitter using the length function."""
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    @property
+    def calls_per_document(self) -> float:
+        return self.calls / self.documents if self.documents else float(self.calls)
+
+    def reset(self) -> None:
+        self.hits = self.misses = self.calls = self.documents = 0
+
+
+class CachedLengthFunction:
+    """
+    Wraps a length function with a bounded LRU cache keyed on the string and
+    an optional batch interface. Instances are callable, so they can be used
+    anywhere a length function is expected. It is safe to share between
+    threads and can be pickled, the cache is not pickled.
+    """
+
+    def __init__(
+        self,
+        length_function: Callable[[str], int] = len,
+        maxsize: int = 10_000,
+        batch_length_function: Optional[Callable[[List[str]], List[int]]] = None,
+        metrics: Optional[BaseMetricsSink] = None,
+    ):
+        """
+        Args:
+            length_function: Function that measures a single string.
+            maxsize: Maximum number of cached lengths, 0 disables caching.
+            batch_length_function: Optional function that measures a list of
+                strings in one call, e.g. a batched tokenizer.
+            metrics: Sink the calls to the wrapped functions are counted in,
+                as length_function_calls_total.
+        """
+        if maxsize < 0:
+            raise ValueError(f"maxsize must be 0 or greater, got {maxsize}")
+        self.length_function = length_function
+        self.batch_length_function = batch_length_function
+        self.maxsize = maxsize
+        self.stats = LengthFunctionStats()
+        self.metrics = metrics
+        self._cache: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state["_lock"]
+        state["_cache"] = OrderedDict()
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __call__(self, text: str) -> int:
+        with self._lock:
+            length = self._get(text)
+            if length is not None:
+                return length
+            self.stats.misses += 1
+            self.stats.calls += 1
+        if self.metrics is not None:
+            self.metrics.increment("length_function_calls_total")
+        length = self.length_function(text)
+        with self._lock:
+            self._put(text, length)
+        return length
+
+    def measure_batch(self, texts: Sequence[str]) -> List[int]:
+        """Measure all texts, computing the uncached ones in a single batch call."""
+        with self._lock:
+            lengths: List[Optional[int]] = [self._get(text) for text in texts]
+            missing = {}
+            for i, length in enumerate(lengths):
+                if length is None:
+                    missing.setdefault(texts[i], []).append(i)
+            if not missing:
+                return lengths  # type: ignore[return-value]
+            self.stats.misses += len(missing)
+            self.stats.hits += sum(len(indexes) - 1 for indexes in missing.values())
+            calls = 1 if self.batch_length_function is not None else len(missing)
+            self.stats.calls += calls
+        if self.metrics is not None:
+            self.metrics.increment("length_function_calls_total", calls)
+        pending = list(missing)
+        if self.batch_length_function is not None:
+            measured = self.batch_length_function(pending)
+            if len(measured) != len(pending):
+                raise RuntimeError(
+                    f"Batch length function returned {len(measured)} lengths "
+                    f"for {len(pending)} texts"
+                )
+        else:
+            measured = [self.length_function(text) for text in pending]
+        with self._lock:
+            for text, length in zip(pending, measured):
+                self._put(text, length)
+        for text, length in zip(pending, measured):
+            for i in missing[text]:
+                lengths[i] = length
+        return lengths  # type: ignore[return-value]
+
+    def cache_clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def _get(self, text: str) -> Optional[int]:
+        length = self._cache.get(text)
+        if length is not None:
+            self._cache.move_to_end(text)
+            self.stats.hits += 1
+        return length
+
+    def _put(self, text: str, length: int) -> None:
+        if self.maxsize == 0:
+            return
+        self._cache[text] = length
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
@@ -0,0 +1,50 @@
+"""Immutable metadata that can be shared between the chunks of a document."""
+from typing import Any, Mapping, NoReturn
+
+
+class FrozenDict(dict):
+    """
+    A dict that can not be modified. It is still a dict, so it can be used as
+    document metadata, serialized to JSON and pickled.
+    """
+
+    def _immutable(self, *args: Any, **kwargs: Any) -> NoReturn:
+        raise TypeError(f"{type(self).__name__} can not be modified")
+
+    __setitem__ = _immutable
+    __delitem__ = _immutable
+    __ior__ = _immutable
+    clear = _immutable
+    pop = _immutable
+    popitem = _immutable
+    setdefault = _immutable
+    update = _immutable
+
+    def __copy__(self) -> "FrozenDict":
+        return self
+
+    def __deepcopy__(self, memo: dict) -> "FrozenDict":
+        return self
+
+    def __reduce__(self) -> tuple:
+        return (type(self), (dict(self),))
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({dict.__repr__(self)})"
+
+
+def freeze(value: Any) -> Any:
+    """
+    Recursively converts mappings into FrozenDicts, lists into tuples and
+    sets into frozensets, other values are returned as they are.
+    """
+    if isinstance(value, FrozenDict):
+        return value
+    if isinstance(value, Mapping):
+        return FrozenDict((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(value)
+    return value
+
@@ -0,0 +1,286 @@
+"""Opt-in metrics of the text splitters, chains and tools.
+
+The splitters, SentimentChain and AgentAsTool accept a metrics sink and
+record stage timings, counts and size distributions to it. Without a sink
+nothing is measured, the instrumented code only checks the sink is None.
+
+Metrics are either counters, added to with increment, or observations, e.g.
+durations in seconds or chunk sizes, recorded with observe. Both take
+optional labels. InMemoryMetricsSink keeps everything for inspection,
+LoggingMetricsSink logs each metric as it is recorded and
+PrometheusMetricsSink aggregates counters and histograms and renders them in
+the Prometheus text exposition format.
+"""
+import bisect
+import logging
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+Labels = Optional[Mapping[str, str]]
+_Series = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+"""Histogram buckets of the durations, in seconds."""
+SIZE_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+"""Histogram buckets of the chunk sizes, in characters."""
+
+
+def _series(name: str, labels: Labels) -> _Series:
+    return name, tuple(sorted(labels.items())) if labels else ()
+
+
+class BaseMetricsSink(ABC):
+    """Interface for the destinations of the metrics."""
+
+    @abstractmethod
+    def increment(self, name: str, value: float = 1, labels: Labels = None) -> None:
+        """Adds value to a counter."""
+
+    @abstractmethod
+    def observe(self, name: str, value: float, labels: Labels = None) -> None:
+        """Records an observation, e.g. a duration in seconds or a size."""
+
+    def observe_many(self, name: str, values: Sequence[float], labels: Labels = None) -> None:
+        """Records many observations of the same metric, sinks can do it at once."""
+        for value in values:
+            self.observe(name, value, labels)
+
+
+class _Timer:
+    """Observes the seconds spent in a with block."""
+
+    __slots__ = ("sink", "name", "labels", "start")
+
+    def __init__(self, sink: BaseMetricsSink, name: str, labels: Labels):
+        self.sink = sink
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self) -> "_Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.sink.observe(self.name, time.perf_counter() - self.start, self.labels)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullTimer":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timed(sink: Optional[BaseMetricsSink], name: str, labels: Labels = None):
+    """Context manager observing the seconds spent in its block, a shared no-op without a sink."""
+    if sink is None:
+        return _NULL_TIMER
+    return _Timer(sink, name, labels)
+
+
+class InMemoryMetricsSink(BaseMetricsSink):
+    """
+    Keeps the counters and every observation in memory. It is safe to share
+    between threads, metrics recorded in worker processes are not reported back.
+    """
+
+    def __init__(self) -> None:
+        self.counters: Dict[_Series, float] = defaultdict(float)
+        self.observations: Dict[_Series, List[float]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, value: float = 1, labels: Labels = None) -> None:
+        with self._lock:
+            self.counters[_series(name, labels)] += value
+
+    def observe(self, name: str, value: float, labels: Labels = None) -> None:
+        with self._lock:
+            self.observations[_series(name, labels)].append(value)
+
+    def observe_many(self, name: str, values: Sequence[float], labels: Labels = None) -> None:
+        with self._lock:
+            self.observations[_series(name, labels)].extend(values)
+
+    def counter(self, name: str, **labels: str) -> float:
+        """The sum of the counters with the name and at least the given labels."""
+        with self._lock:
+            return sum(value for series, value in self.counters.items() if _matches(series, name, labels))
+
+    def values(self, name: str, **labels: str) -> List[float]:
+        """The observations with the name and at least the given labels."""
+        with self._lock:
+            return [
+                value for series, values in self.observations.items()
+                if _matches(series, name, labels) for value in values
+            ]
+
+    def percentile(self, name: str, percentile: float, **labels: str) -> float:
+        """The value below which the given percentage of the observations are."""
+        values = sorted(self.values(name, **labels))
+        if not values:
+            return 0.0
+        # Nearest rank
+        rank = math.ceil(percentile / 100 * len(values))
+        return values[min(max(rank, 1), len(values)) - 1]
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters.clear()
+            self.observations.clear()
+
+
+def _matches(series: _Series, name: str, labels: Mapping[str, str]) -> bool:
+    series_name, series_labels = series
+    return series_name == name and all(item in series_labels for item in labels.items())
+
+
+class LoggingMetricsSink(BaseMetricsSink):
+    """Logs every metric as it is recorded, at DEBUG level by default."""
+
+    def __init__(self, logger: Optional[logging.Logger] = None, level: int = logging.DEBUG):
+        self.logger = logger or logging.getLogger(__name__)
+        self.level = level
+
+    def increment(self, name: str, value: float = 1, labels: Labels = None) -> None:
+        if self.logger.isEnabledFor(self.level):
+            self.logger.log(self.level, "counter %s%s += %g", name, _format_labels(labels), value)
+
+    def observe(self, name: str, value: float, labels: Labels = None) -> None:
+        if self.logger.isEnabledFor(self.level):
+            self.logger.log(self.level, "observe %s%s = %g", name, _format_labels(labels), value)
+
+
+class PrometheusMetricsSink(BaseMetricsSink):
+    """
+    Aggregates the counters and the observations into histograms, render
+    returns them in the Prometheus text exposition format, e.g. to serve them
+    on a /metrics endpoint or to write them for the node exporter textfile
+    collector. It is safe to share between threads.
+    """
+
+    def __init__(
+        self,
+        namespace: str = "langchain_util",
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        metric_buckets: Optional[Mapping[str, Sequence[float]]] = None,
+    ):
+        """
+        Args:
+            namespace: Prefix of the metric names.
+            buckets: Upper bounds of the histogram buckets.
+            metric_buckets: Buckets of specific metrics, by default the chunk
+                sizes use SIZE_BUCKETS.
+        """
+        self.namespace = namespace
+        self.buckets = tuple(sorted(buckets))
+        self.metric_buckets = {"splitter_chunk_chars": SIZE_BUCKETS, **(metric_buckets or {})}
+        self._bounds: Dict[str, Tuple[float, ...]] = {}
+        self._counters: Dict[_Series, float] = defaultdict(float)
+        # Series -> (observations per bucket and above the last one, sum, count)
+        self._histograms: Dict[_Series, Tuple[List[int], float, int]] = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _buckets(self, name: str) -> Tuple[float, ...]:
+        bounds = self._bounds.get(name)
+        if bounds is None:
+            bounds = self._bounds[name] = tuple(sorted(self.metric_buckets.get(name, self.buckets)))
+        return bounds
+
+    def increment(self, name: str, value: float = 1, labels: Labels = None) -> None:
+        with self._lock:
+            self._counters[_series(name, labels)] += value
+
+    def observe(self, name: str, value: float, labels: Labels = None) -> None:
+        self.observe_many(name, (value,), labels)
+
+    def observe_many(self, name: str, values: Sequence[float], labels: Labels = None) -> None:
+        series = _series(name, labels)
+        with self._lock:
+            bounds = self._buckets(name)
+            histogram = self._histograms.get(series)
+            counts, total, count = histogram or ([0] * (len(bounds) + 1), 0.0, 0)
+            for value in values:
+                counts[bisect.bisect_left(bounds, value)] += 1
+            self._histograms[series] = (counts, total + sum(values), count + len(values))
+
+    def render(self) -> str:
+        """The metrics in the Prometheus text exposition format."""
+        lines: List[str] = []
+        with self._lock:
+            for name, series in _group(self._counters).items():
+                metric = self._name(name)
+                lines.append(f"# TYPE {metric} counter")
+                for labels, value in series:
+                    lines.append(f"{metric}{_format_labels(dict(labels))} {_format_value(value)}")
+            for name, series in _group(self._histograms).items():
+                metric = self._name(name)
+                lines.append(f"# TYPE {metric} histogram")
+                for labels, (counts, total, count) in series:
+                    # Buckets are cumulative
+                    bucket_count = 0
+                    for bound, observations in zip(self._buckets(name), counts):
+                        bucket_count += observations
+                        bucket_labels = {**dict(labels), "le": f"{bound:g}"}
+                        lines.append(f"{metric}_bucket{_format_labels(bucket_labels)} {bucket_count}")
+                    lines.append(f"{metric}_bucket{_format_labels({**dict(labels), 'le': '+Inf'})} {count}")
+                    lines.append(f"{metric}_sum{_format_labels(dict(labels))} {_format_value(total)}")
+                    lines.append(f"{metric}_count{_format_labels(dict(labels))} {count}")
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def _name(self, name: str) -> str:
+        return f"{self.namespace}_{name}" if self.namespace else name
+
+
+def _group(metrics: Mapping[_Series, object]) -> Dict[str, list]:
+    """The labels and values of each metric, sorted by name and labels."""
+    grouped: Dict[str, list] = defaultdict(list)
+    for (name, labels), value in sorted(metrics.items(), key=lambda item: item[0]):
+        grouped[name].append((labels, value))
+    return grouped
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for key, value in labels.items()
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
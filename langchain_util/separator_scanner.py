@@ -0,0 +1,111 @@
+"""Separator scanning for the recursive splitters.
+
+The recursive splitter needs to find which separator is present in a range
+of the text and then split the range on it. SeparatorScanner precompiles the
+separators once per splitter and SeparatorIndex tracks the separators of a
+single text: separators missing from the text are ruled out once, and a
+separator that is split on across the text is indexed once, so the recursion
+can work on index ranges without rescanning or copying the text at every
+level.
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate, repeat
+from operator import add, sub
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+def _is_self_overlapping(separator: str) -> bool:
+    """Whether two occurrences of the separator can overlap, e.g. "\\n\\n" in "\\n\\n\\n"."""
+    return any(separator[:k] == separator[-k:] for k in range(1, len(separator)))
+
+
+class SeparatorScanner:
+    """Separators compiled once per splitter, used to index the texts to split."""
+
+    def __init__(self, separators: Sequence[str]):
+        self.separators = list(separators)
+        self._self_overlapping = {s: _is_self_overlapping(s) for s in self.separators if s}
+
+    def index(self, text: str) -> "SeparatorIndex":
+        return SeparatorIndex(self, text)
+
+
+class SeparatorIndex:
+    """The separator positions of a single text."""
+
+    def __init__(self, scanner: SeparatorScanner, text: str):
+        self._scanner = scanner
+        self.text = text
+        self._present: Dict[str, bool] = {}
+        self._scanned: Dict[str, int] = {}
+        self._ends: Dict[str, "array[int]"] = {}
+
+    def find_separator(self, start: int, end: int) -> str:
+        """
+        Returns the first separator present in text[start:end], the empty
+        separator is always present, if none is found the last separator is
+        returned.
+        """
+        text = self.text
+        present = self._present
+        for separator in self._scanner.separators:
+            if separator == "":
+                return separator
+            in_text = present.get(separator)
+            if in_text is None:
+                in_text = present[separator] = separator in text
+            if in_text and text.find(separator, start, end) != -1:
+                return separator
+        return self._scanner.separators[-1]
+
+    def split(
+        self, separator: str, start: int, end: int
+    ) -> Tuple[Sequence[int], List[int]]:
+        """
+        Returns the start offsets and the lengths in characters of the pieces
+        of text[start:end].split(separator), or of its characters for "".
+        """
+        if separator == "":
+            return range(start, end), [1] * (end - start)
+        ends = self._occurrence_ends(separator, start, end)
+        if ends is None:
+            pieces = self.text[start:end].split(separator)
+            lengths = list(map(len, pieces))
+            # Each piece starts where the previous piece and separator end
+            starts = list(accumulate(map(add, lengths, repeat(len(separator))), initial=start))
+            starts.pop()
+            return starts, lengths
+        starts = [start]
+        starts.extend(ends)
+        lengths = list(map(sub, map(sub, ends, repeat(len(separator))), starts))
+        lengths.append(end - starts[-1])
+        return starts, lengths
+
+    def _occurrence_ends(self, separator: str, start: int, end: int) -> Optional[Sequence[int]]:
+        """
+        The end positions of the occurrences str.split would split on in
+        text[start:end], from the index of the text, or None if the range has
+        to be scanned on its own.
+        """
+        ends = self._ends.get(separator)
+        if ends is None:
+            # Ranges are scanned on their own until the scanned size exceeds
+            # the size of the text, then the whole text is indexed once
+            scanned = self._scanned.get(separator, 0) + end - start
+            self._scanned[separator] = scanned
+            if scanned <= len(self.text):
+                return None
+            pieces = self.text.split(separator)
+            ends = self._ends[separator] = array("q", accumulate(
+                map(add, map(len, pieces[:-1]), repeat(len(separator)))))
+        separator_len = len(separator)
+        lo = bisect_left(ends, start + separator_len)
+        hi = bisect_right(ends, end, lo)
+        if self._scanner._self_overlapping[separator]:
+            # The occurrences within the range match the ones of the whole text
+            # only if the first one is the same, otherwise scan the range
+            first = self.text.find(separator, start, end)
+            if first != -1 and (lo == hi or ends[lo] - separator_len != first):
+                return None
+        return ends[lo:hi]
@@ -0,0 +1,86 @@
+"""Compact representation of chunks as offsets into their source text."""
+from array import array
+from typing import Iterable, Iterator, Sequence, Tuple, Union, overload
+
+
+class ChunkSpan:
+    """A chunk of a source text, referenced by its start and end offsets."""
+
+    __slots__ = ("source", "start", "end")
+
+    def __init__(self, source: str, start: int, end: int):
+        self.source = source
+        self.start = start
+        self.end = end
+
+    @property
+    def text(self) -> str:
+        """The text of the chunk, materialized on each access."""
+        return self.source[self.start:self.end]
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, ChunkSpan):
+            return NotImplemented
+        return (self.start, self.end, self.source) == (other.start, other.end, other.source)
+
+    def __repr__(self) -> str:
+        return f"ChunkSpan(start={self.start}, end={self.end})"
+
+
+class ChunkSpans(Sequence[ChunkSpan]):
+    """
+    The chunks of a source text stored as an array of offsets, the text of
+    the chunks is only materialized on demand, so overlapping chunks do not
+    duplicate the overlapped text.
+    """
+
+    def __init__(self, source: str, offsets: Iterable[Tuple[int, int]] = ()):
+        self.source = source
+        self._offsets = array("q")
+        for start, end in offsets:
+            self.append(start, end)
+
+    def append(self, start: int, end: int) -> None:
+        self._offsets.append(start)
+        self._offsets.append(end)
+
+    def offsets(self) -> Iterator[Tuple[int, int]]:
+        """Iterate over the (start, end) offsets of the chunks."""
+        it = iter(self._offsets)
+        return zip(it, it)
+
+    def texts(self) -> Iterator[str]:
+        """Iterate over the text of the chunks."""
+        for start, end in self.offsets():
+            yield self.source[start:end]
+
+    def __len__(self) -> int:
+        return len(self._offsets) // 2
+
+    @overload
+    def __getitem__(self, index: int) -> ChunkSpan:
+        ...
+
+    @overload
+    def __getitem__(self, index: slice) -> "ChunkSpans":
+        ...
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[ChunkSpan, "ChunkSpans"]:
+        if isinstance(index, slice):
+            spans = ChunkSpans(self.source)
+            for i in range(*index.indices(len(self))):
+                spans.append(self._offsets[2 * i], self._offsets[2 * i + 1])
+            return spans
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("ChunkSpans index out of range")
+        return ChunkSpan(self.source, self._offsets[2 * index], self._offsets[2 * index + 1])
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, ChunkSpans):
+            return NotImplemented
+        return self._offsets == other._offsets and self.source == other.source
+
+    def __repr__(self) -> str:
+        return f"ChunkSpans({list(self.offsets())})"
@@ -0,0 +1,10 @@
+"""Text helpers shared by the caches of the chains and tools."""
+import re
+import unicodedata
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Normalizes unicode, case and whitespace, so trivially different texts share a key."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text).casefold()).strip()
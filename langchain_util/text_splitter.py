@@ -1,8 +1,31 @@
+import asyncio
 import copy
+import functools
+import json
+import logging
+import types
 from abc import ABC, abstractmethod
-from typing import Callable, List, Optional, Iterable, Sequence, Any
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import (
+    Any, AsyncIterable, AsyncIterator, Callable, Deque, Iterable, Iterator, List, Optional,
+    Sequence, Tuple, Union
+)
 from langchain.docstore.document import Document
 from langchain.schema import BaseDocumentTransformer
+from langchain_util.chunk_cache import BaseChunkCache, chunk_cache_key
+from langchain_util.length_function import CachedLengthFunction, LengthFunctionStats
+from langchain_util.metadata import freeze
+from langchain_util.metrics import BaseMetricsSink, timed
+from langchain_util.separator_scanner import SeparatorIndex, SeparatorScanner
+from langchain_util.spans import ChunkSpans
+from langchain_util.tokens import TiktokenTokenizer, TokenCounter, TokenOffsets, Tokenizer
+
+logger = logging.getLogger(__name__)
+
+_CREATE_DOCUMENTS = {"component": "splitter", "stage": "create_documents"}
+_MEASURE = {"component": "splitter", "stage": "measure"}
+_MERGE_SPLITS = {"component": "splitter", "stage": "merge_splits"}
 
 
 class TextSplitterWithContext(BaseDocumentTransformer, ABC):
@@ -16,9 +39,42 @@ class TextSplitterWithContext(BaseDocumentTransformer, ABC):
         length_function: Callable[[str], int] = len,
         context_key: str = "chunk-context",
         context_separator: str = "\n\n",
-        context_perc_of_chunk_size: float = 20
+        context_perc_of_chunk_size: float = 20,
+        length_cache_size: int = 0,
+        batch_length_function: Optional[Callable[[List[str]], List[int]]] = None,
+        share_metadata: bool = False,
+        add_start_index: bool = False,
+        chunk_cache: Optional[BaseChunkCache] = None,
+        length_function_id: Optional[str] = None,
+        metrics: Optional[BaseMetricsSink] = None
     ):
-        """Create a new TextSplitter."""
+        """Create a new TextSplitter.
+
+        If length_cache_size or batch_length_function are set the length_function
+        is wrapped in a CachedLengthFunction, a CachedLengthFunction can also be
+        passed directly as the length_function.
+
+        By default the metadata of a document is deep copied into each of its
+        chunks. With share_metadata the metadata values are frozen once per
+        document and shared by all of its chunks, each chunk gets its own
+        top level dict with the chunk_index added.
+
+        With add_start_index the start_index and end_index of each chunk in the
+        original text, without the context, are added to the chunk metadata.
+
+        With a chunk_cache the chunks of texts that were already split with the
+        same context and splitter configuration are taken from the cache. The
+        length function is part of the configuration through length_function_id,
+        by default the module and qualified name of a module level function
+        or builtin. Lambdas, nested functions, partials and callable objects
+        have no such stable name, so a length_function_id must be given to
+        cache their chunks, it has to change whenever the lengths they return
+        change.
+
+        With a metrics sink the splitter records the seconds spent in its
+        stages, the documents and chunks created, the size of the chunks in
+        characters and the calls to the length function.
+        """
         if chunk_overlap > chunk_size:
             raise ValueError(
                 f"Got a larger chunk overlap ({chunk_overlap}) than chunk size "
@@ -28,38 +84,88 @@ class TextSplitterWithContext(BaseDocumentTransformer, ABC):
             raise ValueError(
                 f"context_perc_of_chunk_size must be greater than 0 and less than 90 percent"
             )
+        if length_function_id is None:
+            length_function_id = _function_id(
+                length_function.length_function
+                if isinstance(length_function, CachedLengthFunction) else length_function
+            )
+        if chunk_cache is not None and length_function_id is None:
+            raise ValueError(
+                f"The length function {length_function!r} has no stable name to identify "
+                f"its chunks in the chunk cache, pass a length_function_id"
+            )
         self._chunk_size = chunk_size
         self._chunk_overlap = chunk_overlap
+        if (length_cache_size or batch_length_function) and not isinstance(
+                length_function, CachedLengthFunction):
+            length_function = CachedLengthFunction(
+                length_function,
+                maxsize=length_cache_size,
+                batch_length_function=batch_length_function
+            )
+        if (metrics is not None and isinstance(length_function, CachedLengthFunction)
+                and length_function.metrics is None):
+            length_function.metrics = metrics
         self._length_function = length_function
+        self._metrics = metrics
+        # A CachedLengthFunction counts the calls to the function it wraps
+        self._count_lengths = metrics is not None and not isinstance(length_function, CachedLengthFunction)
         self._context_key = context_key
         self._context_separator = context_separator
         self._context_perc_of_chunk_size = context_perc_of_chunk_size / 100
+        self._share_metadata = share_metadata
+        self._add_start_index = add_start_index
+        self._chunk_cache = chunk_cache
+        self._length_function_id = length_function_id
+        self._chunk_cache_config: Optional[str] = None
+
+    @property
+    def length_function_stats(self) -> Optional[LengthFunctionStats]:
+        """Cache and call counters, available when using a CachedLengthFunction."""
+        if isinstance(self._length_function, CachedLengthFunction):
+            return self._length_function.stats
+        return None
 
     @abstractmethod
     def split_text(self, text: str, chunk_size: int) -> List[str]:
         """Split text into multiple components."""
 
+    def iter_split_text(self, text: str, chunk_size: int) -> Iterator[str]:
+        """Lazily split text into multiple components, in the same order as split_text."""
+        yield from self.split_text(text, chunk_size)
+
+    def split_spans(self, text: str, chunk_size: int) -> ChunkSpans:
+        """Split text into chunks represented by their offsets in the text."""
+        return ChunkSpans(text, self.iter_split_spans(text, chunk_size))
+
+    def iter_split_spans(self, text: str, chunk_size: int) -> Iterator[Tuple[int, int]]:
+        """
+        Lazily split text into the (start, end) offsets of its chunks. Splitters
+        that can't track offsets while splitting locate each chunk in the text,
+        raises ValueError if a chunk is not a substring of the text.
+        """
+        cursor = 0
+        for chunk in self.iter_split_text(text, chunk_size):
+            start = text.find(chunk, cursor)
+            if start < 0:
+                start = text.find(chunk)
+            if start < 0:
+                raise ValueError(
+                    f"{type(self).__name__} created a chunk that is not in the text, "
+                    f"its offsets can't be computed: {chunk[:50]!r}"
+                )
+            yield start, start + len(chunk)
+            cursor = start + 1
+
     def create_documents(
         self, texts: List[str], metadatas: Optional[List[dict]] = None
     ) -> List[Document]:
         """Create documents from a list of texts."""
         _metadatas = metadatas or [{}] * len(texts)
         documents = []
-        for i, text in enumerate(texts):
-            context_length = 0
-            context = ""
-            if _metadatas[i].get(self._context_key):
-                context = _metadatas[i].pop(
-                    self._context_key) + self._context_separator
-                context_length = self._length_function(context)
-                if context_length / self._chunk_size > self._context_perc_of_chunk_size:
-                    raise RuntimeError(f"Chunk context is too long: {context}")
-
-            for chunk in self.split_text(text, self._chunk_size - context_length):
-                new_doc = Document(
-                    page_content=context + chunk, metadata=copy.deepcopy(_metadatas[i])
-                )
-                documents.append(new_doc)
+        with timed(self._metrics, "stage_seconds", _CREATE_DOCUMENTS):
+            for i, text in enumerate(texts):
+                documents.extend(self._iter_text_documents(text, _metadatas[i]))
         return documents
 
     def split_documents(self, documents: List[Document]) -> List[Document]:
@@ -68,7 +174,140 @@ class TextSplitterWithContext(BaseDocumentTransformer, ABC):
         metadatas = [doc.metadata for doc in documents]
         return self.create_documents(texts, metadatas=metadatas)
 
-    def _join_docs(self, docs: List[str], separator: str) -> Optional[str]:
+    def iter_split_documents(self, documents: Iterable[Document]) -> Iterator[Document]:
+        """
+        Lazily split documents, only one input document is held in memory at a
+        time. Yields the same chunks in the same order as split_documents.
+        """
+        for doc in documents:
+            yield from self._iter_text_documents(doc.page_content, doc.metadata)
+
+    def split_documents_parallel(
+        self,
+        documents: Sequence[Document],
+        max_workers: Optional[int] = None,
+        chunksize: int = 16,
+        min_documents: int = 64,
+        executor: Optional[Executor] = None
+    ) -> List[Document]:
+        """
+        Split documents using a pool of processes, the output is the same as
+        split_documents and keeps the input order.
+
+        Args:
+            documents: The documents to split.
+            max_workers: Number of worker processes, defaults to the number of CPUs.
+            chunksize: Number of documents sent to a worker at a time.
+            min_documents: Batches smaller than this are split in-process, as
+                the cost of starting the workers outweighs the gain.
+            executor: An executor to use instead of creating a ProcessPoolExecutor,
+                batches are never split in-process when one is provided.
+
+        The splitter is pickled and sent to the workers, so its length function
+        must be picklable, and length function stats collected in the workers
+        are not reported back.
+        """
+        if executor is None and (len(documents) < min_documents or max_workers == 1):
+            return self.split_documents(list(documents))
+        texts = [doc.page_content for doc in documents]
+        metadatas = [doc.metadata for doc in documents]
+        split = functools.partial(_split_text_to_documents, self)
+        if executor is not None:
+            results = list(executor.map(split, texts, metadatas, chunksize=chunksize))
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                results = list(pool.map(split, texts, metadatas, chunksize=chunksize))
+        return [doc for docs in results for doc in docs]
+
+    def _iter_text_documents(self, text: str, metadata: dict) -> Iterator[Document]:
+        """Split a single text, adding its context to every chunk."""
+        length_function_stats = self.length_function_stats
+        if length_function_stats is not None:
+            length_function_stats.documents += 1
+        context_length = 0
+        context = ""
+        if metadata.get(self._context_key):
+            context = metadata.pop(
+                self._context_key) + self._context_separator
+            context_length = self._length_function(context)
+            if self._count_lengths:
+                self._metrics.increment("length_function_calls_total")
+            if context_length / self._chunk_size > self._context_perc_of_chunk_size:
+                raise RuntimeError(f"Chunk context is too long: {context}")
+
+        chunk_size = self._chunk_size - context_length
+        spans: Optional[Iterable[Tuple[int, int]]] = None
+        if self._chunk_cache is not None:
+            spans = self._cached_split_spans(text, context, chunk_size)
+        elif self._add_start_index:
+            spans = self.iter_split_spans(text, chunk_size)
+        if spans is None:
+            chunks = ((chunk, None) for chunk in self.iter_split_text(text, chunk_size))
+        elif self._add_start_index:
+            chunks = (
+                (text[start:end], {"start_index": start, "end_index": end})
+                for start, end in spans
+            )
+        else:
+            chunks = ((text[start:end], None) for start, end in spans)
+        if self._metrics is not None:
+            chunks = self._observe_chunks(chunks, len(context))
+        if self._share_metadata:
+            shared_metadata = freeze(metadata)
+            for i, (chunk, offsets) in enumerate(chunks):
+                chunk_metadata = {**shared_metadata, "chunk_index": i}
+                if offsets:
+                    chunk_metadata.update(offsets)
+                yield Document(page_content=context + chunk, metadata=chunk_metadata)
+        else:
+            for chunk, offsets in chunks:
+                chunk_metadata = copy.deepcopy(metadata)
+                if offsets:
+                    chunk_metadata.update(offsets)
+                yield Document(page_content=context + chunk, metadata=chunk_metadata)
+
+    def _observe_chunks(
+        self, chunks: Iterable[Tuple[str, Optional[dict]]], context_chars: int
+    ) -> Iterator[Tuple[str, Optional[dict]]]:
+        sizes = []
+        try:
+            for chunk, offsets in chunks:
+                sizes.append(context_chars + len(chunk))
+                yield chunk, offsets
+        finally:
+            # Recorded once per document, not to add a sink call per chunk
+            self._metrics.increment("splitter_documents_total")
+            self._metrics.increment("splitter_chunks_total", len(sizes))
+            self._metrics.observe_many("splitter_chunk_chars", sizes)
+
+    @property
+    def chunk_cache_config(self) -> str:
+        """Fingerprint of the configuration that determines the chunks, used in the cache keys."""
+        if self._chunk_cache_config is None:
+            self._chunk_cache_config = json.dumps(self._chunk_config(), sort_keys=True)
+        return self._chunk_cache_config
+
+    def _chunk_config(self) -> dict:
+        """The settings that determine the chunks of a text, subclasses add their own."""
+        return {
+            "splitter": f"{type(self).__module__}.{type(self).__qualname__}",
+            "chunk_size": self._chunk_size,
+            "chunk_overlap": self._chunk_overlap,
+            "length_function": self._length_function_id,
+        }
+
+    def _cached_split_spans(self, text: str, context: str, chunk_size: int) -> List[Tuple[int, int]]:
+        cache = self._chunk_cache
+        config = self.chunk_cache_config
+        cache.bind(config)
+        key = chunk_cache_key(config, text, context)
+        spans = cache.get(key)
+        if spans is None:
+            spans = list(self.iter_split_spans(text, chunk_size))
+            cache.put(key, config, spans)
+        return spans
+
+    def _join_docs(self, docs: Iterable[str], separator: str) -> Optional[str]:
         text = separator.join(docs)
         text = text.strip()
         if text == "":
@@ -76,48 +315,113 @@ class TextSplitterWithContext(BaseDocumentTransformer, ABC):
         else:
             return text
 
-    def _merge_splits(self, splits: Iterable[str], separator: str, chunk_size: int) -> List[str]:
-        # We now want to combine these smaller pieces into medium size
-        # chunks to send to the LLM.
-        separator_len = self._length_function(separator)
+    def _measure(self, texts: List[str]) -> List[int]:
+        """Measure all texts, in a single batch call when the length function supports it."""
+        with timed(self._metrics, "stage_seconds", _MEASURE):
+            if isinstance(self._length_function, CachedLengthFunction):
+                return self._length_function.measure_batch(texts)
+            if self._count_lengths:
+                self._metrics.increment("length_function_calls_total", len(texts))
+            return [self._length_function(text) for text in texts]
 
+    def _measure_spans(
+        self, text: str, starts: Sequence[int], char_lengths: List[int]
+    ) -> List[int]:
+        """Measure the text of the spans, without materializing it when measuring characters."""
+        if self._length_function is len:
+            return char_lengths
+        return self._measure([text[start:start + n] for start, n in zip(starts, char_lengths)])
+
+    def _merge_splits(
+        self,
+        splits: Iterable[str],
+        separator: str,
+        chunk_size: int,
+        lengths: Optional[Iterable[int]] = None
+    ) -> List[str]:
+        separator_len = self._length_function(separator)
+        splits = splits if isinstance(splits, list) else list(splits)
+        if self._count_lengths:
+            self._metrics.increment("length_function_calls_total", 1 if lengths is not None else 1 + len(splits))
+        if lengths is None:
+            lengths = [self._length_function(d) for d in splits]
+        elif not isinstance(lengths, list):
+            lengths = list(lengths)
         docs = []
-        current_doc: List[str] = []
+        for first, last in self._iter_merge_windows(lengths, separator_len, chunk_size):
+            doc = self._join_docs(splits[first:last], separator)
+            if doc is not None:
+                docs.append(doc)
+        return docs
+
+    def _merge_spans(
+        self,
+        text: str,
+        starts: Sequence[int],
+        char_lengths: Sequence[int],
+        lengths: Sequence[int],
+        separator_len: int,
+        chunk_size: int
+    ) -> List[Tuple[int, int]]:
+        """
+        Merges the spans of consecutive splits of a text, the merged text is
+        the same one _join_docs would produce for the splits.
+        """
+        spans = []
+        with timed(self._metrics, "stage_seconds", _MERGE_SPLITS):
+            for first, last in self._iter_merge_windows(lengths, separator_len, chunk_size):
+                start, end = starts[first], starts[last - 1] + char_lengths[last - 1]
+                # Equivalent to str.strip() on the merged text
+                while start < end and text[start].isspace():
+                    start += 1
+                while end > start and text[end - 1].isspace():
+                    end -= 1
+                if start < end:
+                    spans.append((start, end))
+        return spans
+
+    def _iter_merge_windows(
+        self, lengths: Sequence[int], separator_len: int, chunk_size: int
+    ) -> Iterator[Tuple[int, int]]:
+        """
+        Combines the splits into medium size chunks, yields the [first, last)
+        indexes of the splits that make up each chunk.
+        """
+        # The window is the range [first, i) of the splits, so every split is
+        # measured exactly once and evicting from the front is O(1).
+        chunk_overlap = self._chunk_overlap
+        first = 0
         total = 0
-        for d in splits:
-            _len = self._length_function(d)
+        for i, _len in enumerate(lengths):
             if (
-                total + _len + (separator_len if len(current_doc) > 0 else 0)
+                total + _len + (separator_len if i > first else 0)
                 > chunk_size
             ):
                 if total > chunk_size:
+                    if self._metrics is not None:
+                        self._metrics.increment("splitter_oversized_chunks_total")
                     logger.warning(
                         f"Created a chunk of size {total}, "
                         f"which is longer than the specified {chunk_size}"
                     )
-                if len(current_doc) > 0:
-                    doc = self._join_docs(current_doc, separator)
-                    if doc is not None:
-                        docs.append(doc)
+                if i > first:
+                    yield first, i
                     # Keep on popping if:
                     # - we have a larger chunk than in the chunk overlap
                     # - or if we still have any chunks and the length is long
-                    while total > self._chunk_overlap or (
+                    while total > chunk_overlap or (
                         total + _len +
-                            (separator_len if len(current_doc) > 0 else 0)
+                            (separator_len if i > first else 0)
                         > chunk_size
                         and total > 0
                     ):
-                        total -= self._length_function(current_doc[0]) + (
-                            separator_len if len(current_doc) > 1 else 0
+                        first += 1
+                        total -= lengths[first - 1] + (
+                            separator_len if i > first else 0
                         )
-                        current_doc = current_doc[1:]
-            current_doc.append(d)
-            total += _len + (separator_len if len(current_doc) > 1 else 0)
-        doc = self._join_docs(current_doc, separator)
-        if doc is not None:
-            docs.append(doc)
-        return docs
+            total += _len + (separator_len if i > first else 0)
+        if len(lengths) > first:
+            yield first, len(lengths)
 
     def transform_documents(
         self, documents: Sequence[Document], **kwargs: Any
@@ -128,8 +432,96 @@ class TextSplitterWithContext(BaseDocumentTransformer, ABC):
     async def atransform_documents(
         self, documents: Sequence[Document], **kwargs: Any
     ) -> Sequence[Document]:
-        """Asynchronously transform a sequence of documents by splitting them."""
-        raise NotImplementedError
+        """
+        Asynchronously transform a sequence of documents by splitting them,
+        accepts the same keyword arguments as aiter_split_documents.
+        """
+        return [doc async for doc in self.aiter_split_documents(documents, **kwargs)]
+
+    async def aiter_split_documents(
+        self,
+        documents: Union[Iterable[Document], AsyncIterable[Document]],
+        executor: Optional[Executor] = None,
+        max_concurrency: int = 4
+    ) -> AsyncIterator[Document]:
+        """
+        Split documents without blocking the event loop and yield the chunks in
+        input order, as soon as the chunks of each document are ready.
+
+        Args:
+            documents: The documents to split, can be an async iterable.
+            executor: Thread or process executor used for the splitting, the
+                event loop's default executor is used if not provided.
+            max_concurrency: Maximum number of documents being split at a time.
+        """
+        if max_concurrency < 1:
+            raise ValueError(
+                f"max_concurrency must be 1 or greater, got {max_concurrency}")
+        loop = asyncio.get_running_loop()
+        split = functools.partial(_split_text_to_documents, self)
+        pending: Deque[asyncio.Future] = deque()
+        try:
+            async for doc in _aiter(documents):
+                pending.append(loop.run_in_executor(
+                    executor, split, doc.page_content, doc.metadata))
+                if len(pending) >= max_concurrency:
+                    for chunk in await pending.popleft():
+                        yield chunk
+            while pending:
+                for chunk in await pending.popleft():
+                    yield chunk
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def _function_id(function: Callable) -> Optional[str]:
+    """
+    The module and qualified name of a module level function or builtin, None
+    for callables whose name doesn't determine what they compute: lambdas,
+    nested functions and closures, partials, bound methods and callable objects.
+    """
+    if isinstance(function, types.FunctionType):
+        if function.__closure__ or "<" in function.__qualname__:
+            return None
+    elif isinstance(function, types.BuiltinFunctionType):
+        if not (function.__self__ is None or isinstance(function.__self__, types.ModuleType)):
+            return None
+    else:
+        return None
+    return f"{function.__module__}.{function.__qualname__}"
+
+
+def _tokenizer_id(tokenizer: Tokenizer) -> Optional[str]:
+    """The id of the token counts of a tokenizer, see _function_id."""
+    if isinstance(tokenizer, TiktokenTokenizer):
+        return "{}.{}({!r}, allowed_special={!r}, disallowed_special={!r})".format(
+            TiktokenTokenizer.__module__, TiktokenTokenizer.__qualname__, tokenizer.encoding.name,
+            _special_tokens(tokenizer.allowed_special), _special_tokens(tokenizer.disallowed_special)
+        )
+    return _function_id(tokenizer)
+
+
+def _special_tokens(special: Any) -> Any:
+    return sorted(special) if isinstance(special, (set, frozenset, list, tuple)) else special
+
+
+async def _aiter(
+    items: Union[Iterable[Document], AsyncIterable[Document]]
+) -> AsyncIterator[Document]:
+    if isinstance(items, AsyncIterable):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+def _split_text_to_documents(
+    splitter: TextSplitterWithContext, text: str, metadata: dict
+) -> List[Document]:
+    """Split a single text, module level so that it can be sent to worker processes."""
+    return list(splitter._iter_text_documents(text, metadata))
 
 
 class RecursiveCharacterTextSplitterWithContext(TextSplitterWithContext):
@@ -143,42 +535,186 @@ class RecursiveCharacterTextSplitterWithContext(TextSplitterWithContext):
         """Create a new TextSplitter."""
         super().__init__(**kwargs)
         self._separators = separators or ["\n\n", "\n", " ", ""]
+        self._scanner = SeparatorScanner(self._separators)
+
+    def _chunk_config(self) -> dict:
+        return {**super()._chunk_config(), "separators": self._separators}
 
     def split_text(self, text: str, chunk_size: int) -> List[str]:
         """Split incoming text and return chunks."""
-        final_chunks = []
+        return list(self.iter_split_text(text, chunk_size))
+
+    def iter_split_text(self, text: str, chunk_size: int) -> Iterator[str]:
+        """Split incoming text and lazily yield chunks."""
+        for start, end in self.iter_split_spans(text, chunk_size):
+            yield text[start:end]
+
+    def iter_split_spans(self, text: str, chunk_size: int) -> Iterator[Tuple[int, int]]:
+        """Split incoming text and lazily yield the (start, end) offsets of the chunks."""
+        return self._iter_split_range(self._scanner.index(text), 0, len(text), chunk_size)
+
+    def _iter_split_range(
+        self, index: SeparatorIndex, start: int, end: int, chunk_size: int
+    ) -> Iterator[Tuple[int, int]]:
+        text = index.text
         # Get appropriate separator to use
-        separator = self._separators[-1]
-        for _s in self._separators:
-            if _s == "":
-                separator = _s
-                break
-            if _s in text:
-                separator = _s
-                break
+        separator = index.find_separator(start, end)
         # Now that we have the separator, split the text
-        if separator:
-            splits = text.split(separator)
+        starts, char_lengths = index.split(separator, start, end)
+        # Measure all the splits of this level at once
+        lengths = self._measure_spans(text, starts, char_lengths)
+        separator_len = self._length_function(separator)
+        if self._count_lengths:
+            self._metrics.increment("length_function_calls_total")
+        # Now go merging runs of small enough splits, recursively splitting longer ones.
+        _good_start = 0
+        oversized = (
+            [i for i, _len in enumerate(lengths) if _len >= chunk_size]
+            if lengths and max(lengths) >= chunk_size else []
+        )
+        for i in oversized:
+            if _good_start < i:
+                yield from self._merge_spans(
+                    text, starts[_good_start:i], char_lengths[_good_start:i],
+                    lengths[_good_start:i], separator_len, chunk_size)
+            yield from self._iter_split_range(
+                index, starts[i], starts[i] + char_lengths[i], chunk_size)
+            _good_start = i + 1
+        if _good_start < len(lengths):
+            yield from self._merge_spans(
+                text, starts[_good_start:], char_lengths[_good_start:],
+                lengths[_good_start:], separator_len, chunk_size)
+
+
+class TokenTextSplitterWithContext(RecursiveCharacterTextSplitterWithContext):
+    """Splits text on the separators, measuring chunk_size and chunk_overlap in tokens.
+
+    Each text is tokenized once, the number of tokens of any range of the
+    text is then computed from the token offsets, so the text is not
+    tokenized again at every recursion level and merge step. When no
+    separator is left the text is cut on token boundaries.
+    """
+
+    def __init__(
+        self, tokenizer: Tokenizer, separators: Optional[List[str]] = None, **kwargs: Any
+    ):
+        """Create a new TextSplitter.
+
+        Args:
+            tokenizer: Function returning the (start, end) character offsets
+                of the tokens of a text, it is also used to measure the context.
+                To use a chunk_cache with a tokenizer other than a
+                TiktokenTokenizer or a module level function, pass a
+                length_function_id identifying it.
+        """
+        kwargs.setdefault("length_function_id", _tokenizer_id(tokenizer))
+        super().__init__(separators=separators, length_function=TokenCounter(tokenizer), **kwargs)
+        self._tokenizer = tokenizer
+
+    @classmethod
+    def from_tiktoken_encoder(
+        cls,
+        encoding_name: str = "gpt2",
+        model_name: Optional[str] = None,
+        allowed_special: Any = frozenset(),
+        disallowed_special: Any = "all",
+        **kwargs: Any
+    ) -> "TokenTextSplitterWithContext":
+        """Text splitter that uses a tiktoken encoder to count tokens."""
+        try:
+            import tiktoken
+        except ImportError:
+            raise ValueError(
+                "Could not import tiktoken python package. "
+                "This is needed for TokenTextSplitterWithContext. "
+                "Please install it with `pip install tiktoken`."
+            )
+        if model_name is not None:
+            encoding = tiktoken.encoding_for_model(model_name)
         else:
-            splits = list(text)
-        # Now go merging things, recursively splitting longer texts.
-        _good_splits = []
-        for s in splits:
-            if self._length_function(s) < chunk_size:
-                _good_splits.append(s)
-            else:
-                if _good_splits:
-                    merged_text = self._merge_splits(
-                        _good_splits, separator, chunk_size)
-                    final_chunks.extend(merged_text)
-                    _good_splits = []
-                other_info = self.split_text(s, chunk_size)
-                final_chunks.extend(other_info)
-        if _good_splits:
-            merged_text = self._merge_splits(
-                _good_splits, separator, chunk_size)
-            final_chunks.extend(merged_text)
-        return final_chunks
+            encoding = tiktoken.get_encoding(encoding_name)
+        tokenizer = TiktokenTokenizer(
+            encoding, allowed_special=allowed_special, disallowed_special=disallowed_special)
+        return cls(tokenizer=tokenizer, **kwargs)
+
+    def iter_split_spans(self, text: str, chunk_size: int) -> Iterator[Tuple[int, int]]:
+        """Split incoming text and lazily yield the (start, end) offsets of the chunks."""
+        tokens = TokenOffsets(text, self._tokenizer)
+        return self._iter_split_token_range(
+            self._scanner.index(text), tokens, 0, len(text), chunk_size)
+
+    def _iter_split_token_range(
+        self, index: SeparatorIndex, tokens: TokenOffsets, start: int, end: int, chunk_size: int
+    ) -> Iterator[Tuple[int, int]]:
+        if tokens.count(start, end) <= chunk_size:
+            yield from self._merge_token_spans(
+                tokens, [start], [end - start], chunk_size)
+            return
+        separator = index.find_separator(start, end)
+        starts, char_lengths = (
+            index.split(separator, start, end) if separator != "" else ((), ()))
+        if len(starts) < 2:
+            # No separator left, cut on token boundaries, a single token is never split
+            spans = list(tokens.spans(start, end))
+            yield from self._merge_token_spans(
+                tokens, [s for s, _ in spans], [e - s for s, e in spans], chunk_size)
+            return
+        _good_start = 0
+        for i, (piece_start, n) in enumerate(zip(starts, char_lengths)):
+            if tokens.count(piece_start, piece_start + n) > chunk_size:
+                if _good_start < i:
+                    yield from self._merge_token_spans(
+                        tokens, starts[_good_start:i], char_lengths[_good_start:i], chunk_size)
+                yield from self._iter_split_token_range(
+                    index, tokens, piece_start, piece_start + n, chunk_size)
+                _good_start = i + 1
+        if _good_start < len(starts):
+            yield from self._merge_token_spans(
+                tokens, starts[_good_start:], char_lengths[_good_start:], chunk_size)
+
+    def _merge_token_spans(
+        self,
+        tokens: TokenOffsets,
+        starts: Sequence[int],
+        char_lengths: Sequence[int],
+        chunk_size: int
+    ) -> List[Tuple[int, int]]:
+        """
+        Merges consecutive splits into chunks of at most chunk_size tokens,
+        keeping up to chunk_overlap tokens between chunks. The tokens of each
+        candidate chunk are counted on the whole span, so separators and tokens
+        crossing split boundaries are counted exactly once.
+        """
+        spans = []
+        with timed(self._metrics, "stage_seconds", _MERGE_SPLITS):
+            chunk_overlap = self._chunk_overlap
+            text = tokens.text
+            first = 0
+            for i in range(len(starts) + 1):
+                if i < len(starts):
+                    if first == i or tokens.count(
+                            starts[first], starts[i] + char_lengths[i]) <= chunk_size:
+                        continue
+                if first == i:
+                    continue
+                start, end = starts[first], starts[i - 1] + char_lengths[i - 1]
+                # Equivalent to str.strip() on the merged text
+                while start < end and text[start].isspace():
+                    start += 1
+                while end > start and text[end - 1].isspace():
+                    end -= 1
+                if start < end:
+                    spans.append((start, end))
+                if i == len(starts):
+                    break
+                # Keep the trailing splits that fit in the overlap and leave room for split i
+                chunk_end = starts[i] + char_lengths[i]
+                while first < i and (
+                    tokens.count(starts[first], starts[i - 1] + char_lengths[i - 1]) > chunk_overlap
+                    or tokens.count(starts[first], chunk_end) > chunk_size
+                ):
+                    first += 1
+        return spans
 
 
 class MarkdownTextSplitterWithContext(RecursiveCharacterTextSplitterWithContext):
@@ -0,0 +1,91 @@
+"""Token offsets used by the token aware splitters.
+
+A document is tokenized once into the character offsets of its tokens, the
+number of tokens in any range of the text is then found by bisection over the
+sorted token boundaries instead of tokenizing the range again.
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from operator import itemgetter
+from typing import Any, Callable, Iterator, List, Sequence, Tuple
+
+Tokenizer = Callable[[str], Sequence[Tuple[int, int]]]
+"""Returns the (start, end) character offsets of the tokens of a text."""
+
+
+class TokenOffsets:
+    """The token boundaries of a single text."""
+
+    def __init__(self, text: str, tokenizer: Tokenizer):
+        self.text = text
+        offsets = tokenizer(text)
+        self._starts = array("q", map(itemgetter(0), offsets))
+        self._ends = array("q", map(itemgetter(1), offsets))
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def count(self, start: int, end: int) -> int:
+        """Number of tokens overlapping text[start:end]."""
+        if start >= end:
+            return 0
+        return bisect_left(self._starts, end) - bisect_right(self._ends, start)
+
+    def spans(self, start: int, end: int) -> Iterator[Tuple[int, int]]:
+        """The token spans overlapping text[start:end], clipped to the range."""
+        lo = bisect_right(self._ends, start)
+        hi = bisect_left(self._starts, end)
+        for i in range(lo, hi):
+            yield max(self._starts[i], start), min(self._ends[i], end)
+
+
+class TokenCounter:
+    """Length function counting the tokens of a text, picklable if the tokenizer is."""
+
+    def __init__(self, tokenizer: Tokenizer):
+        self.tokenizer = tokenizer
+
+    def __call__(self, text: str) -> int:
+        return len(self.tokenizer(text))
+
+
+class TiktokenTokenizer:
+    """Tokenizer returning the character offsets of the tokens of a tiktoken encoding."""
+
+    def __init__(self, encoding: Any, allowed_special: Any = frozenset(),
+                 disallowed_special: Any = "all"):
+        self.encoding = encoding
+        self.allowed_special = allowed_special
+        self.disallowed_special = disallowed_special
+
+    def __call__(self, text: str) -> List[Tuple[int, int]]:
+        tokens = self.encoding.encode(
+            text,
+            allowed_special=self.allowed_special,
+            disallowed_special=self.disallowed_special,
+        )
+        # Tokens are byte sequences that may split a character, map the byte
+        # boundaries of the tokens to the characters that contain them
+        char_at_byte = array("q")
+        for i, char in enumerate(text):
+            char_at_byte.extend([i] * len(char.encode("utf-8", "surrogatepass")))
+        char_at_byte.append(len(text))
+        offsets = []
+        byte_start = 0
+        for token_bytes in self.encoding.decode_tokens_bytes(tokens):
+            byte_end = byte_start + len(token_bytes)
+            offsets.append((char_at_byte[byte_start], char_at_byte[byte_end - 1] + 1))
+            byte_start = byte_end
+        return offsets
+
+    def __getstate__(self) -> dict:
+        # tiktoken encodings are not picklable, they are looked up again by name
+        state = self.__dict__.copy()
+        state["encoding"] = self.encoding.name
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        import tiktoken
+
+        self.__dict__.update(state)
+        self.encoding = tiktoken.get_encoding(state["encoding"])
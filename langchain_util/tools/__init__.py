@@ -1,6 +1,26 @@
-from langchain_util.tools.agent_as_tool import AgentAsTool
+"""Tools, imported on first access so importing the package stays cheap."""
+from typing import TYPE_CHECKING, Any, List
 
+if TYPE_CHECKING:
+    from langchain_util.tools.agent_as_tool import AgentAsTool
 
-__all_= [
+_EXPORTS = {
+    "AgentAsTool": "langchain_util.tools.agent_as_tool",
+}
+
+__all__ = [
     "AgentAsTool"
-]
\ No newline at end of file
+]
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    # __import__ rather than importlib.import_module, so the import is reported by python -X importtime
+    value = getattr(__import__(_EXPORTS[name], fromlist=[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted([*globals(), *_EXPORTS])
@@ -1,25 +1,368 @@
-from typing import Optional
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
 from langchain.agents.agent import AgentExecutor
+from langchain.input import get_color_mapping
+from langchain.schema import AgentAction, AgentFinish
 from langchain.tools.base import BaseTool
-from langchain.callbacks.manager import AsyncCallbackManagerForToolRun, CallbackManagerForToolRun
-            
+from langchain.callbacks.base import BaseCallbackManager
+from langchain.callbacks.manager import (
+    AsyncCallbackManager,
+    AsyncCallbackManagerForChainRun,
+    AsyncCallbackManagerForToolRun,
+    CallbackManager,
+    CallbackManagerForChainRun,
+    CallbackManagerForToolRun,
+    Callbacks,
+)
+from pydantic import PrivateAttr
+
+from langchain_util.tools.budget import (
+    CANCELLED, CURRENT_BUDGET, ITERATIONS, TIMEOUT, TOKENS,
+    AgentBudget, AgentLimitExceeded, AsyncTokenUsageHandler, TokenUsageHandler, approximate_tokens
+)
+from langchain_util.metrics import BaseMetricsSink, timed
+from langchain_util.tools.cache import ToolResultCache
+
+
+@dataclass
+class AgentToolStats:
+    """Counters collected by an AgentAsTool."""
+
+    runs: int = 0
+    """Times the agent was run, cached and deduplicated queries don't run it."""
+    deduplicated: int = 0
+    """Queries that waited for the result of an identical query already running."""
+    timeouts: int = 0
+    iteration_limits: int = 0
+    token_limits: int = 0
+    cancellations: int = 0
+    """Runs stopped because a call they run in was cancelled."""
+    partial_results: int = 0
+    """Runs stopped by a limit that returned a partial result."""
+
+    def record_limit(self, limit: str) -> None:
+        if limit == TIMEOUT:
+            self.timeouts += 1
+        elif limit == ITERATIONS:
+            self.iteration_limits += 1
+        elif limit == TOKENS:
+            self.token_limits += 1
+        elif limit == CANCELLED:
+            self.cancellations += 1
+
+    def reset(self) -> None:
+        self.runs = self.deduplicated = self.partial_results = 0
+        self.timeouts = self.iteration_limits = self.token_limits = self.cancellations = 0
+
+
 class AgentAsTool(BaseTool):
     """
     Enables an agent to be used as a tool. The name and description properties
     should be set on creation based on what the agent does.
+
+    When a timeout, max_iterations or max_tokens is set, or the call runs in a
+    call that has limits, e.g. the agent using this tool is itself an
+    AgentAsTool, the agent loop is run step by step, so the call can be stopped
+    between steps when it or a call it runs in reaches its limits. Async calls
+    also cancel the step running at the deadline, sync calls can only stop
+    between steps. Without limits the agent is called as is.
     """
     agent: AgentExecutor
     """Must be specified, the agent behind the tool"""
     output_key: str = "output"
     """The name of the output key from the agent response to return as the tool result"""
+    cache: Optional[ToolResultCache] = None
+    """Cache of the results, looked up by the normalized query before running the agent."""
+    single_flight: bool = False
+    """Run the agent once for concurrent identical queries, the others wait for its result.
+    If the call running the agent is cancelled one of the waiting calls runs it again."""
+    timeout: Optional[float] = None
+    """Seconds a call can run for, nested calls are also bound by the time left to the calls they run in."""
+    max_iterations: Optional[int] = None
+    """Maximum number of agent steps of a call."""
+    max_tokens: Optional[int] = None
+    """Maximum number of LLM tokens spent by a call, including the nested calls."""
+    token_length_function: Callable[[str], int] = approximate_tokens
+    """Measures the tokens of the LLM calls that don't report their token usage."""
+    partial_results: bool = True
+    """Return the partial result when a limit is reached, else raise AgentLimitExceeded."""
+    timeout_grace: float = 0.05
+    """Seconds past the deadline before an async call cancels its running step, nested
+    calls get a fraction of it, so they stop first and return their partial results."""
+    metrics: Optional[BaseMetricsSink] = None
+    """Sink of the agent run durations, the sources of the results and the limits reached."""
+    _stats: AgentToolStats = PrivateAttr(default_factory=AgentToolStats)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _in_flight: Dict[Tuple[str, str], Future] = PrivateAttr(default_factory=dict)
+    _ain_flight: Dict[Tuple[str, str], "asyncio.Future[str]"] = PrivateAttr(default_factory=dict)
+
+    @property
+    def stats(self) -> AgentToolStats:
+        return self._stats
 
     def _run(self, query: str, run_manager: Optional[CallbackManagerForToolRun] = None) -> str:
         """Use the tool."""
-        result = self.agent(query)
-        if self.output_key not in result:
-            raise RuntimeError(f"Output key: {self.output_key} not in agents response")
-        return str(result[self.output_key])
-    
+        callbacks = run_manager.get_child() if run_manager else None
+        key = ToolResultCache.key(self.name, query)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self._count("agent_tool_calls_total", source="cache")
+                return cached
+        if not self.single_flight:
+            return self._call_agent(key, lambda: self._execute(query, callbacks))
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+        if not leader:
+            self._stats.deduplicated += 1
+            self._count("agent_tool_calls_total", source="deduplicated")
+            return future.result()
+        try:
+            result = self._call_agent(key, lambda: self._execute(query, callbacks))
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
     async def _arun(self, query: str, run_manager: Optional[AsyncCallbackManagerForToolRun] = None) -> str:
         """Use the tool asynchronously."""
-        raise NotImplementedError("custom_search does not support async")
\ No newline at end of file
+        callbacks = run_manager.get_child() if run_manager else None
+        key = ToolResultCache.key(self.name, query)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self._count("agent_tool_calls_total", source="cache")
+                return cached
+        if not self.single_flight:
+            return await self._acall_agent(key, lambda: self._aexecute(query, callbacks))
+
+        future = self._ain_flight.get(key)
+        if future is not None:
+            self._stats.deduplicated += 1
+            self._count("agent_tool_calls_total", source="deduplicated")
+            while future is not None:
+                # Not shielded, the future is cancelled when the call running the
+                # agent is, then a waiter takes over instead of being cancelled too
+                await asyncio.wait({future})
+                if not future.cancelled():
+                    return future.result()
+                future = self._ain_flight.get(key)
+        future = self._ain_flight[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await self._acall_agent(key, lambda: self._aexecute(query, callbacks))
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Retrieved, not to log it when there are no waiters
+            future.exception()
+            raise
+        finally:
+            del self._ain_flight[key]
+
+    def _call_agent(self, key: Tuple[str, str], call: Callable[[], Tuple[Dict[str, Any], bool]]) -> str:
+        self._stats.runs += 1
+        self._count("agent_tool_calls_total", source="agent")
+        with timed(self.metrics, "stage_seconds", self._labels(stage="run")):
+            return self._store(key, *call())
+
+    async def _acall_agent(
+        self, key: Tuple[str, str], call: Callable[[], Awaitable[Tuple[Dict[str, Any], bool]]]
+    ) -> str:
+        self._stats.runs += 1
+        self._count("agent_tool_calls_total", source="agent")
+        with timed(self.metrics, "stage_seconds", self._labels(stage="run")):
+            return self._store(key, *await call())
+
+    def _labels(self, **labels: str) -> Optional[Dict[str, str]]:
+        return {"component": "agent_tool", "tool": self.name, **labels} if self.metrics is not None else None
+
+    def _count(self, name: str, **labels: str) -> None:
+        if self.metrics is not None:
+            self.metrics.increment(name, labels=self._labels(**labels))
+
+    def _store(self, key: Tuple[str, str], result: Dict[str, Any], complete: bool) -> str:
+        if self.output_key not in result:
+            raise RuntimeError(f"Output key: {self.output_key} not in agents response")
+        output = str(result[self.output_key])
+        # Partial results are not cached
+        if self.cache is not None and complete:
+            self.cache.put(key, output)
+        return output
+
+    def _budget(self) -> AgentBudget:
+        return AgentBudget(self.timeout, self.max_tokens, parent=CURRENT_BUDGET.get())
+
+    def _has_limits(self) -> bool:
+        """Whether the call or a call it runs in has limits, so the agent has to be run step by step."""
+        return (
+            self.timeout is not None or self.max_iterations is not None or self.max_tokens is not None
+            or CURRENT_BUDGET.get() is not None
+        )
+
+    def _callback_manager(self, manager_cls: type, callbacks: Callbacks, budget: AgentBudget) -> Any:
+        """The callback manager of the agent run, counting its tokens when there is a token budget."""
+        if self.max_tokens is not None:
+            handler_cls = AsyncTokenUsageHandler if manager_cls is AsyncCallbackManager else TokenUsageHandler
+            handler = handler_cls(budget, self.token_length_function)
+            if isinstance(callbacks, BaseCallbackManager):
+                callbacks = manager_cls(
+                    handlers=[*callbacks.handlers, handler],
+                    inheritable_handlers=[*callbacks.inheritable_handlers, handler],
+                    parent_run_id=callbacks.parent_run_id,
+                )
+            else:
+                callbacks = [*(callbacks or []), handler]
+        return manager_cls.configure(callbacks, self.agent.callbacks, self.agent.verbose)
+
+    def _execute(self, query: str, callbacks: Callbacks) -> Tuple[Dict[str, Any], bool]:
+        """
+        Runs the agent, step by step within the budget if there are limits,
+        returns its outputs and whether they are complete.
+        """
+        agent = self.agent
+        if not self._has_limits():
+            return agent(query, callbacks=callbacks), True
+        budget = self._budget()
+        token = CURRENT_BUDGET.set(budget)
+        try:
+            inputs = agent.prep_inputs(query)
+            run_manager = self._callback_manager(CallbackManager, callbacks, budget).on_chain_start(
+                {"name": agent.__class__.__name__}, inputs)
+            try:
+                outputs, complete = self._loop(inputs, budget, run_manager)
+            except (KeyboardInterrupt, Exception) as e:
+                run_manager.on_chain_error(e)
+                raise e
+            run_manager.on_chain_end(outputs)
+            return (agent.prep_outputs(inputs, outputs) if complete else outputs), complete
+        finally:
+            CURRENT_BUDGET.reset(token)
+
+    async def _aexecute(self, query: str, callbacks: Callbacks) -> Tuple[Dict[str, Any], bool]:
+        agent = self.agent
+        if not self._has_limits():
+            return await agent.acall(query, callbacks=callbacks), True
+        budget = self._budget()
+        token = CURRENT_BUDGET.set(budget)
+        try:
+            inputs = agent.prep_inputs(query)
+            run_manager = await self._callback_manager(AsyncCallbackManager, callbacks, budget).on_chain_start(
+                {"name": agent.__class__.__name__}, inputs)
+            try:
+                outputs, complete = await self._aloop(inputs, budget, run_manager)
+            except asyncio.CancelledError:
+                # Nested calls running in threads stop at their next step
+                budget.cancel()
+                raise
+            except (KeyboardInterrupt, Exception) as e:
+                await run_manager.on_chain_error(e)
+                raise e
+            await run_manager.on_chain_end(outputs)
+            return (agent.prep_outputs(inputs, outputs) if complete else outputs), complete
+        finally:
+            CURRENT_BUDGET.reset(token)
+
+    def _loop(
+        self, inputs: Dict[str, str], budget: AgentBudget, run_manager: CallbackManagerForChainRun
+    ) -> Tuple[Dict[str, Any], bool]:
+        """The loop of AgentExecutor._call, checking the limits before each step."""
+        agent = self.agent
+        name_to_tool_map = {tool.name: tool for tool in agent.tools}
+        color_mapping = get_color_mapping([tool.name for tool in agent.tools], excluded_colors=["green"])
+        intermediate_steps: List[Tuple[AgentAction, str]] = []
+        iterations = 0
+        start_time = time.time()
+        while agent._should_continue(iterations, time.time() - start_time):
+            limit = self._limit(budget, iterations)
+            if limit is not None:
+                return self._stop(limit, intermediate_steps), False
+            next_step_output = agent._take_next_step(
+                name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager=run_manager)
+            finish = self._finish(next_step_output, intermediate_steps)
+            if finish is not None:
+                return agent._return(finish, intermediate_steps, run_manager=run_manager), True
+            iterations += 1
+        output = agent.agent.return_stopped_response(agent.early_stopping_method, intermediate_steps, **inputs)
+        return agent._return(output, intermediate_steps, run_manager=run_manager), True
+
+    async def _aloop(
+        self, inputs: Dict[str, str], budget: AgentBudget, run_manager: AsyncCallbackManagerForChainRun
+    ) -> Tuple[Dict[str, Any], bool]:
+        """The loop of AgentExecutor._acall, checking the limits before each step and
+        cancelling the step running at the deadline."""
+        agent = self.agent
+        name_to_tool_map = {tool.name: tool for tool in agent.tools}
+        color_mapping = get_color_mapping([tool.name for tool in agent.tools], excluded_colors=["green"])
+        intermediate_steps: List[Tuple[AgentAction, str]] = []
+        iterations = 0
+        start_time = time.time()
+        while agent._should_continue(iterations, time.time() - start_time):
+            limit = self._limit(budget, iterations)
+            if limit is not None:
+                return self._stop(limit, intermediate_steps), False
+            timeout = budget.remaining_time()
+            if timeout is not None:
+                timeout += self.timeout_grace / (budget.depth + 1)
+            try:
+                next_step_output = await asyncio.wait_for(
+                    agent._atake_next_step(
+                        name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager=run_manager),
+                    timeout,
+                )
+            except asyncio.TimeoutError:
+                return self._stop(TIMEOUT, intermediate_steps), False
+            finish = self._finish(next_step_output, intermediate_steps)
+            if finish is not None:
+                return await agent._areturn(finish, intermediate_steps, run_manager=run_manager), True
+            iterations += 1
+        output = agent.agent.return_stopped_response(agent.early_stopping_method, intermediate_steps, **inputs)
+        return await agent._areturn(output, intermediate_steps, run_manager=run_manager), True
+
+    def _limit(self, budget: AgentBudget, iterations: int) -> Optional[str]:
+        if self.max_iterations is not None and iterations >= self.max_iterations:
+            return ITERATIONS
+        return budget.exceeded()
+
+    def _finish(
+        self,
+        next_step_output: Union[AgentFinish, List[Tuple[AgentAction, str]]],
+        intermediate_steps: List[Tuple[AgentAction, str]],
+    ) -> Optional[AgentFinish]:
+        """Adds the steps, returns the finish of the agent if it is done."""
+        if isinstance(next_step_output, AgentFinish):
+            return next_step_output
+        intermediate_steps.extend(next_step_output)
+        if len(next_step_output) == 1:
+            # See if tool should return directly
+            return self.agent._get_tool_return(next_step_output[0])
+        return None
+
+    def _stop(self, limit: str, intermediate_steps: List[Tuple[AgentAction, str]]) -> Dict[str, Any]:
+        """The outputs of a run stopped by a limit, with the last observation as partial result."""
+        self._stats.record_limit(limit)
+        self._count("agent_tool_limits_total", limit=limit)
+        observation = str(intermediate_steps[-1][1]) if intermediate_steps else "none"
+        partial_result = (
+            f"Agent stopped by the {limit} limit after {len(intermediate_steps)} steps. "
+            f"Partial result: {observation}"
+        )
+        if not self.partial_results:
+            raise AgentLimitExceeded(limit, partial_result)
+        self._stats.partial_results += 1
+        return {self.output_key: partial_result}
@@ -0,0 +1,141 @@
+"""Deadlines and token budgets of AgentAsTool calls, enforced across nested agents.
+
+The budget of the running call is kept in a context variable, so an
+AgentAsTool called by the agent of another AgentAsTool is bound by the time
+left and the tokens left of the outer call, and stops when the outer call is
+cancelled. Tokens are counted by a callback handler, as the handlers are
+inherited by the nested runs the outer handler also counts their tokens.
+"""
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+from uuid import UUID
+
+from langchain.callbacks.base import AsyncCallbackHandler, BaseCallbackHandler
+from langchain.schema import LLMResult
+
+TIMEOUT = "timeout"
+ITERATIONS = "iterations"
+TOKENS = "tokens"
+CANCELLED = "cancelled"
+
+
+class AgentLimitExceeded(RuntimeError):
+    """Raised by AgentAsTool when a limit is reached and partial results are disabled."""
+
+    def __init__(self, limit: str, partial_result: str):
+        super().__init__(f"Agent stopped by the {limit} limit")
+        self.limit = limit
+        self.partial_result = partial_result
+
+
+def approximate_tokens(text: str) -> int:
+    """About 4 characters per token, for LLMs that don't report their token usage."""
+    return (len(text) + 3) // 4
+
+
+class AgentBudget:
+    """Deadline and token budget of a call, bound by the budgets of the calls it runs in."""
+
+    def __init__(
+        self,
+        timeout: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        parent: Optional["AgentBudget"] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.parent = parent
+        self.deadline = clock() + timeout if timeout is not None else None
+        self.max_tokens = max_tokens
+        self.tokens = 0
+        """Tokens spent by the call, including nested calls."""
+        self._cancelled = threading.Event()
+        self._clock = clock
+
+    def _chain(self) -> List["AgentBudget"]:
+        budgets = []
+        budget: Optional[AgentBudget] = self
+        while budget is not None:
+            budgets.append(budget)
+            budget = budget.parent
+        return budgets
+
+    @property
+    def depth(self) -> int:
+        """Number of calls this call runs in."""
+        return len(self._chain()) - 1
+
+    def spend(self, tokens: int) -> None:
+        self.tokens += tokens
+
+    def cancel(self) -> None:
+        """Stops the call and its nested calls at their next step."""
+        self._cancelled.set()
+
+    def remaining_time(self) -> Optional[float]:
+        """Seconds left until the nearest deadline, None if there is none."""
+        deadlines = [budget.deadline for budget in self._chain() if budget.deadline is not None]
+        return max(min(deadlines) - self._clock(), 0.0) if deadlines else None
+
+    def exceeded(self) -> Optional[str]:
+        """The limit reached by this call or any of the calls it runs in, None if none."""
+        now = self._clock()
+        for budget in self._chain():
+            if budget._cancelled.is_set():
+                return CANCELLED
+            if budget.deadline is not None and now >= budget.deadline:
+                return TIMEOUT
+            if budget.max_tokens is not None and budget.tokens >= budget.max_tokens:
+                return TOKENS
+        return None
+
+
+CURRENT_BUDGET: ContextVar[Optional[AgentBudget]] = ContextVar("agent_budget", default=None)
+
+
+class TokenUsageHandler(BaseCallbackHandler):
+    """
+    Adds the tokens of the LLM calls to a budget, the reported token usage
+    when available, else the prompts and generations measured with length_function.
+    """
+
+    def __init__(self, budget: AgentBudget, length_function: Callable[[str], int] = approximate_tokens):
+        self.budget = budget
+        self.length_function = length_function
+        self._prompt_tokens: Dict[UUID, int] = {}
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID, **kwargs: Any) -> None:
+        self._prompt_tokens[run_id] = sum(self.length_function(prompt) for prompt in prompts)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        prompt_tokens = self._prompt_tokens.pop(run_id, 0)
+        total = ((response.llm_output or {}).get("token_usage") or {}).get("total_tokens")
+        if total is None:
+            total = prompt_tokens + sum(
+                self.length_function(generation.text)
+                for generations in response.generations for generation in generations
+            )
+        self.budget.spend(total)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._prompt_tokens.pop(run_id, None)
+
+
+class AsyncTokenUsageHandler(AsyncCallbackHandler):
+    """
+    TokenUsageHandler for async runs, the async callback manager awaits its
+    events instead of running each of them in an executor.
+    """
+
+    def __init__(self, budget: AgentBudget, length_function: Callable[[str], int] = approximate_tokens):
+        self._handler = TokenUsageHandler(budget, length_function)
+
+    async def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID, **kwargs: Any) -> None:
+        self._handler.on_llm_start(serialized, prompts, run_id=run_id, **kwargs)
+
+    async def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        self._handler.on_llm_end(response, run_id=run_id, **kwargs)
+
+    async def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._handler.on_llm_error(error, run_id=run_id, **kwargs)
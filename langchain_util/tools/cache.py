@@ -0,0 +1,88 @@
+"""Bounded TTL cache of the results of AgentAsTool.
+
+Results are keyed on the tool name and the normalized query, so queries
+differing only in case or whitespace share a result.
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Optional, Tuple
+
+from langchain_util.text import normalize_text
+
+
+@dataclass
+class ToolCacheStats:
+    """Counters collected by a tool result cache."""
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    """Entries found older than the ttl."""
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def reset(self) -> None:
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+
+class ToolResultCache:
+    """Thread safe in memory LRU cache of tool results, with an optional time to live."""
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: Optional[float] = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            max_entries: Maximum number of results, least recently used results are evicted.
+            ttl: Seconds a result is valid for, results never expire if None.
+        """
+        if max_entries < 1:
+            raise ValueError(f"max_entries must be 1 or greater, got {max_entries}")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stats = ToolCacheStats()
+        self._clock = clock
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(tool: str, query: str) -> Tuple[str, str]:
+        return tool, normalize_text(query)
+
+    def get(self, key: Tuple[str, str]) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and self._clock() - entry[1] > self.ttl:
+                del self._entries[key]
+                self.stats.expirations += 1
+                entry = None
+            if entry is None:
+                self.stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return entry[0]
+
+    def put(self, key: Tuple[str, str], result: str) -> None:
+        with self._lock:
+            self._entries[key] = (result, self._clock())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -1,8 +1,15 @@
+import asyncio
+import time
 import unittest
 from typing import List
 from unittest.mock import Mock
+import pytest
+from langchain.callbacks.base import BaseCallbackHandler
 from langchain.chains.base import Chain
+from langchain.chains.llm import LLMChain
+from langchain.prompts import PromptTemplate
 from langchain_util.chains import ConcatenateChain
+from tests.chains.test_sentiment_streaming import FakeStreamingLLM
 
 class TestConcatenateChain(unittest.TestCase):
     def test_concatenate_chain(self):
@@ -47,3 +54,163 @@ class TestConcatenateChain(unittest.TestCase):
 
         result = concatenate_chain.run({"input_key1": "value1", "input_key2": "value2"})
         assert result == "output_key1: value1 output_key2: value2"
+
+
+class SyncSleepChain(Chain):
+    """Returns its name after a delay."""
+    name: str
+    delay: float = 0.1
+
+    @property
+    def input_keys(self) -> List[str]:
+        return ["topic"]
+
+    @property
+    def output_keys(self) -> List[str]:
+        return [self.name]
+
+    def _call(self, inputs):
+        time.sleep(self.delay)
+        return {self.name: f"{self.name} of {inputs['topic']}"}
+
+
+class SleepChain(SyncSleepChain):
+
+    async def _acall(self, inputs, run_manager=None):
+        await asyncio.sleep(self.delay)
+        return {self.name: f"{self.name} of {inputs['topic']}"}
+
+
+class TestConcatenateChainFanOut(unittest.TestCase):
+
+    def chain(self, **kwargs):
+        return ConcatenateChain(
+            input_chains=[SleepChain(name="summary", delay=0.2), SleepChain(name="title", delay=0.1),
+                          SyncSleepChain(name="tags", delay=0.15)],
+            output_key="output",
+            **kwargs
+        )
+
+    def test_validation(self):
+        with pytest.raises(ValueError, match="Exactly one of input_chain or input_chains"):
+            ConcatenateChain(keys=None, output_key="output")
+        with pytest.raises(ValueError, match="Exactly one of input_chain or input_chains"):
+            ConcatenateChain(input_chain=SleepChain(name="a"), input_chains=[SleepChain(name="b")],
+                             keys=None, output_key="output")
+
+    def test_call_runs_chains_concurrently(self):
+        chain = self.chain(keys=None)
+        assert chain.input_keys == ["topic"]
+        start = time.perf_counter()
+        result = chain.run(topic="cats")
+        elapsed = time.perf_counter() - start
+        assert result == "summary: summary of cats title: title of cats tags: tags of cats"
+        assert elapsed < 0.35
+
+    def test_acall_runs_chains_concurrently(self):
+        chain = self.chain(keys=["tags", "summary"])
+        start = time.perf_counter()
+        result = asyncio.run(chain.arun(topic="cats"))
+        elapsed = time.perf_counter() - start
+        assert result == "tags: tags of cats summary: summary of cats"
+        assert elapsed < 0.35
+
+    def test_acall_single_sync_chain(self):
+        chain = ConcatenateChain(input_chain=SyncSleepChain(name="summary"),
+                                 keys=None, output_key="output")
+
+        async def run():
+            ticks = 0
+
+            async def tick():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            ticker = asyncio.ensure_future(tick())
+            result = await chain.arun(topic="dogs")
+            ticker.cancel()
+            return result, ticks
+
+        result, ticks = asyncio.run(run())
+        assert result == "summary: summary of dogs"
+        assert ticks > 3
+
+
+class TextCollector(BaseCallbackHandler):
+
+    def __init__(self):
+        self.texts = []
+
+    def on_text(self, text, **kwargs):
+        self.texts.append((text, time.perf_counter()))
+
+
+class TestConcatenateChainStreaming(unittest.TestCase):
+
+    def chain(self, **kwargs):
+        return ConcatenateChain(
+            input_chains=[SleepChain(name="title", delay=0.05), SyncSleepChain(name="summary", delay=0.3)],
+            output_key="output",
+            **kwargs
+        )
+
+    def test_astream_segments(self):
+        chain = self.chain(keys=None)
+
+        async def collect():
+            start = time.perf_counter()
+            return [(chunk, time.perf_counter() - start) async for chunk in chain.astream({"topic": "cats"})]
+
+        chunks = asyncio.run(collect())
+        assert [chunk.text for chunk, _ in chunks] == ["title: title of cats", "summary: summary of cats"]
+        assert " ".join(chunk.text for chunk, _ in chunks) == chain.run(topic="cats")
+        assert chunks[0][1] < 0.2
+        assert not any(chunk.is_token for chunk, _ in chunks)
+
+    def test_astream_tokens(self):
+        response = "A long summary of cats"
+        llm_chain = LLMChain(llm=FakeStreamingLLM(responses=[response], token_latency=0.01),
+                             prompt=PromptTemplate.from_template("Summarize {topic}"), output_key="summary")
+        chain = ConcatenateChain(input_chains=[SleepChain(name="title", delay=0.3), llm_chain],
+                                 keys=["summary", "title"], output_key="output")
+
+        async def collect():
+            return [chunk async for chunk in chain.astream({"topic": "cats"}, tokens=True)]
+
+        chunks = asyncio.run(collect())
+        tokens = [chunk.text for chunk in chunks if chunk.is_token]
+        assert "".join(tokens) == response
+        assert all(chunk.key == "summary" for chunk in chunks[:len(tokens)])
+        assert [chunk.text for chunk in chunks if not chunk.is_token] == [
+            f"summary: {response}", "title: title of cats"]
+
+    def test_astream_tokens_of_later_chain(self):
+        response = "A long summary of cats"
+        for keys, segments in ((["title", "summary"], ["title: title of cats", f"summary: {response}"]),
+                               (["title", "other"], ["title: title of cats", "other: value"])):
+            llm_chain = LLMChain(llm=FakeStreamingLLM(responses=[response], token_latency=0.01),
+                                 prompt=PromptTemplate.from_template("Summarize {topic}"), output_key="summary")
+            chain = ConcatenateChain(input_chains=[SleepChain(name="title", delay=0.3), llm_chain],
+                                     keys=keys, output_key="output")
+
+            async def collect():
+                return [chunk async for chunk in chain.astream({"topic": "cats", "other": "value"},
+                                                               tokens=True)]
+
+            chunks = asyncio.run(collect())
+            assert "".join(chunk.text for chunk in chunks if chunk.is_token) == response
+            assert [chunk.text for chunk in chunks if not chunk.is_token] == segments
+
+    def test_on_text_callbacks(self):
+        chain = self.chain(keys=["title", "summary"], streaming=True)
+        for call in (lambda collector: chain.run(topic="dogs", callbacks=[collector]),
+                     lambda collector: asyncio.run(chain.arun(topic="dogs", callbacks=[collector]))):
+            collector = TextCollector()
+            start = time.perf_counter()
+            result = call(collector)
+            end = time.perf_counter()
+            assert [text for text, _ in collector.texts] == ["title: title of dogs", "summary: summary of dogs"]
+            assert result == "title: title of dogs summary: summary of dogs"
+            assert collector.texts[0][1] - start < 0.2 < end - start
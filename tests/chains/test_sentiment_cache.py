@@ -0,0 +1,153 @@
+import asyncio
+import os
+import pickle
+import tempfile
+import unittest
+import pytest
+from langchain.docstore.document import Document
+from langchain.llms.fake import FakeListLLM
+from langchain_util.chains import SentimentChain
+from langchain_util.chains.sentiment.cache import (
+    InMemorySentimentCache, SQLiteSentimentCache, normalize_statement, simhash
+)
+from tests.chains.test_sentiment_chain import FakeAsyncLLM, batch_response, single_response, word_count
+
+REVIEW = "I absolutely love this new phone, the battery lasts forever and the screen is great"
+RETWEET = "RT @bob: I absolutely love this new phone, the battery lasts forever and the screen is great"
+OTHER = "The delivery was late and the box was damaged, very disappointed with the service"
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestSentimentCache(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._dir.name, "sentiment.db")
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def caches(self, **kwargs):
+        return [InMemorySentimentCache(**kwargs), SQLiteSentimentCache(self.path, **kwargs)]
+
+    def test_init_validations(self):
+        with pytest.raises(ValueError, match="max_entries must be 1 or greater, got 0"):
+            InMemorySentimentCache(max_entries=0)
+        with pytest.raises(ValueError, match="near_duplicate_distance must be between 0 and 15, got 16"):
+            InMemorySentimentCache(near_duplicate_distance=16)
+
+    def test_normalize_and_simhash(self):
+        assert normalize_statement("  I  LOVE\nit ") == "i love it"
+        assert simhash(normalize_statement(REVIEW)) == simhash(normalize_statement(REVIEW.upper()))
+        near = bin(simhash(normalize_statement(REVIEW)) ^ simhash(normalize_statement(RETWEET))).count("1")
+        far = bin(simhash(normalize_statement(REVIEW)) ^ simhash(normalize_statement(OTHER))).count("1")
+        assert near < far
+
+    def test_exact_lookup(self):
+        for cache in self.caches():
+            assert cache.lookup("ns", REVIEW) is None
+            cache.store("ns", REVIEW, {"sentiment": "1", "confidence": "9"})
+            assert cache.lookup("ns", "  " + REVIEW.upper()) == {"sentiment": "1", "confidence": "9"}
+            assert cache.lookup("other", REVIEW) is None
+            assert cache.lookup("ns", RETWEET) is None
+            assert cache.stats.exact_hits == 1
+            assert cache.stats.misses == 3
+            assert len(cache) == 1
+
+    def test_near_duplicate_lookup(self):
+        for cache in self.caches(near_duplicate_distance=8):
+            cache.store("ns", REVIEW, {"sentiment": "1", "confidence": "9"})
+            cache.store("ns", OTHER, {"sentiment": "-1", "confidence": "8"})
+            assert cache.lookup("ns", RETWEET) == {"sentiment": "1", "confidence": "9"}
+            assert cache.lookup("other", RETWEET) is None
+            assert cache.stats.near_hits == 1
+
+    def test_lru_eviction(self):
+        for cache in (InMemorySentimentCache(max_entries=2, near_duplicate_distance=3),
+                      SQLiteSentimentCache(self.path, max_entries=2, near_duplicate_distance=3,
+                                           evict_fraction=0.5)):
+            cache.store("ns", "a b c", {"sentiment": "1"})
+            cache.store("ns", "d e f", {"sentiment": "0"})
+            assert cache.lookup("ns", "a b c") is not None
+            cache.store("ns", "g h i", {"sentiment": "-1"})
+            assert cache.lookup("ns", "d e f") is None
+            assert cache.lookup("ns", "g h i") == {"sentiment": "-1"}
+            assert cache.stats.evictions >= 1
+
+    def test_ttl(self):
+        clock = FakeClock()
+        for cache in self.caches(ttl=10, near_duplicate_distance=8, clock=clock):
+            clock.now = 0
+            cache.store("ns", REVIEW, {"sentiment": "1"})
+            clock.now = 5
+            assert cache.lookup("ns", RETWEET) == {"sentiment": "1"}
+            clock.now = 11
+            assert cache.lookup("ns", REVIEW) is None
+            assert cache.stats.expirations == 1
+            assert len(cache) == 0
+
+    def test_persists_and_pickles(self):
+        cache = SQLiteSentimentCache(self.path, near_duplicate_distance=8)
+        cache.store("ns", REVIEW, {"sentiment": "1", "confidence": "9"})
+        cache.close()
+
+        restored = pickle.loads(pickle.dumps(SQLiteSentimentCache(self.path, near_duplicate_distance=8)))
+        assert restored.lookup("ns", RETWEET) == {"sentiment": "1", "confidence": "9"}
+
+        cache = InMemorySentimentCache()
+        cache.store("ns", REVIEW, {"sentiment": "1"})
+        assert pickle.loads(pickle.dumps(cache)).lookup("ns", REVIEW) == {"sentiment": "1"}
+
+
+class TestSentimentChainWithCache(unittest.TestCase):
+
+    def test_call_uses_cache(self):
+        llm = FakeListLLM(responses=[single_response(1, 9), single_response(-1, 8)])
+        cache = InMemorySentimentCache(near_duplicate_distance=8)
+        chain = SentimentChain.from_llm(llm, cache=cache)
+
+        for statement in (REVIEW, RETWEET, REVIEW.lower(), OTHER):
+            chain({"input_documents": [Document(page_content=statement)]})
+        result = chain({"input_documents": [Document(page_content=RETWEET)]}, return_only_outputs=True)
+
+        assert result == {"sentiment": "1", "confidence": "9"}
+        assert llm.i == 2
+        assert cache.stats.exact_hits == 1
+        assert cache.stats.near_hits == 2
+
+    def test_namespace_depends_on_model(self):
+        cache = InMemorySentimentCache()
+        chain = SentimentChain.from_llm(FakeListLLM(responses=[single_response(1, 9)]), cache=cache)
+        chain({"input_documents": [Document(page_content=REVIEW)]})
+        other = SentimentChain.from_llm(FakeListLLM(responses=[single_response(0, 5)]), cache=cache)
+        assert other.cache_namespace != chain.cache_namespace
+        result = other({"input_documents": [Document(page_content=REVIEW)]}, return_only_outputs=True)
+        assert result == {"sentiment": "0", "confidence": "5"}
+
+    def test_score_batch_and_map_reduce_use_cache(self):
+        cache = InMemorySentimentCache()
+        llm = FakeListLLM(responses=[batch_response((0, 1, 9), (1, -1, 8))])
+        chain = SentimentChain.from_llm(llm, cache=cache, batch_length_function=word_count)
+        groups = [[Document(page_content=REVIEW)], [Document(page_content=OTHER)]]
+        chain.score_batch(groups)
+        assert chain.score_batch(groups + groups) == [
+            {"sentiment": "1", "confidence": "9"}, {"sentiment": "-1", "confidence": "8"}] * 2
+        assert llm.i == 1
+
+        llm = FakeAsyncLLM(responses=[])
+        chain = SentimentChain.from_llm(llm, cache=cache, mode="map_reduce")
+        docs = [Document(page_content=f"statement {i % 2}") for i in range(6)]
+        asyncio.run(chain.acall({"input_documents": docs}))
+        assert llm.calls <= 6
+        asyncio.run(chain.acall({"input_documents": docs}))
+        calls = llm.calls
+        chain({"input_documents": docs})
+        assert llm.calls == calls
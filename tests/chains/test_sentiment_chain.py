@@ -0,0 +1,292 @@
+import asyncio
+import unittest
+from typing import List, Optional
+import pytest
+from langchain.callbacks.manager import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain.docstore.document import Document
+from langchain.llms.fake import FakeListLLM
+from langchain.schema import OutputParserException
+from langchain_util.chains import SentimentChain
+from langchain_util.chains.sentiment.cache import InMemorySentimentCache
+from langchain_util.chains.sentiment.parser import BATCH_PARSER
+from langchain_util.chains.sentiment.vote import SentimentVote
+from langchain_util.concurrency import BatchStats, RateLimiter, RetryPolicy
+from langchain_util.metrics import InMemoryMetricsSink
+
+
+def single_response(sentiment, confidence):
+    return f'```json\n{{"sentiment": "{sentiment}", "confidence": "{confidence}"}}\n```'
+
+
+def batch_response(*items):
+    objects = ", ".join(
+        f'{{"index": "{index}", "sentiment": "{sentiment}", "confidence": "{confidence}"}}'
+        for index, sentiment, confidence in items
+    )
+    return f"```json\n[{objects}]\n```"
+
+
+def word_count(text):
+    return len(text.split())
+
+
+class FakeAsyncLLM(FakeListLLM):
+    """
+    Answers with the sentiment and confidence given at the end of the statement,
+    after a delay, answers "flaky" statements with malformed output once.
+    """
+
+    latency: float = 0.01
+    in_flight: int = 0
+    max_in_flight: int = 0
+    calls: int = 0
+    failed: List[str] = []
+
+    def _call(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+    ) -> str:
+        self.calls += 1
+        return self._respond(prompt)
+
+    async def _acall(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+    ) -> str:
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.latency)
+        self.in_flight -= 1
+        return self._respond(prompt)
+
+    def _respond(self, prompt: str) -> str:
+        statement = prompt.split("STATEMENT:")[1].split("YOUR RESPONSE:")[0].strip()
+        if statement.startswith("flaky") and statement not in self.failed:
+            self.failed.append(statement)
+            return "not json"
+        words = statement.split()
+        if words[-1].startswith("conf="):
+            return single_response(words[-2], words[-1][len("conf="):])
+        return single_response(words[-1], 8)
+
+
+def vote_docs(*votes):
+    return [Document(page_content=f"statement {sentiment} conf={confidence}")
+            for sentiment, confidence in votes]
+
+
+class TestSentimentVote(unittest.TestCase):
+
+    def test_vote(self):
+        vote = SentimentVote()
+        assert vote.result() == {"sentiment": "0", "confidence": "0"}
+        for result in [
+            {"sentiment": "1", "confidence": "9"},
+            {"sentiment": "-1", "confidence": "6"},
+            {"sentiment": "1", "confidence": "6"},
+            {"sentiment": "positive", "confidence": "6"},
+        ]:
+            vote.add(result)
+        assert vote.votes == 3
+        assert vote.invalid == 1
+        assert vote.result() == {"sentiment": "1", "confidence": "5"}
+
+    def test_no_valid_results(self):
+        assert SentimentVote().result() == {"sentiment": "0", "confidence": "0"}
+        vote = SentimentVote()
+        vote.add({})
+        with pytest.raises(OutputParserException, match="None of the 1 results could be parsed"):
+            vote.result()
+
+    def test_tie_is_neutral(self):
+        vote = SentimentVote()
+        for sentiment in ("1", "0", "-1"):
+            vote.add({"sentiment": sentiment, "confidence": "5"})
+        assert vote.sentiment == 0
+
+
+class TestSentimentChain(unittest.TestCase):
+
+    def test_call(self):
+        chain = SentimentChain.from_llm(FakeListLLM(responses=[single_response(1, 9)]))
+        result = chain({"input_documents": [Document(page_content="I love it")]})
+        assert result["sentiment"] == "1"
+        assert result["confidence"] == "9"
+
+    def test_metrics(self):
+        sink = InMemoryMetricsSink()
+        chain = SentimentChain.from_llm(
+            FakeListLLM(responses=[single_response(1, 9), "no json"]), metrics=sink)
+        chain({"input_documents": [Document(page_content="I love it")]})
+        with pytest.raises(OutputParserException):
+            chain({"input_documents": [Document(page_content="I hate it")]})
+        assert sink.counter("sentiment_parses_total", outcome="success") == 1
+        assert sink.counter("sentiment_parses_total", outcome="failure") == 1
+        assert sink.counter("sentiment_routes_total", route="llm") == 2
+        assert len(sink.values("llm_seconds", component="sentiment")) == 2
+        assert len(sink.values("stage_seconds", stage="call")) == 2
+
+    def test_batch_parser(self):
+        assert BATCH_PARSER.parse(batch_response((1, -1, 7), ("[0]", 1, 9))) == [
+            {"index": 1, "sentiment": "-1", "confidence": "7"},
+            {"index": 0, "sentiment": "1", "confidence": "9"},
+        ]
+        with pytest.raises(OutputParserException, match="Expected a list"):
+            BATCH_PARSER.parse('```json\n{"index": "0"}\n```')
+        with pytest.raises(OutputParserException, match="Got invalid index"):
+            BATCH_PARSER.parse('```json\n[{"index": "a", "sentiment": "1", "confidence": "9"}]\n```')
+
+    def test_score_batch(self):
+        llm = FakeListLLM(responses=[
+            batch_response((0, 1, 9), (1, -1, 8)),
+            batch_response((0, 0, 5)),
+        ])
+        chain = SentimentChain.from_llm(llm, batch_max_items=2, batch_length_function=word_count)
+        results = chain.score_batch([
+            [Document(page_content="I love it")],
+            [Document(page_content="I hate it"), Document(page_content="Really")],
+            [Document(page_content="It is a chair")],
+        ])
+
+        assert results == [
+            {"sentiment": "1", "confidence": "9"},
+            {"sentiment": "-1", "confidence": "8"},
+            {"sentiment": "0", "confidence": "5"},
+        ]
+        assert llm.i == 2
+
+    def test_score_batch_splits_by_token_budget(self):
+        llm = FakeListLLM(responses=[
+            batch_response((0, 1, 9)),
+            batch_response((0, -1, 8), (1, 0, 5)),
+        ])
+        chain = SentimentChain.from_llm(llm, batch_max_tokens=8, batch_length_function=word_count)
+        results = chain.score_batch([
+            [Document(page_content="I love it so very much")],
+            [Document(page_content="Bad")],
+            [Document(page_content="Chair")],
+        ])
+
+        assert [result["sentiment"] for result in results] == ["1", "-1", "0"]
+        assert llm.i == 2
+
+    def test_score_batch_scores_missing_items_individually(self):
+        llm = FakeListLLM(responses=[
+            batch_response((1, -1, 8)),
+            single_response(1, 9),
+        ])
+        sink = InMemoryMetricsSink()
+        cache = InMemorySentimentCache()
+        chain = SentimentChain.from_llm(llm, batch_length_function=word_count, cache=cache, metrics=sink)
+        results = chain.score_batch([
+            [Document(page_content="I love it")],
+            [Document(page_content="I hate it")],
+        ])
+
+        assert results == [
+            {"sentiment": "1", "confidence": "9"},
+            {"sentiment": "-1", "confidence": "8"},
+        ]
+        # The missing item is looked up and routed once
+        assert chain.routing_stats.llm == 2
+        assert sink.counter("sentiment_routes_total", route="llm") == 2
+        assert cache.stats.misses == 2
+
+    def test_score_batch_requires_batch_chain(self):
+        chain = SentimentChain.from_llm(FakeListLLM(responses=[]))
+        chain.batch_llm_chain = None
+        with pytest.raises(ValueError, match="score_batch requires a batch_llm_chain"):
+            chain.score_batch([[Document(page_content="I love it")]])
+
+    def test_abatch(self):
+        llm = FakeAsyncLLM(responses=[])
+        chain = SentimentChain.from_llm(llm)
+        stats = BatchStats()
+        statements = [f"statement {i % 3 - 1}" for i in range(20)] + ["flaky 1"]
+        results = asyncio.run(chain.amap(
+            [[Document(page_content=statement)] for statement in statements],
+            max_concurrency=4,
+            retry_policy=RetryPolicy(initial_delay=0.001),
+            stats=stats,
+        ))
+
+        assert [result["sentiment"] for result in results] == [s.split()[-1] for s in statements]
+        assert llm.max_in_flight == 4
+        assert stats.completed == 21
+        assert stats.retries == 1
+        assert stats.percentiles()["p50"] >= 0.01
+
+    def test_abatch_with_rate_limiter(self):
+        llm = FakeAsyncLLM(responses=[], latency=0)
+        chain = SentimentChain.from_llm(llm, batch_length_function=word_count)
+        limiter = RateLimiter(requests_per_minute=6000, tokens_per_minute=60000)
+        limiter._requests = 0
+        stats = BatchStats()
+        results = asyncio.run(chain.abatch(
+            [{"input_documents": [Document(page_content="good 1")]}] * 3,
+            rate_limiter=limiter, stats=stats))
+
+        assert len(results) == 3
+        assert stats.elapsed >= 0.03
+
+    def test_abatch_return_exceptions(self):
+        llm = FakeAsyncLLM(responses=[], latency=0)
+        chain = SentimentChain.from_llm(llm)
+        results = asyncio.run(chain.amap(
+            [[Document(page_content="flaky 1")], [Document(page_content="good 1")]],
+            retry_policy=RetryPolicy(max_retries=0),
+            return_exceptions=True,
+        ))
+
+        assert isinstance(results[0], OutputParserException)
+        assert results[1] == {"sentiment": "1", "confidence": "8"}
+
+    def test_map_reduce(self):
+        llm = FakeAsyncLLM(responses=[])
+        chain = SentimentChain.from_llm(llm, mode="map_reduce", map_max_concurrency=2)
+        docs = vote_docs((1, 9), (-1, 6), (1, 6)) + [Document(page_content="flaky 1")]
+        result = chain({"input_documents": docs})
+
+        assert result["sentiment"] == "1"
+        assert result["confidence"] == "5"
+        assert llm.calls == 4
+
+        llm = FakeAsyncLLM(responses=[])
+        chain = SentimentChain.from_llm(llm, mode="map_reduce", map_max_concurrency=2)
+        result = asyncio.run(chain.acall({"input_documents": docs}))
+        assert result["sentiment"] == "1"
+        assert result["confidence"] == "5"
+        assert llm.max_in_flight == 2
+
+    def test_map_reduce_without_valid_results(self):
+        docs = [Document(page_content=f"flaky {i}") for i in range(3)]
+        chain = SentimentChain.from_llm(FakeAsyncLLM(responses=[]), mode="map_reduce")
+        with pytest.raises(OutputParserException, match="None of the 3 results could be parsed"):
+            chain({"input_documents": docs})
+
+        chain = SentimentChain.from_llm(FakeAsyncLLM(responses=[]), mode="map_reduce")
+        with pytest.raises(OutputParserException, match="None of the 3 results could be parsed"):
+            asyncio.run(chain.acall({"input_documents": docs}))
+
+    def test_map_reduce_early_exit(self):
+        docs = vote_docs(*[(1, 9)] * 20)
+        llm = FakeAsyncLLM(responses=[])
+        chain = SentimentChain.from_llm(
+            llm, mode="map_reduce", map_max_concurrency=1,
+            early_exit_confidence=8, early_exit_min_documents=3)
+        assert chain({"input_documents": docs}, return_only_outputs=True) == {
+            "sentiment": "1", "confidence": "9"}
+        assert llm.calls == 3
+
+        llm = FakeAsyncLLM(responses=[], latency=0)
+        chain = SentimentChain.from_llm(
+            llm, mode="map_reduce", map_max_concurrency=2,
+            early_exit_confidence=7, early_exit_min_documents=4)
+        docs = vote_docs((1, 9), (-1, 9), (1, 9), (1, 9), (1, 9), (1, 9), (1, 9), (1, 9))
+        assert asyncio.run(chain.acall({"input_documents": docs}))["sentiment"] == "1"
+        assert llm.calls < len(docs)
@@ -0,0 +1,107 @@
+import asyncio
+import pickle
+import random
+import unittest
+import pytest
+from langchain.docstore.document import Document
+from langchain.llms.fake import FakeListLLM
+from langchain_util.chains import SentimentChain
+from langchain_util.chains.sentiment.cache import InMemorySentimentCache
+from langchain_util.chains.sentiment.local import (
+    HashedLogisticSentimentScorer, LexiconSentimentScorer, SentimentRoutingStats
+)
+from tests.chains.test_sentiment_chain import FakeAsyncLLM, batch_response, single_response, word_count
+
+POSITIVE = ["I love this phone", "Amazing service, really fast", "Excellent quality, would buy again"]
+NEGATIVE = ["I hate this phone", "Terrible service, really slow", "Awful quality, would never buy again"]
+NEUTRAL = ["The phone arrived on Tuesday", "The service opens at nine", "The box contains a charger"]
+
+
+def labeled(n=300):
+    rng = random.Random(0)
+    data = [(text, s) for texts, s in ((POSITIVE, 1), (NEGATIVE, -1), (NEUTRAL, 0)) for text in texts]
+    return [rng.choice(data) for _ in range(n)]
+
+
+class TestLexiconSentimentScorer(unittest.TestCase):
+
+    def test_score(self):
+        scorer = LexiconSentimentScorer()
+        assert scorer.score("I absolutely love it, the screen is amazing") == {
+            "sentiment": "1", "confidence": "8.6"}
+        assert scorer.score("I hate it, worst purchase ever")["sentiment"] == "-1"
+        assert scorer.score("The phone is blue") == {"sentiment": "0", "confidence": "0"}
+
+    def test_negation_and_but(self):
+        scorer = LexiconSentimentScorer()
+        assert scorer.score("This is not good")["sentiment"] == "-1"
+        assert scorer.score("I don't hate it")["sentiment"] == "1"
+        assert scorer.polarities("good but terrible") == [0.5, -2.0]
+
+    def test_custom_lexicon(self):
+        scorer = LexiconSentimentScorer(lexicon={"fire": 2.0}, smoothing=0.5)
+        assert scorer.score("this track is fire") == {"sentiment": "1", "confidence": "8"}
+        with pytest.raises(ValueError, match="smoothing must be greater than 0, got 0"):
+            LexiconSentimentScorer(smoothing=0)
+
+
+class TestHashedLogisticSentimentScorer(unittest.TestCase):
+
+    def test_fit_and_score(self):
+        data = labeled()
+        scorer = HashedLogisticSentimentScorer(n_features=2 ** 12).fit(
+            [text for text, _ in data], [str(s) for _, s in data])
+        results = scorer.score_many(POSITIVE + NEGATIVE + NEUTRAL)
+        assert [r["sentiment"] for r in results] == ["1"] * 3 + ["-1"] * 3 + ["0"] * 3
+        assert all(float(r["confidence"]) > 8 for r in results)
+        probabilities = scorer.predict_proba(["I love this phone"])
+        assert probabilities.shape == (1, 3)
+        assert probabilities.sum() == pytest.approx(1)
+        assert scorer.score_many([]) == []
+
+        restored = pickle.loads(pickle.dumps(scorer))
+        assert restored.score("I hate this phone") == scorer.score("I hate this phone")
+
+    def test_untrained_has_no_confidence(self):
+        assert HashedLogisticSentimentScorer(n_features=16).score("anything")["confidence"] == "3.3"
+
+
+class TestSentimentChainTiers(unittest.TestCase):
+
+    def test_call_escalates_low_confidence(self):
+        llm = FakeListLLM(responses=[single_response(-1, 9)])
+        chain = SentimentChain.from_llm(llm, local_scorer=LexiconSentimentScorer(),
+                                        local_confidence_threshold=7)
+        result = chain({"input_documents": [Document(page_content="I absolutely love it")]},
+                       return_only_outputs=True)
+        assert result == {"sentiment": "1", "confidence": "8"}
+        result = chain({"input_documents": [Document(page_content="Good camera but late")]},
+                       return_only_outputs=True)
+        assert result == {"sentiment": "-1", "confidence": "9"}
+        assert llm.i == 1
+        assert chain.routing_stats == SentimentRoutingStats(cache=0, local=1, llm=1)
+        assert chain.routing_stats.escalation_rate == 0.5
+
+    def test_tiers_with_cache_batch_and_map_reduce(self):
+        cache = InMemorySentimentCache()
+        llm = FakeListLLM(responses=[batch_response((0, 0, 7))])
+        chain = SentimentChain.from_llm(llm, cache=cache, local_scorer=LexiconSentimentScorer(),
+                                        batch_length_function=word_count)
+        groups = [[Document(page_content="I absolutely love it")], [Document(page_content="It is blue")]]
+        assert chain.score_batch(groups) == [
+            {"sentiment": "1", "confidence": "8"}, {"sentiment": "0", "confidence": "7"}]
+        chain.score_batch(groups)
+        stats = chain.routing_stats
+        assert (stats.cache, stats.local, stats.llm) == (1, 2, 1)
+        assert stats.total == 4
+        assert stats.local_rate == 0.5
+        stats.reset()
+        assert stats.total == 0
+
+        llm = FakeAsyncLLM(responses=[])
+        chain = SentimentChain.from_llm(llm, mode="map_reduce", local_scorer=LexiconSentimentScorer())
+        docs = [Document(page_content="absolutely amazing, love it")] * 4 + [Document(page_content="meh 1")]
+        result = asyncio.run(chain.acall({"input_documents": docs}, return_only_outputs=True))
+        assert result["sentiment"] == "1"
+        assert llm.calls == 1
+        assert chain.routing_stats.local == 4
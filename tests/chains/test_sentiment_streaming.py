@@ -0,0 +1,131 @@
+import asyncio
+import re
+import time
+import unittest
+from typing import List, Optional
+import pytest
+from langchain.callbacks.manager import AsyncCallbackManagerForLLMRun
+from langchain.docstore.document import Document
+from langchain.llms.fake import FakeListLLM
+from langchain.schema import OutputParserException
+from langchain_util.chains import SentimentChain
+from langchain_util.chains.sentiment.streaming_parser import (
+    TOLERANT_PARSER, StreamingSentimentParser, extract_sentiment
+)
+from tests.chains.test_sentiment_chain import single_response
+
+
+def tokenize(text):
+    return re.findall(r"\w+|\s+|[^\w\s]", text)
+
+
+class FakeStreamingLLM(FakeListLLM):
+    """Streams the tokens of its responses with a delay per token."""
+
+    stream: bool = True
+    token_latency: float = 0.01
+    streamed: int = 0
+    cancelled: int = 0
+
+    async def _acall(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+    ) -> str:
+        response = self._call(prompt, stop)
+        if not self.stream:
+            return response
+        try:
+            for token in tokenize(response):
+                await asyncio.sleep(self.token_latency)
+                self.streamed += 1
+                if run_manager:
+                    await run_manager.on_llm_new_token(token)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return response
+
+
+class TestTolerantParser(unittest.TestCase):
+
+    def test_parse_variants(self):
+        for text, expected in [
+            (single_response(1, 9), {"sentiment": "1", "confidence": "9"}),
+            ('{"sentiment": "-1", "confidence": "7"}', {"sentiment": "-1", "confidence": "7"}),
+            ("{'sentiment': 0, 'confidence': 0.6,}", {"sentiment": "0", "confidence": "0.6"}),
+            ("{sentiment: 1, confidence: 8}", {"sentiment": "1", "confidence": "8"}),
+            ("Sentiment: Positive\nConfidence: 8/10", {"sentiment": "1", "confidence": "8"}),
+            ("The sentiment is negative with confidence 9.", {"sentiment": "-1", "confidence": "9"}),
+            ('Sure! Here it is:\n{"sentiment": "+1", "confidence": "8"}\nThe author is happy.',
+             {"sentiment": "1", "confidence": "8"}),
+        ]:
+            assert TOLERANT_PARSER.parse(text) == expected, text
+
+    def test_parse_failure(self):
+        with pytest.raises(OutputParserException, match="Expected sentiment and confidence"):
+            TOLERANT_PARSER.parse('{"sentiment": "1"}')
+
+    def test_value_at_end_is_not_final_while_streaming(self):
+        assert extract_sentiment('{"sentiment": "1", "confidence": "1', final=False) is None
+        assert extract_sentiment('sentiment: 1, confidence: 0.', final=False) is None
+        assert extract_sentiment('sentiment: 1, confidence: 0.8', final=True) == {
+            "sentiment": "1", "confidence": "0.8"}
+
+
+class TestStreamingSentimentParser(unittest.TestCase):
+
+    def test_feed(self):
+        parser = StreamingSentimentParser()
+        tokens = tokenize('{"sentiment": "1", "confidence": "0.8"}\nBecause the author loves it.')
+        results = [parser.feed(token) for token in tokens]
+        first = next(i for i, result in enumerate(results) if result is not None)
+        assert results[first] == {"sentiment": "1", "confidence": "0.8"}
+        assert tokens[first] == '"'
+        assert parser.tokens_to_result == first + 1
+
+    def test_finish(self):
+        parser = StreamingSentimentParser()
+        for token in tokenize("sentiment: neutral, confidence: 5"):
+            parser.feed(token)
+        assert parser.result is None
+        assert parser.finish() == {"sentiment": "0", "confidence": "5"}
+
+
+class TestSentimentChainStreaming(unittest.TestCase):
+
+    def test_acall_ends_stream_once_parsed(self):
+        response = single_response(-1, 8) + "\nThe author is disappointed with the delivery." * 10
+        llm = FakeStreamingLLM(responses=[response])
+        chain = SentimentChain.from_llm(llm, streaming=True)
+
+        start = time.perf_counter()
+        result = asyncio.run(chain.acall({"input_documents": [Document(page_content="late")]},
+                                         return_only_outputs=True))
+        elapsed = time.perf_counter() - start
+
+        assert result == {"sentiment": "-1", "confidence": "8"}
+        assert llm.cancelled == 1
+        assert llm.streamed < len(tokenize(response)) / 5
+        assert elapsed < len(tokenize(response)) * llm.token_latency / 2
+
+    def test_acall_parses_full_output_without_stream(self):
+        llm = FakeStreamingLLM(responses=["Sentiment: positive. Confidence: 7"], stream=False)
+        chain = SentimentChain.from_llm(llm, streaming=True)
+        result = asyncio.run(chain.acall({"input_documents": [Document(page_content="nice")]},
+                                         return_only_outputs=True))
+        assert result == {"sentiment": "1", "confidence": "7"}
+
+    def test_call_and_map_reduce(self):
+        chain = SentimentChain.from_llm(
+            FakeListLLM(responses=["{'sentiment': 1, 'confidence': 9,}"]), streaming=True)
+        assert chain({"input_documents": [Document(page_content="great")]},
+                     return_only_outputs=True) == {"sentiment": "1", "confidence": "9"}
+
+        llm = FakeStreamingLLM(responses=[single_response(1, 9) + " because it is great" * 5] * 3)
+        chain = SentimentChain.from_llm(llm, streaming=True, mode="map_reduce")
+        docs = [Document(page_content=f"statement {i}") for i in range(3)]
+        result = asyncio.run(chain.acall({"input_documents": docs}, return_only_outputs=True))
+        assert result == {"sentiment": "1", "confidence": "9"}
+        assert llm.cancelled == 3
@@ -0,0 +1,173 @@
+import functools
+import os
+import pickle
+import tempfile
+import unittest
+import pytest
+from langchain.docstore.document import Document
+from langchain_util.chunk_cache import InMemoryChunkCache, SQLiteChunkCache, chunk_cache_key
+from langchain_util.text_splitter import RecursiveCharacterTextSplitterWithContext
+from tests.test_text_splitter import TEXT_TO_SPLIT_1
+
+
+def _docs():
+    return [
+        Document(page_content=TEXT_TO_SPLIT_1, metadata={"chunk-context": "Title", "document": 1}),
+        Document(page_content=TEXT_TO_SPLIT_1, metadata={"chunk-context": "Other", "document": 2}),
+    ]
+
+
+def _splitter(**kwargs):
+    return RecursiveCharacterTextSplitterWithContext(
+        chunk_size=17, chunk_overlap=1, context_perc_of_chunk_size=53, **kwargs)
+
+
+class TestChunkCache(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._dir.name, "chunks.db")
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def test_init_validations(self):
+        with pytest.raises(ValueError, match="max_entries must be 1 or greater, got 0"):
+            InMemoryChunkCache(max_entries=0)
+        with pytest.raises(ValueError, match=r"evict_fraction must be in \(0, 1\], got 0"):
+            SQLiteChunkCache(self.path, evict_fraction=0)
+
+    def test_cache_key(self):
+        assert chunk_cache_key("config", "text", "context") == chunk_cache_key("config", "text", "context")
+        assert chunk_cache_key("config", "text", "") != chunk_cache_key("config", "", "text")
+
+    def test_round_trip(self):
+        for cache in (InMemoryChunkCache(), SQLiteChunkCache(self.path)):
+            assert cache.get("key") is None
+            cache.put("key", "config", [(0, 5), (4, 12)])
+            assert cache.get("key") == [(0, 5), (4, 12)]
+            assert len(cache) == 1
+            assert cache.stats.hits == 1
+            assert cache.stats.misses == 1
+            cache.clear()
+            assert len(cache) == 0
+
+    def test_evicts_least_recently_used(self):
+        cache = InMemoryChunkCache(max_entries=2)
+        cache.put("a", "config", [(0, 1)])
+        cache.put("b", "config", [(0, 1)])
+        cache.get("a")
+        cache.put("c", "config", [(0, 1)])
+        assert cache.get("b") is None
+        assert cache.get("a") == [(0, 1)]
+        assert cache.stats.evictions == 1
+
+        cache = SQLiteChunkCache(self.path, max_entries=10, evict_fraction=0.5)
+        for i in range(11):
+            cache.put(str(i), "config", [(0, i)])
+        assert len(cache) == 5
+        assert cache.stats.evictions == 6
+        assert cache.get("10") == [(0, 10)]
+
+    def test_persists_between_instances(self):
+        cache = SQLiteChunkCache(self.path)
+        cache.put("key", "config", [(0, 5)])
+        cache.close()
+
+        cache = SQLiteChunkCache(self.path)
+        assert len(cache) == 1
+        assert cache.get("key") == [(0, 5)]
+
+    def test_pickle(self):
+        for cache in (InMemoryChunkCache(), SQLiteChunkCache(self.path)):
+            cache.put("key", "config", [(0, 5)])
+            restored = pickle.loads(pickle.dumps(cache))
+            assert restored.get("key") == [(0, 5)]
+
+    def test_splitter_with_chunk_cache(self):
+        expected = _splitter().split_documents(_docs())
+        for cache in (InMemoryChunkCache(), SQLiteChunkCache(self.path)):
+            splitter = _splitter(chunk_cache=cache)
+            assert splitter.split_documents(_docs()) == expected
+            assert cache.stats.misses == 2
+            assert splitter.split_documents(_docs()) == expected
+            assert cache.stats.hits == 2
+            assert len(cache) == 2
+
+    def test_splitter_with_chunk_cache_and_start_index(self):
+        expected = _splitter(add_start_index=True).split_documents(_docs())
+        cache = InMemoryChunkCache()
+        splitter = _splitter(add_start_index=True, chunk_cache=cache)
+        assert splitter.split_documents(_docs()) == expected
+        assert splitter.split_documents(_docs()) == expected
+        assert cache.stats.hits == 2
+
+    def test_config_change_invalidates_entries(self):
+        cache = SQLiteChunkCache(self.path)
+        _splitter(chunk_cache=cache).split_documents(_docs())
+        assert len(cache) == 2
+
+        splitter = RecursiveCharacterTextSplitterWithContext(
+            chunk_size=20, chunk_overlap=1, context_perc_of_chunk_size=53, chunk_cache=cache)
+        splitter.split_documents(_docs())
+        assert cache.stats.invalidations == 2
+        assert cache.stats.hits == 0
+        assert len(cache) == 2
+
+    def test_config_change_keeps_entries(self):
+        cache = InMemoryChunkCache(invalidate_on_config_change=False)
+        _splitter(chunk_cache=cache).split_documents(_docs())
+        _splitter(chunk_cache=cache, length_function=lambda text: len(text),
+                  length_function_id="len-lambda").split_documents(_docs())
+        assert cache.stats.invalidations == 0
+        assert cache.stats.hits == 0
+        assert len(cache) == 4
+
+    def test_length_function_without_stable_name(self):
+        cache = SQLiteChunkCache(self.path)
+        for length_function in (lambda text: len(text), functools.partial(_scaled_len, factor=1),
+                                _ScaledLen(1), _scaled_len_closure(1)):
+            with pytest.raises(ValueError, match="pass a length_function_id"):
+                _splitter(chunk_cache=cache, length_function=length_function)
+
+    def test_length_function_id_change_invalidates_entries(self):
+        def splitter(factor, **kwargs):
+            return RecursiveCharacterTextSplitterWithContext(
+                chunk_size=68, chunk_overlap=1, context_perc_of_chunk_size=53,
+                length_function=functools.partial(_scaled_len, factor=factor), **kwargs)
+
+        cache = SQLiteChunkCache(self.path)
+        splitter(1, chunk_cache=cache, length_function_id="scaled-1").split_documents(_docs())
+        expected = splitter(4).split_documents(_docs())
+        assert expected != splitter(1).split_documents(_docs())
+        assert splitter(4, chunk_cache=cache, length_function_id="scaled-4").split_documents(_docs()) == expected
+        assert cache.stats.hits == 0
+        assert cache.stats.invalidations == 2
+
+    def test_module_function_is_its_own_id(self):
+        splitter = _splitter(chunk_cache=InMemoryChunkCache(), length_function=_len)
+        assert f'"length_function": "{__name__}._len"' in splitter.chunk_cache_config
+        assert '"length_function": "builtins.len"' in _splitter(chunk_cache=InMemoryChunkCache()).chunk_cache_config
+
+
+def _len(text):
+    return len(text)
+
+
+def _scaled_len(text, factor):
+    return len(text) * factor
+
+
+class _ScaledLen:
+
+    def __init__(self, factor):
+        self.factor = factor
+
+    def __call__(self, text):
+        return len(text) * self.factor
+
+
+def _scaled_len_closure(factor):
+    def scaled_len(text):
+        return len(text) * factor
+    return scaled_len
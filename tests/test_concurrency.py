@@ -0,0 +1,124 @@
+import asyncio
+import unittest
+import pytest
+from langchain.schema import OutputParserException
+from langchain_util.concurrency import BatchStats, RateLimiter, RetryPolicy, run_concurrently
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_init_validations(self):
+        with pytest.raises(ValueError, match="requests_per_minute must be greater than 0, got 0"):
+            RateLimiter(requests_per_minute=0)
+        with pytest.raises(ValueError, match="tokens_per_minute must be greater than 0, got -1"):
+            RateLimiter(tokens_per_minute=-1)
+
+    def test_requests_per_minute(self):
+        clock = FakeClock()
+        limiter = RateLimiter(requests_per_minute=2, clock=clock)
+        assert limiter._reserve(0) == 0
+        assert limiter._reserve(0) == 0
+        assert limiter._reserve(0) == 30
+        clock.now = 30
+        assert limiter._reserve(0) == 0
+
+    def test_tokens_per_minute(self):
+        clock = FakeClock()
+        limiter = RateLimiter(tokens_per_minute=100, clock=clock)
+        assert limiter._reserve(80) == 0
+        assert limiter._reserve(50) == 18
+        clock.now = 18
+        assert limiter._reserve(50) == 0
+        # Larger than the limit, waits for a full bucket
+        assert limiter._reserve(500) == 60
+        clock.now = 78
+        assert limiter._reserve(500) == 0
+
+    def test_acquire_waits(self):
+        async def run():
+            limiter = RateLimiter(requests_per_minute=600)
+            limiter._requests = 0
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            await limiter.acquire()
+            return loop.time() - start
+
+        assert asyncio.run(run()) >= 0.09
+
+
+class TestBatchStats(unittest.TestCase):
+
+    def test_percentiles(self):
+        stats = BatchStats(completed=10, elapsed=2.0, latencies=[float(i) for i in range(10, 0, -1)])
+        assert stats.throughput == 5
+        assert stats.latency_percentile(50) == 5
+        assert stats.latency_percentile(95) == 10
+        assert stats.latency_percentile(0) == 1
+        assert stats.percentiles() == {"p50": 5, "p90": 9, "p95": 10, "p99": 10}
+        assert BatchStats().latency_percentile(50) == 0
+
+
+class TestRunConcurrently(unittest.TestCase):
+
+    def test_keeps_order_and_limits_concurrency(self):
+        in_flight = []
+
+        async def func(item):
+            in_flight.append(item)
+            await asyncio.sleep(0.01 * (5 - item % 5))
+            assert len(in_flight) <= 3
+            in_flight.remove(item)
+            return item * 2
+
+        stats = BatchStats()
+        results = asyncio.run(run_concurrently(func, list(range(10)), max_concurrency=3, stats=stats))
+        assert results == [i * 2 for i in range(10)]
+        assert stats.completed == 10
+        assert len(stats.latencies) == 10
+        assert stats.throughput > 0
+
+    def test_retries(self):
+        attempts = {}
+
+        async def func(item):
+            attempts[item] = attempts.get(item, 0) + 1
+            if attempts[item] < 3:
+                raise OutputParserException("Malformed")
+            return item
+
+        stats = BatchStats()
+        policy = RetryPolicy(max_retries=2, initial_delay=0.001)
+        assert asyncio.run(run_concurrently(func, [1, 2], retry_policy=policy, stats=stats)) == [1, 2]
+        assert stats.retries == 4
+
+    def test_failures(self):
+        async def func(item):
+            if item == 1:
+                raise ConnectionError("Unreachable")
+            if item == 2:
+                raise KeyError(item)
+            return item
+
+        policy = RetryPolicy(max_retries=1, initial_delay=0.001)
+        stats = BatchStats()
+        results = asyncio.run(run_concurrently(
+            func, [0, 1, 2], retry_policy=policy, return_exceptions=True, stats=stats))
+        assert results[0] == 0
+        assert isinstance(results[1], ConnectionError)
+        assert isinstance(results[2], KeyError)
+        assert stats.failed == 2
+        assert stats.retries == 1
+
+        with pytest.raises(ConnectionError, match="Unreachable"):
+            asyncio.run(run_concurrently(func, [0, 1], retry_policy=policy))
+        with pytest.raises(ValueError, match="max_concurrency must be 1 or greater, got 0"):
+            asyncio.run(run_concurrently(func, [0], max_concurrency=0))
@@ -0,0 +1,57 @@
+import subprocess
+import sys
+
+import pytest
+
+from langchain_util.chains.sentiment import batch_prompt, parser, stuff_prompt
+
+
+def loaded_modules(code: str) -> set:
+    """The modules loaded by running code in a fresh interpreter."""
+    output = subprocess.run(
+        [sys.executable, "-c", f"{code}\nimport sys\nprint('\\n'.join(sys.modules))"],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return set(output.split())
+
+
+def test_importing_the_packages_does_not_import_langchain():
+    modules = loaded_modules("import langchain_util.chains, langchain_util.tools")
+    assert "langchain" not in modules
+    assert "langchain_util.chains.sentiment.sentiment_chain" not in modules
+    assert "langchain_util.tools.agent_as_tool" not in modules
+
+
+def test_tool_cache_does_not_import_the_chains():
+    modules = loaded_modules("import langchain_util.tools.cache")
+    assert not any(module.startswith("langchain_util.chains") for module in modules)
+
+
+def test_exports_import_only_their_module():
+    modules = loaded_modules("from langchain_util.chains import ConcatenateChain")
+    assert "langchain_util.chains.concatenate_chain" in modules
+    assert "langchain_util.chains.sentiment.sentiment_chain" not in modules
+
+
+def test_exports():
+    import langchain_util.chains
+    import langchain_util.tools
+    from langchain_util.chains.concatenate_chain import ConcatenateChain
+    from langchain_util.tools.agent_as_tool import AgentAsTool
+
+    assert langchain_util.chains.ConcatenateChain is ConcatenateChain
+    assert langchain_util.tools.AgentAsTool is AgentAsTool
+    assert "SentimentChain" in dir(langchain_util.chains)
+    with pytest.raises(AttributeError):
+        langchain_util.chains.MissingChain
+
+
+def test_prompts_and_parsers_are_built_once():
+    assert parser.PARSER is parser.get_parser()
+    assert parser.BATCH_PARSER is parser.get_batch_parser()
+    assert stuff_prompt.PROMPT_SELECTOR is stuff_prompt.get_prompt_selector()
+    assert batch_prompt.BATCH_PROMPT_SELECTOR is batch_prompt.get_batch_prompt_selector()
+    assert stuff_prompt.PROMPT_SELECTOR.default_prompt == stuff_prompt.PROMPT
+    assert stuff_prompt.PROMPT.partial_variables["format_instructions"] == parser.PARSER.get_format_instructions()
+    with pytest.raises(AttributeError):
+        stuff_prompt.MISSING_PROMPT
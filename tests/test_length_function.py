@@ -0,0 +1,73 @@
+import pickle
+import unittest
+import pytest
+from langchain.docstore.document import Document
+from langchain_util.length_function import CachedLengthFunction
+from langchain_util.text_splitter import RecursiveCharacterTextSplitterWithContext
+from tests.test_text_splitter import TEXT_TO_SPLIT_1
+
+
+class TestCachedLengthFunction(unittest.TestCase):
+
+    def test_init_validations(self):
+        with pytest.raises(ValueError, match="maxsize must be 0 or greater, got -1"):
+            CachedLengthFunction(maxsize=-1)
+
+    def test_caches_lengths(self):
+        length_function = CachedLengthFunction(maxsize=2)
+
+        assert [length_function(t) for t in ["a", "bb", "a", "ccc", "bb"]] == [1, 2, 1, 3, 2]
+        assert length_function.stats.hits == 1
+        assert length_function.stats.misses == 4
+        assert length_function.stats.calls == 4
+        assert length_function.stats.hit_rate == 0.2
+
+    def test_pickle(self):
+        length_function = CachedLengthFunction(maxsize=2)
+        length_function("a")
+
+        restored = pickle.loads(pickle.dumps(length_function))
+        assert restored.maxsize == 2
+        assert restored.stats.misses == 1
+        assert restored("a") == 1
+        assert restored.stats.misses == 2
+
+    def test_measure_batch(self):
+        batches = []
+
+        def batch_length_function(texts):
+            batches.append(texts)
+            return [len(t) for t in texts]
+
+        length_function = CachedLengthFunction(
+            batch_length_function=batch_length_function)
+        assert length_function.measure_batch(["a", "bb", "a"]) == [1, 2, 1]
+        assert length_function.measure_batch(["bb", "ccc"]) == [2, 3]
+        assert batches == [["a", "bb"], ["ccc"]]
+        assert length_function.stats.calls == 2
+        assert length_function.stats.hits == 2
+
+    def test_measure_batch_should_fail_for_wrong_number_of_lengths(self):
+        length_function = CachedLengthFunction(
+            batch_length_function=lambda texts: [1])
+        with pytest.raises(RuntimeError, match="Batch length function returned 1 lengths for 2 texts"):
+            length_function.measure_batch(["a", "b"])
+
+    def test_splitter_with_cached_length_function(self):
+        docs = [
+            Document(page_content=TEXT_TO_SPLIT_1, metadata={"chunk-context": "Title"}),
+            Document(page_content=TEXT_TO_SPLIT_1, metadata={"chunk-context": "Title"}),
+        ]
+        expected = RecursiveCharacterTextSplitterWithContext(
+            chunk_size=17, chunk_overlap=1, context_perc_of_chunk_size=53
+        ).split_documents([Document(page_content=d.page_content, metadata=dict(d.metadata)) for d in docs])
+
+        splitter = RecursiveCharacterTextSplitterWithContext(
+            chunk_size=17, chunk_overlap=1, context_perc_of_chunk_size=53,
+            length_cache_size=100, batch_length_function=lambda texts: [len(t) for t in texts])
+        assert splitter.split_documents(docs) == expected
+
+        stats = splitter.length_function_stats
+        assert stats.documents == 2
+        assert stats.hit_rate > 0.5
+        assert stats.calls_per_document < 10
@@ -0,0 +1,48 @@
+import copy
+import json
+import pickle
+import unittest
+import pytest
+from langchain.docstore.document import Document
+from langchain_util.metadata import FrozenDict, freeze
+from langchain_util.text_splitter import RecursiveCharacterTextSplitterWithContext
+
+
+class TestFrozenDict(unittest.TestCase):
+
+    def test_freeze(self):
+        metadata = {"acl": ["a", "b"], "source": {"path": "/docs", "tags": {"x"}}, "page": 1}
+        frozen = freeze(metadata)
+
+        assert frozen == {"acl": ("a", "b"), "source": {"path": "/docs", "tags": frozenset({"x"})}, "page": 1}
+        assert isinstance(frozen["source"], FrozenDict)
+        with pytest.raises(TypeError, match="FrozenDict can not be modified"):
+            frozen["page"] = 2
+        with pytest.raises(TypeError, match="FrozenDict can not be modified"):
+            frozen["source"].update({"path": "/other"})
+
+    def test_copy_pickle_and_json(self):
+        frozen = freeze({"source": {"path": "/docs"}})
+
+        assert copy.deepcopy(frozen) is frozen
+        restored = pickle.loads(pickle.dumps(frozen))
+        assert restored == frozen
+        assert isinstance(restored["source"], FrozenDict)
+        assert json.loads(json.dumps(frozen)) == {"source": {"path": "/docs"}}
+
+    def test_splitter_share_metadata(self):
+        metadata = {"chunk-context": "Title", "source": {"path": "/docs", "acl": ["a"]}}
+        splitter = RecursiveCharacterTextSplitterWithContext(
+            chunk_size=17, chunk_overlap=1, context_perc_of_chunk_size=53, share_metadata=True)
+        results = splitter.split_documents(
+            [Document(page_content="Hola.\n\nQue tal?", metadata=metadata)])
+
+        assert results == [
+            Document(page_content="Title\n\nHola.",
+                     metadata={"source": {"path": "/docs", "acl": ("a",)}, "chunk_index": 0}),
+            Document(page_content="Title\n\nQue tal?",
+                     metadata={"source": {"path": "/docs", "acl": ("a",)}, "chunk_index": 1}),
+        ]
+        assert results[0].metadata["source"] is results[1].metadata["source"]
+        results[0].metadata["extra"] = 1
+        assert "extra" not in results[1].metadata
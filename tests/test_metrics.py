@@ -0,0 +1,118 @@
+import logging
+import pickle
+import unittest
+
+from langchain.docstore.document import Document
+
+from langchain_util.metrics import (
+    InMemoryMetricsSink, LoggingMetricsSink, PrometheusMetricsSink, timed
+)
+from langchain_util.text_splitter import RecursiveCharacterTextSplitterWithContext, TokenTextSplitterWithContext
+from tests.test_token_text_splitter import word_tokenizer
+
+
+class TestMetricsSinks(unittest.TestCase):
+
+    def test_in_memory(self):
+        sink = InMemoryMetricsSink()
+        sink.increment("calls_total", labels={"tool": "a", "source": "cache"})
+        sink.increment("calls_total", 2, labels={"tool": "a", "source": "agent"})
+        sink.increment("calls_total", labels={"tool": "b", "source": "agent"})
+        for value in range(1, 101):
+            sink.observe("seconds", value / 100)
+        assert sink.counter("calls_total") == 4
+        assert sink.counter("calls_total", tool="a") == 3
+        assert sink.counter("calls_total", source="agent") == 3
+        assert sink.percentile("seconds", 50) == 0.5
+        assert sink.percentile("seconds", 99) == 0.99
+        assert sink.percentile("missing", 50) == 0.0
+        copy = pickle.loads(pickle.dumps(sink))
+        assert copy.counter("calls_total") == 4
+        sink.reset()
+        assert sink.counter("calls_total") == 0
+
+    def test_timed(self):
+        sink = InMemoryMetricsSink()
+        with timed(sink, "stage_seconds", {"stage": "a"}):
+            pass
+        with timed(None, "stage_seconds", {"stage": "a"}):
+            pass
+        assert len(sink.values("stage_seconds", stage="a")) == 1
+
+    def test_logging(self):
+        logger = logging.getLogger("tests.metrics")
+        with self.assertLogs(logger, logging.DEBUG) as logs:
+            sink = LoggingMetricsSink(logger)
+            sink.increment("calls_total", labels={"tool": "a"})
+            sink.observe("seconds", 0.25)
+        assert logs.output == [
+            'DEBUG:tests.metrics:counter calls_total{tool="a"} += 1',
+            "DEBUG:tests.metrics:observe seconds = 0.25",
+        ]
+
+    def test_prometheus(self):
+        sink = PrometheusMetricsSink(buckets=(0.1, 1))
+        sink.increment("calls_total", labels={"tool": 'say "hi"'})
+        sink.observe("seconds", 0.05, labels={"stage": "a"})
+        sink.observe("seconds", 0.5, labels={"stage": "a"})
+        sink.observe("seconds", 5, labels={"stage": "a"})
+        assert sink.render() == "\n".join([
+            "# TYPE langchain_util_calls_total counter",
+            'langchain_util_calls_total{tool="say \\"hi\\""} 1',
+            "# TYPE langchain_util_seconds histogram",
+            'langchain_util_seconds_bucket{stage="a",le="0.1"} 1',
+            'langchain_util_seconds_bucket{stage="a",le="1"} 2',
+            'langchain_util_seconds_bucket{stage="a",le="+Inf"} 3',
+            'langchain_util_seconds_sum{stage="a"} 5.55',
+            'langchain_util_seconds_count{stage="a"} 3',
+        ]) + "\n"
+        sink.reset()
+        assert sink.render() == ""
+
+
+class TestSplitterMetrics(unittest.TestCase):
+
+    def test_splitter_metrics(self):
+        sink = InMemoryMetricsSink()
+        calls = []
+
+        def length_function(text):
+            calls.append(text)
+            return len(text)
+
+        splitter = RecursiveCharacterTextSplitterWithContext(
+            chunk_size=10, chunk_overlap=0, length_function=length_function, metrics=sink)
+        docs = splitter.split_documents([Document(page_content="aaaa bbbb cccc dddd"),
+                                         Document(page_content="eeee")])
+        assert [doc.page_content for doc in docs] == ["aaaa bbbb", "cccc dddd", "eeee"]
+        assert sink.counter("splitter_documents_total") == 2
+        assert sink.counter("splitter_chunks_total") == 3
+        assert sink.values("splitter_chunk_chars") == [9, 9, 4]
+        assert sink.counter("length_function_calls_total") == len(calls) > 0
+        assert len(sink.values("stage_seconds", stage="create_documents")) == 1
+        assert len(sink.values("stage_seconds", stage="measure")) > 0
+        assert len(sink.values("stage_seconds", stage="merge_splits")) > 0
+
+    def test_token_splitter_metrics(self):
+        sink = InMemoryMetricsSink()
+        splitter = TokenTextSplitterWithContext(
+            tokenizer=word_tokenizer, chunk_size=2, chunk_overlap=0, metrics=sink)
+        docs = splitter.create_documents(["aaaa bbbb cccc dddd"])
+        assert [doc.page_content for doc in docs] == ["aaaa bbbb", "cccc dddd"]
+        assert len(sink.values("stage_seconds", stage="create_documents")) == 1
+        assert len(sink.values("stage_seconds", stage="merge_splits")) > 0
+
+    def test_cached_length_function_counts_its_calls(self):
+        sink = InMemoryMetricsSink()
+        splitter = RecursiveCharacterTextSplitterWithContext(
+            chunk_size=10, chunk_overlap=0, length_function=lambda text: len(text), length_cache_size=100,
+            metrics=sink)
+        splitter.split_documents([Document(page_content="aaaa bbbb aaaa bbbb")])
+        assert sink.counter("length_function_calls_total") == splitter.length_function_stats.calls == 3
+
+    def test_oversized_chunk_warning(self):
+        sink = InMemoryMetricsSink()
+        splitter = RecursiveCharacterTextSplitterWithContext(chunk_size=3, chunk_overlap=0, metrics=sink)
+        with self.assertLogs("langchain_util.text_splitter", logging.WARNING):
+            assert splitter._merge_splits(["abcd", "e"], "", 3) == ["abcd", "e"]
+        assert sink.counter("splitter_oversized_chunks_total") == 1
@@ -0,0 +1,40 @@
+import unittest
+from langchain_util.separator_scanner import SeparatorScanner
+
+
+def _pieces(index, separator, start, end):
+    starts, lengths = index.split(separator, start, end)
+    return [index.text[s:s + n] for s, n in zip(starts, lengths)]
+
+
+class TestSeparatorScanner(unittest.TestCase):
+
+    def test_find_separator(self):
+        index = SeparatorScanner(["\n\n", "\n", " "]).index("a b\nc d\n\ne")
+
+        assert index.find_separator(0, 10) == "\n\n"
+        assert index.find_separator(0, 7) == "\n"
+        assert index.find_separator(0, 3) == " "
+        assert index.find_separator(9, 10) == " "
+
+        index = SeparatorScanner(["\n", ""]).index("ab")
+        assert index.find_separator(0, 2) == ""
+
+    def test_split(self):
+        text = "a b\nc d\n\ne"
+        index = SeparatorScanner(["\n\n", "\n", " ", ""]).index(text)
+
+        assert _pieces(index, "\n\n", 0, 10) == text.split("\n\n")
+        assert _pieces(index, " ", 0, 7) == "a b\nc d".split(" ")
+        assert _pieces(index, "", 4, 7) == ["c", " ", "d"]
+        assert _pieces(index, "\n", 4, 4) == [""]
+
+    def test_split_self_overlapping_separator(self):
+        text = "x\n\n\n\ny\n\n\nz"
+        index = SeparatorScanner(["\n\n"]).index(text)
+
+        for start in range(len(text)):
+            for end in range(start, len(text) + 1):
+                # Split repeatedly so that the whole text gets indexed
+                for _ in range(3):
+                    assert _pieces(index, "\n\n", start, end) == text[start:end].split("\n\n")
@@ -0,0 +1,60 @@
+import unittest
+from typing import List
+import pytest
+from langchain.docstore.document import Document
+from langchain_util.spans import ChunkSpan, ChunkSpans
+from langchain_util.text_splitter import RecursiveCharacterTextSplitterWithContext, TextSplitterWithContext
+from tests.test_text_splitter import TEXT_TO_SPLIT_1
+
+
+class TestChunkSpans(unittest.TestCase):
+
+    def test_chunk_spans(self):
+        spans = ChunkSpans("Hi there you", [(0, 2), (3, 8), (9, 12)])
+
+        assert len(spans) == 3
+        assert list(spans.offsets()) == [(0, 2), (3, 8), (9, 12)]
+        assert list(spans.texts()) == ["Hi", "there", "you"]
+        assert spans[-1] == ChunkSpan("Hi there you", 9, 12)
+        assert spans[1].text == "there"
+        assert list(spans[1:].texts()) == ["there", "you"]
+        with pytest.raises(IndexError, match="ChunkSpans index out of range"):
+            spans[3]
+
+    def test_split_spans(self):
+        splitter = RecursiveCharacterTextSplitterWithContext(
+            chunk_size=10, chunk_overlap=1)
+        spans = splitter.split_spans(TEXT_TO_SPLIT_1, 10)
+
+        assert list(spans.texts()) == splitter.split_text(TEXT_TO_SPLIT_1, 10)
+        assert spans[0] == ChunkSpan(TEXT_TO_SPLIT_1, 0, 3)
+
+    def test_split_documents_with_start_index(self):
+        docs = [Document(page_content="Hola.\n\nQue tal?",
+                         metadata={"chunk-context": "Context", "source": "s1"})]
+        splitter = RecursiveCharacterTextSplitterWithContext(
+            chunk_size=17, chunk_overlap=1, context_perc_of_chunk_size=53, add_start_index=True)
+
+        assert splitter.split_documents(docs) == [
+            Document(page_content="Context\n\nHola.",
+                     metadata={"source": "s1", "start_index": 0, "end_index": 5}),
+            Document(page_content="Context\n\nQue tal?",
+                     metadata={"source": "s1", "start_index": 7, "end_index": 15}),
+        ]
+
+    def test_chunk_not_in_text(self):
+        docs = [Document(page_content="Hola.\n\nQue tal?")]
+        splitter = UpperCaseTextSplitter(chunk_size=10, chunk_overlap=1, add_start_index=True)
+
+        with pytest.raises(ValueError, match="UpperCaseTextSplitter created a chunk that is not in the text"):
+            splitter.split_documents(docs)
+        with pytest.raises(ValueError, match="'HOLA.'"):
+            list(splitter.iter_split_spans("Hola.\n\nQue tal?", 10))
+        assert splitter.split_text("Hola.\n\nQue tal?", 10) == ["HOLA.", "QUE TAL?"]
+
+
+class UpperCaseTextSplitter(TextSplitterWithContext):
+    """Splits on blank lines, changing the chunks, so they can't be located in the text."""
+
+    def split_text(self, text: str, chunk_size: int) -> List[str]:
+        return [part.upper() for part in text.split("\n\n")]
@@ -1,5 +1,7 @@
+import asyncio
 import unittest
 import pytest
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
 from langchain_util.text_splitter import RecursiveCharacterTextSplitterWithContext
 from langchain.docstore.document import Document
@@ -93,3 +95,93 @@ class TestRecursiveCharacterTextSplitterWithContext(unittest.TestCase):
             chunk_size=17, chunk_overlap=1, context_perc_of_chunk_size=41)
         with pytest.raises(RuntimeError, match="Chunk context is too long: Title\n\n"):
             splitter.split_documents(docs)
+
+    def test_merge_splits_measures_each_split_once(self):
+        calls = []
+
+        def length_function(text):
+            calls.append(text)
+            return len(text)
+
+        splitter = RecursiveCharacterTextSplitterWithContext(
+            chunk_size=10, chunk_overlap=4, length_function=length_function)
+        splits = ["aaa", "bb", "cccc", "d", "eeeee", "ff"]
+        results = splitter._merge_splits(splits, " ", 10)
+
+        assert results == ["aaa bb", "bb cccc d", "d eeeee ff"]
+        assert calls == [" "] + splits
+
+    def test_iter_split_documents(self):
+        def make_docs():
+            return [
+                Document(page_content=TEXT_TO_SPLIT_1,
+                         metadata={"chunk-context": "Title"}),
+                Document(page_content="Hola.\n\nQue tal?",
+                         metadata={"chunk-context": "Context", "source": "s1"})
+            ]
+
+        splitter = RecursiveCharacterTextSplitterWithContext(
+            chunk_size=17, chunk_overlap=1, context_perc_of_chunk_size=53)
+        expected_docs = splitter.split_documents(make_docs())
+
+        consumed = []
+
+        def doc_stream():
+            for doc in make_docs():
+                consumed.append(doc)
+                yield doc
+
+        results = splitter.iter_split_documents(doc_stream())
+        assert next(results) == Document(page_content="Title\n\nHi.", metadata={})
+        assert len(consumed) == 1
+        assert [expected_docs[0]] + list(results) == expected_docs
+        assert list(splitter.iter_split_text(TEXT_TO_SPLIT_1, 10)) == splitter.split_text(TEXT_TO_SPLIT_1, 10)
+
+    def test_split_documents_parallel(self):
+        def make_docs():
+            return [
+                Document(page_content=f"{TEXT_TO_SPLIT_1} {i}",
+                         metadata={"chunk-context": f"Title {i}", "source": f"s{i}"})
+                for i in range(20)
+            ]
+
+        splitter = RecursiveCharacterTextSplitterWithContext(
+            chunk_size=20, chunk_overlap=1, context_perc_of_chunk_size=50)
+        expected_docs = splitter.split_documents(make_docs())
+
+        results = splitter.split_documents_parallel(
+            make_docs(), max_workers=2, chunksize=3, min_documents=1)
+        assert results == expected_docs
+
+        results = splitter.split_documents_parallel(make_docs(), max_workers=2)
+        assert results == expected_docs
+
+    def test_atransform_documents(self):
+        def make_docs():
+            return [
+                Document(page_content=f"{TEXT_TO_SPLIT_1} {i}",
+                         metadata={"chunk-context": f"Title {i}", "source": f"s{i}"})
+                for i in range(10)
+            ]
+
+        splitter = RecursiveCharacterTextSplitterWithContext(
+            chunk_size=20, chunk_overlap=1, context_perc_of_chunk_size=50)
+        expected_docs = splitter.split_documents(make_docs())
+
+        async def doc_stream():
+            for doc in make_docs():
+                yield doc
+
+        async def run():
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                results = await splitter.atransform_documents(
+                    make_docs(), executor=executor, max_concurrency=3)
+            streamed = [doc async for doc in splitter.aiter_split_documents(doc_stream())]
+            return results, streamed
+
+        results, streamed = asyncio.run(run())
+        assert results == expected_docs
+        assert streamed == expected_docs
+
+        with pytest.raises(ValueError, match="max_concurrency must be 1 or greater, got 0"):
+            asyncio.run(splitter.atransform_documents(make_docs(), max_concurrency=0))
@@ -0,0 +1,116 @@
+import pickle
+import re
+import unittest
+import pytest
+from langchain.docstore.document import Document
+from langchain_util.text_splitter import TokenTextSplitterWithContext
+from langchain_util.tokens import TiktokenTokenizer, TokenOffsets
+from tests.test_text_splitter import TEXT_TO_SPLIT_1
+
+
+def word_tokenizer(text):
+    """Stand-in tokenizer, each word with its leading whitespace is a token."""
+    return [match.span() for match in re.finditer(r"\s*\S+", text)]
+
+
+class FakeEncoding:
+    """Byte level encoding with one token per byte, except for pairs of ascii letters."""
+
+    name = "fake"
+
+    def encode(self, text, allowed_special, disallowed_special):
+        data = text.encode("utf-8")
+        tokens = []
+        i = 0
+        while i < len(data):
+            size = 2 if data[i:i + 2].isalpha() and len(data[i:i + 2]) == 2 else 1
+            tokens.append(data[i:i + size])
+            i += size
+        return tokens
+
+    def decode_tokens_bytes(self, tokens):
+        return tokens
+
+
+class TestTokenOffsets(unittest.TestCase):
+
+    def test_count(self):
+        tokens = TokenOffsets("one two  three", word_tokenizer)
+        assert len(tokens) == 3
+        assert tokens.count(0, 14) == 3
+        assert tokens.count(0, 3) == 1
+        assert tokens.count(3, 4) == 1
+        assert tokens.count(2, 5) == 2
+        assert tokens.count(5, 5) == 0
+        assert list(tokens.spans(2, 9)) == [(2, 3), (3, 7), (7, 9)]
+
+    def test_tiktoken_tokenizer(self):
+        tokenizer = TiktokenTokenizer(FakeEncoding())
+        assert tokenizer("abc é") == [(0, 2), (2, 3), (3, 4), (4, 5), (4, 5)]
+
+
+class TestTokenTextSplitterWithContext(unittest.TestCase):
+
+    def test_split_text(self):
+        splitter = TokenTextSplitterWithContext(
+            tokenizer=word_tokenizer, chunk_size=8, chunk_overlap=2)
+        text = "one two three four five six seven eight nine ten eleven twelve\n\nthirteen fourteen"
+        assert splitter.split_text(text, 8) == [
+            "one two three four five six seven eight",
+            "seven eight nine ten eleven twelve",
+            "thirteen fourteen",
+        ]
+
+    def test_cuts_on_token_boundaries(self):
+        splitter = TokenTextSplitterWithContext(
+            tokenizer=TiktokenTokenizer(FakeEncoding()), chunk_size=3, chunk_overlap=0)
+        assert splitter.split_text("abcdefgh", 3) == ["abcdef", "gh"]
+
+    def test_split_documents_with_context(self):
+        docs = [Document(page_content=TEXT_TO_SPLIT_1, metadata={"chunk-context": "Title"})]
+        splitter = TokenTextSplitterWithContext(
+            tokenizer=word_tokenizer, chunk_size=6, chunk_overlap=1,
+            context_perc_of_chunk_size=20, add_start_index=True)
+        results = splitter.split_documents(docs)
+
+        assert [doc.page_content for doc in results] == [
+            "Title\n\nHi.\n\nI'm Harrison.",
+            "Title\n\nHow? Are? You?",
+            "Title\n\nOkay then f f f",
+            "Title\n\nf f.",
+            "Title\n\nThis is a weird text",
+            "Title\n\ntext to write, but gotta",
+            "Title\n\ngotta test the splittingggg some",
+            "Title\n\nsome how.",
+            "Title\n\nBye!\n\n-H.",
+        ]
+        for doc in results:
+            chunk = doc.page_content[len("Title\n\n"):]
+            assert TEXT_TO_SPLIT_1[doc.metadata["start_index"]:doc.metadata["end_index"]] == chunk
+            assert len(word_tokenizer(chunk)) <= 5
+
+    def test_tokenizes_each_document_once(self):
+        calls = []
+
+        def tokenizer(text):
+            calls.append(text)
+            return word_tokenizer(text)
+
+        splitter = TokenTextSplitterWithContext(tokenizer=tokenizer, chunk_size=5, chunk_overlap=1)
+        splitter.split_documents([Document(page_content=TEXT_TO_SPLIT_1)])
+        assert calls == [TEXT_TO_SPLIT_1]
+
+    def test_pickle(self):
+        splitter = TokenTextSplitterWithContext(tokenizer=word_tokenizer, chunk_size=5, chunk_overlap=1)
+        restored = pickle.loads(pickle.dumps(splitter))
+        assert restored.split_text(TEXT_TO_SPLIT_1, 5) == splitter.split_text(TEXT_TO_SPLIT_1, 5)
+
+    def test_from_tiktoken_encoder_requires_tiktoken(self):
+        try:
+            import tiktoken  # noqa: F401
+        except ImportError:
+            with pytest.raises(ValueError, match="Could not import tiktoken python package"):
+                TokenTextSplitterWithContext.from_tiktoken_encoder()
+        else:
+            splitter = TokenTextSplitterWithContext.from_tiktoken_encoder(chunk_size=5, chunk_overlap=1)
+            assert splitter.split_text(TEXT_TO_SPLIT_1, 5)
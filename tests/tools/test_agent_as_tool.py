@@ -0,0 +1,316 @@
+import asyncio
+import threading
+import time
+import unittest
+from typing import List, Optional
+import pytest
+from langchain.agents import AgentExecutor, AgentType, Tool, initialize_agent
+from langchain.callbacks.base import BaseCallbackHandler
+from langchain.callbacks.manager import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain.llms.base import LLM
+from langchain_util.metrics import InMemoryMetricsSink
+from langchain_util.tools import AgentAsTool
+from langchain_util.tools.budget import AgentBudget, AgentLimitExceeded
+from langchain_util.tools.cache import ToolResultCache
+
+
+class ScriptedLLM(LLM):
+    """
+    Drives a zero shot agent: looks the question up steps times, then answers
+    with the last observation.
+    """
+
+    steps: int = 2
+    latency: float = 0.0
+    calls: int = 0
+    tool: str = "lookup"
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def _call(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+    ) -> str:
+        self.calls += 1
+        time.sleep(self.latency)
+        return self._respond(prompt)
+
+    async def _acall(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+    ) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return self._respond(prompt)
+
+    def _respond(self, prompt: str) -> str:
+        scratchpad = prompt.split("Question: ")[-1]
+        question = scratchpad.split("\n")[0]
+        observations = scratchpad.split("Observation: ")
+        if len(observations) - 1 < self.steps:
+            return f"Thought: look it up\nAction: {self.tool}\nAction Input: {question}"
+        return f"Thought: done\nFinal Answer: {observations[-1].split(chr(10))[0]}"
+
+
+def lookup(query: str) -> str:
+    return f"answer to {query}"
+
+
+async def alookup(query: str) -> str:
+    return lookup(query)
+
+
+def make_tool(llm, tools=None, name="research", **kwargs):
+    agent = initialize_agent(
+        tools or [Tool(name="lookup", func=lookup, coroutine=alookup, description="Looks up anything")],
+        llm, agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION)
+    return AgentAsTool(name=name, description="Researches a question", agent=agent, **kwargs)
+
+
+class CustomAgentExecutor(AgentExecutor):
+
+    def _call(self, inputs, run_manager=None):
+        return {"output": "custom"}
+
+    async def _acall(self, inputs, run_manager=None):
+        return {"output": "custom"}
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class ToolStartCollector(BaseCallbackHandler):
+
+    def __init__(self):
+        self.llm_starts = 0
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.llm_starts += 1
+
+
+class TestToolResultCache(unittest.TestCase):
+
+    def test_lru_and_ttl(self):
+        clock = FakeClock()
+        cache = ToolResultCache(max_entries=2, ttl=10, clock=clock)
+        assert ToolResultCache.key("t", "  What IS\nit ") == ("t", "what is it")
+        cache.put(("t", "a"), "1")
+        cache.put(("t", "b"), "2")
+        assert cache.get(("t", "a")) == "1"
+        cache.put(("t", "c"), "3")
+        assert cache.get(("t", "b")) is None
+        assert cache.stats.evictions == 1
+        clock.now = 11
+        assert cache.get(("t", "a")) is None
+        assert cache.stats.expirations == 1
+        assert cache.stats.hit_rate == pytest.approx(1 / 3)
+        with pytest.raises(ValueError, match="max_entries must be 1 or greater, got 0"):
+            ToolResultCache(max_entries=0)
+
+
+class TestAgentAsTool(unittest.TestCase):
+
+    def test_run_and_arun(self):
+        llm = ScriptedLLM()
+        tool = make_tool(llm)
+        assert tool.run("capital of France") == "answer to capital of France"
+        assert asyncio.run(tool.arun("capital of Spain")) == "answer to capital of Spain"
+        assert llm.calls == 6
+        assert tool.stats.runs == 2
+
+    def test_callbacks_are_forwarded(self):
+        collector = ToolStartCollector()
+        tool = make_tool(ScriptedLLM())
+        asyncio.run(tool.arun("anything", callbacks=[collector]))
+        tool.run("anything", callbacks=[collector])
+        assert collector.llm_starts == 6
+
+    def test_cache(self):
+        llm = ScriptedLLM()
+        tool = make_tool(llm, cache=ToolResultCache())
+        assert tool.run("Capital of France") == "answer to Capital of France"
+        assert tool.run("  capital of   france") == "answer to Capital of France"
+        assert asyncio.run(tool.arun("CAPITAL OF FRANCE")) == "answer to Capital of France"
+        assert llm.calls == 3
+        assert tool.cache.stats.hits == 2
+
+    def test_metrics(self):
+        sink = InMemoryMetricsSink()
+        tool = make_tool(ScriptedLLM(steps=5), cache=ToolResultCache(), max_iterations=2, metrics=sink)
+        tool.run("q")
+        tool.run("q")
+        assert sink.counter("agent_tool_calls_total", tool="research", source="agent") == 2
+        assert sink.counter("agent_tool_limits_total", limit="iterations") == 2
+        assert len(sink.values("stage_seconds", component="agent_tool", stage="run")) == 2
+        tool.max_iterations = None
+        tool.run("q")
+        tool.run("q")
+        assert sink.counter("agent_tool_calls_total", source="cache") == 1
+
+    def test_async_single_flight(self):
+        llm = ScriptedLLM(latency=0.02)
+        tool = make_tool(llm, single_flight=True)
+
+        async def run():
+            return await asyncio.gather(*(tool.arun(q) for q in ["a", "a", "b", "a", "b"]))
+
+        assert asyncio.run(run()) == ["answer to a"] * 2 + ["answer to b"] + ["answer to a", "answer to b"]
+        assert tool.stats.runs == 2
+        assert tool.stats.deduplicated == 3
+        assert llm.calls == 6
+
+    def test_sync_single_flight(self):
+        llm = ScriptedLLM(latency=0.05)
+        tool = make_tool(llm, single_flight=True)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(tool.run("same"))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert results == ["answer to same"] * 4
+        assert tool.stats.runs == 1
+        assert tool.stats.deduplicated == 3
+
+    def test_single_flight_propagates_errors(self):
+        tool = make_tool(ScriptedLLM(latency=0.01), single_flight=True, output_key="missing")
+
+        async def run():
+            return await asyncio.gather(tool.arun("a"), tool.arun("a"), return_exceptions=True)
+
+        results = asyncio.run(run())
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert tool.stats.runs == 1
+
+    def test_single_flight_waiter_takes_over_cancelled_call(self):
+        llm = ScriptedLLM(latency=0.02)
+        tool = make_tool(llm, single_flight=True)
+
+        async def run():
+            leader = asyncio.ensure_future(tool.arun("q"))
+            await asyncio.sleep(0.01)
+            followers = [asyncio.ensure_future(tool.arun("q")) for _ in range(2)]
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await leader
+            return await asyncio.gather(*followers)
+
+        assert asyncio.run(run()) == ["answer to q"] * 2
+        assert tool.stats.runs == 2
+        assert tool.stats.deduplicated == 2
+
+
+class TestAgentAsToolLimits(unittest.TestCase):
+
+    def test_agent_is_called_as_is_without_limits(self):
+        tool = make_tool(ScriptedLLM())
+        tool.agent = CustomAgentExecutor.from_agent_and_tools(agent=tool.agent.agent, tools=tool.agent.tools)
+        assert tool.run("q") == "custom"
+        assert asyncio.run(tool.arun("q")) == "custom"
+        tool.max_iterations = 5
+        assert tool.run("q") == "answer to q"
+        assert asyncio.run(tool.arun("q")) == "answer to q"
+
+    def test_max_iterations_returns_partial_result(self):
+        llm = ScriptedLLM(steps=5)
+        tool = make_tool(llm, max_iterations=2, cache=ToolResultCache())
+        expected = "Agent stopped by the iterations limit after 2 steps. Partial result: answer to q"
+        assert tool.run("q") == expected
+        assert asyncio.run(tool.arun("q")) == expected
+        assert llm.calls == 4
+        assert tool.stats.iteration_limits == 2
+        assert tool.stats.partial_results == 2
+        assert len(tool.cache) == 0
+
+    def test_limit_raises_without_partial_results(self):
+        tool = make_tool(ScriptedLLM(steps=5), max_iterations=1, partial_results=False)
+        with pytest.raises(AgentLimitExceeded, match="Agent stopped by the iterations limit") as info:
+            tool.run("q")
+        assert info.value.limit == "iterations"
+        assert info.value.partial_result.endswith("Partial result: answer to q")
+
+    def test_timeout(self):
+        llm = ScriptedLLM(steps=20, latency=0.05)
+        tool = make_tool(llm, timeout=0.12, timeout_grace=0.01)
+        start = time.perf_counter()
+        assert "stopped by the timeout limit" in tool.run("q")
+        assert time.perf_counter() - start < 0.2
+
+        start = time.perf_counter()
+        result = asyncio.run(tool.arun("q"))
+        assert time.perf_counter() - start < 0.16
+        assert result == "Agent stopped by the timeout limit after 2 steps. Partial result: answer to q"
+        assert tool.stats.timeouts == 2
+
+    def test_token_budget(self):
+        llm = ScriptedLLM(steps=5)
+        tool = make_tool(llm, max_tokens=1)
+        assert "stopped by the tokens limit after 1 steps" in tool.run("q")
+        assert llm.calls == 1
+        assert tool.stats.token_limits == 1
+
+    def test_nested_deadline_and_token_budget(self):
+        inner_llm = ScriptedLLM(steps=100, latency=0.03)
+        inner = make_tool(inner_llm, name="research")
+        outer = make_tool(ScriptedLLM(steps=3, tool="research"), tools=[inner], name="manager", timeout=0.2)
+
+        start = time.perf_counter()
+        result = asyncio.run(outer.arun("q"))
+        assert time.perf_counter() - start < 0.3
+        assert result.startswith("Agent stopped by the timeout limit after 1 steps. "
+                                 "Partial result: Agent stopped by the timeout limit")
+        assert inner.stats.timeouts == 1
+        assert outer.stats.timeouts == 1
+
+        inner_llm = ScriptedLLM(steps=100)
+        inner = make_tool(inner_llm, name="research")
+        outer = make_tool(ScriptedLLM(steps=3, tool="research"), tools=[inner], name="manager", max_tokens=2000)
+        outer.run("q")
+        assert inner.stats.token_limits == 1
+        assert outer.stats.token_limits == 1
+        assert inner_llm.calls < 10
+
+    def test_cancellation_stops_nested_calls(self):
+        inner_llm = ScriptedLLM(steps=100, latency=0.02)
+        inner = make_tool(inner_llm, name="research")
+        outer = make_tool(ScriptedLLM(steps=3, tool="research"), tools=[inner], name="manager")
+
+        async def run():
+            task = asyncio.ensure_future(outer.arun("q"))
+            await asyncio.sleep(0.1)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            calls = inner_llm.calls
+            await asyncio.sleep(0.1)
+            return calls
+
+        assert asyncio.run(run()) == inner_llm.calls
+
+    def test_budget(self):
+        clock = FakeClock()
+        outer = AgentBudget(timeout=10, max_tokens=100, clock=clock)
+        inner = AgentBudget(timeout=30, parent=outer, clock=clock)
+        assert inner.remaining_time() == 10
+        assert inner.exceeded() is None
+        outer.spend(100)
+        assert inner.exceeded() == "tokens"
+        assert AgentBudget(parent=AgentBudget(clock=clock)).remaining_time() is None
+        inner = AgentBudget(parent=AgentBudget(clock=clock), clock=clock)
+        inner.parent.cancel()
+        assert inner.exceeded() == "cancelled"
+        clock.now = 11
+        assert AgentBudget(timeout=5, parent=outer, clock=clock).exceeded() == "timeout"